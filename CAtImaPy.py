@@ -532,7 +532,11 @@ def changeValue(value):
                                     mplwidgetAnalysisGraph = self.ui.mplwidgetAnalysisGraph)
         # load values from ui
         self.loadUiValues(['Imaging'])
+        # show scan results on ui
+        self.Imaging.connect_ui(self.ui)
         #not auto stuff
+        self.Imaging.scanVarName = self.ui.lineEdit_scanVarName.text()
+        self.Imaging.scanUnitName = self.ui.lineEdit_scanUnitName.text()
         self.Imaging.averages = self.ui.imaging_averages.value()
         self.Imaging.scans = self.ui.imaging_scans.value()
         self.Imaging.cycles = self.Imaging.averages*self.Imaging.scans
@@ -609,8 +613,8 @@ def changeValue(value):
                 self.ui.Imaging__includeSaturationEffects.setChecked(self.Camera.cameraConfig['Imaging__includeSaturationEffects'])
                 self.ui.Imaging__laserIntensity.setValue(self.Camera.cameraConfig['Imaging__laserIntensity'])
                 self.ui.Imaging__laserDetuningMHz.setValue(self.Camera.cameraConfig['Imaging__laserDetuningMHz'])
-            self.ui.lcdNumber_camera_pixelCalXumperpx.display(self.Camera.pixelCalXumperpx)
-            self.ui.lcdNumber_camera_pixelCalYumperpx.display(self.Camera.pixelCalYumperpx)
+            self.ui.lcdNumber_camera_pixelCalXumperpx.display(self.Camera.pixelCalXumperpx*self.Camera.camBinning[0])
+            self.ui.lcdNumber_camera_pixelCalYumperpx.display(self.Camera.pixelCalYumperpx*self.Camera.camBinning[1])
             self.ui.lcdNumber_camera_bit_depth.display(self.Camera.imageBitDepth)
             self.ui.lcdNumber_camera_maxLevel.display(self.Camera.maxLevel)
             self.ui.label_image_datatype.setText(str(self.Camera.imageDtype).split('\'')[1])
@@ -923,7 +927,7 @@ def changeValue(value):
     def on_pushButton_imaging_start_measurement_clicked(self):
         """Action of pushButton **Start measurement** in tab *Imaging*."""
         self.imagingObjectInit()
-        self.Imaging.imaging_scan(self.Camera,self.ui)
+        self.Imaging.imaging_scan(self.Camera)
         if self.Imaging.scanDone and self.saveload_autoSaveMeas :
             self.save_imaging()
  
@@ -951,7 +955,7 @@ def changeValue(value):
     def on_pushButton_start_temp_measurement_clicked(self):
         """Action of pushButton **Start Temperature measurement** in tab *Temperature*."""
         self.imagingObjectInit()
-        self.Imaging.temperature_measurement_scan(self.Camera, self.ui)
+        self.Imaging.temperature_measurement_scan(self.Camera)
         if self.Imaging.scanDone and self.saveload_autoSaveMeas :
             self.save_imaging()
     
@@ -979,7 +983,7 @@ def changeValue(value):
     def on_pushButton_start_LT_measurement_clicked(self):
         """Action of pushButton **Start Lifetime measurement** in tab *Lifetime*."""
         self.imagingObjectInit()
-        self.Imaging.lifetime_measurement_scan(self.Camera, self.ui)
+        self.Imaging.lifetime_measurement_scan(self.Camera)
         if self.Imaging.scanDone and self.saveload_autoSaveMeas :
             self.save_imaging()
     
@@ -40,8 +40,8 @@ class AndorSDK3Class(PylablibInterfaceClass) :
             
             gaindB=0. (float) : hardware gain of the camera in dB.
             
-            camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation 
                         
@@ -160,8 +160,8 @@ class AndorSDK3Class(PylablibInterfaceClass) :
     def startAcquisition(self):
         """Start acquisition or restart if already running """
         # common to Icamera interface but args,kwargs depend on camera driver/model
-        self.pylablibCamera.setup_acquisition(mode="sequence", nframes=20) #set buffer size to 20
-        self.pylablibCamera.start_acquisition(frames_per_trigger=1, auto_start=False, nframes=20) #set buffer size to 20
+        self.pylablibCamera.setup_acquisition(mode="sequence", nframes=self.bufferFrames) #set buffer size
+        self.pylablibCamera.start_acquisition(frames_per_trigger=1, auto_start=False, nframes=self.bufferFrames) #set buffer size
 
 
 
@@ -186,8 +186,8 @@ class ExampleModelClass(AndorSDK3Class) :
             
             gaindB=0. (float) : hardware gain of the camera in dB.
             
-            camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation 
                         
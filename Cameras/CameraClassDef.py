@@ -4,12 +4,21 @@
 Define generic camera driver class CameraClass
 """
 
+import threading
+import time
 import numpy as np
 from .Config import camerasConfigs
 
-class CameraClass: 
+class CameraClass:
     """Top Parent Class for controlling camera : used as an interface"""
-    
+
+    _producerThread = None # background acquisition thread, None if not running
+    # metadata record of a frame : frame index and hardware timestamp (units of camera SDK) given by driver,
+    # host time (s) of reception and latency (ms) between start of grab and reception (including wait for trigger)
+    frameMetadataDtype = np.dtype([('frameIndex', np.int64), ('hardwareTimestamp', np.float64),
+                                   ('hostTime', np.float64), ('grabLatencyms', np.float64)])
+    _exposureAutoMemory = {} # last converged (exposurems, gaindB) of exposureLevelAutoAdjust : {(camera number, Optimization) : (exposurems, gaindB)}
+
     def __init__(self, cameraNumber, triggerMode=0, exposurems=1., gaindB=0., camROI=None, loadDefault=False ):
         """Initialize the Camera object 
         
@@ -23,8 +32,8 @@ class CameraClass:
             
             gaindB (float) : hardware gain of the camera in dB.
             
-            camROI (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault  (bool): Decide if default values from cameraConfigs should be set at creation 
             
@@ -65,18 +74,37 @@ class CameraClass:
         self.exposureAutoAvRange = None
         self.exposureAutoMaxLevel = None
         self.exposureAutoMaxRange = None
-        self.exposureIncreaseHardwareGain = None
+        self.exposureIncreaseGain = False # allow gain increase in exposureLevelAutoAdjust if maximum exposure is not sufficient
+        self.exposureAutoROI = None # None or [x offset, y offset, x size, y size] in image pixels : part of image measured by exposureLevelAutoAdjust
+        self.exposureAutoStride = 2 # keep one pixel every exposureAutoStride along each axis in exposureLevelAutoAdjust measurement
+        self.exposureAutoMaxPercentile = 99.9 # image histogram percentile (in %) used as 'Max' value in exposureLevelAutoAdjust
+        if self.cameraConfig is not None :
+            for key in ['exposureAutoROI', 'exposureAutoStride', 'exposureAutoMaxPercentile'] :
+                if key in self.cameraConfig :
+                    setattr(self, key, self.cameraConfig[key])
         self.timeout = 10 #timeout in seconds
+        if (self.cameraConfig is not None) and ('bufferFrames' in self.cameraConfig) :
+            self.bufferFrames = int(self.cameraConfig['bufferFrames'])
+        else :
+            self.bufferFrames = 20 # number of images in camera driver buffer
         self.imageAcqLastFailed = False
+        # report of last clearBuffer : number of discarded frames and duration, printed if clearBufferPrintTiming
+        self.clearBufferDiscardedFrames = 0
+        self.clearBufferDurationms = 0.
+        if (self.cameraConfig is not None) and ('clearBufferPrintTiming' in self.cameraConfig) :
+            self.clearBufferPrintTiming = bool(self.cameraConfig['clearBufferPrintTiming'])
+        else :
+            self.clearBufferPrintTiming = False
         # image size
         self.wpxmax = 1 # width max of camera
         self.hpxmax = 1 # height max of camera
         self.wpx = self.wpxmax # width of camera
         self.hpx = self.hpxmax # height of camera
-        self.camROI = camROI #Camera region of interest (read part of sensor) [OffsetX, OffsetY, Width, Height]
+        self.camROI = camROI #Camera region of interest (read part of sensor) [OffsetX, OffsetY, Width, Height (, BinningX, BinningY)]
+        self.camBinning = [1, 1] # [X, Y] number of sensor pixels binned in one image pixel : image pixel size is binning * sensor pixel size
         self.imageSize = (self.hpx,self.wpx) #in numpy axes are reversed
-        self.pixelCalXumperpx = 1. # calibration from pixels to micrometers along X axis
-        self.pixelCalYumperpx = 1. # calibration from pixels to micrometers along Y axis
+        self.pixelCalXumperpx = 1. # calibration from sensor pixels to micrometers along X axis (without binning)
+        self.pixelCalYumperpx = 1. # calibration from sensor pixels to micrometers along Y axis (without binning)
         self.imageLimits = [-self.wpx/2*self.pixelCalXumperpx,
                             self.wpx/2*self.pixelCalXumperpx,
                             -self.hpx/2*self.pixelCalYumperpx,
@@ -87,15 +115,53 @@ class CameraClass:
         self.maxLevel = 2**self.imageBitDepth - 1
         self.imageDtype = np.uint8 # image bith depth (dtype in numpy) : typically 8 or 16 bits => uint8 or uint16
         self.image = np.array(self.imageSize, dtype=self.imageDtype) #last image taken
-        self._image = np.array(self.imageSize, dtype=self.imageDtype) #PROTECTED pointer for loading camera image 
-        
+        self._image = np.array(self.imageSize, dtype=self.imageDtype) #PROTECTED pointer for loading camera image
+        # ring buffer of frames filled by background acquisition thread (see start_background_acquisition)
+        if (self.cameraConfig is not None) and ('ringBufferSize' in self.cameraConfig) :
+            self.ringBufferSize = int(self.cameraConfig['ringBufferSize'])
+        else :
+            self.ringBufferSize = 16 # number of frames in ring buffer
+        self.frameRing = np.zeros((0,)+self.imageSize, dtype=self.imageDtype) # preallocated frames
+        self.frameRingSequenceNumbers = np.zeros(0, dtype=np.int64) # sequence number of frame in each slot
+        self.frameRingMetadata = np.zeros(0, dtype=self.frameMetadataDtype) # metadata of frame in each slot
+        self.frameRingWritten = 0 # number of frames written in ring since start
+        self.frameRingRead = 0 # number of frames read (or dropped) from ring since start
+        self.frameRingDropped = 0 # number of frames overwritten before being read
+        self.lastFrameSequenceNumber = -1 # sequence number of last frame returned by get_frame
+        # frames metadata
+        self.frameInfo = (-1, np.nan) # (frame index, hardware timestamp) of last image read from driver, -1 and nan if unknown
+        self.lastFramesMetadata = np.zeros(0, dtype=self.frameMetadataDtype) # metadata of last images returned by grabArrays / get_frame(s)
+        self._frameRingCondition = threading.Condition()
+        self._producerStop = threading.Event()
+        self._producerAcqLastFailed = False
+        self.backgroundAcquisitionFailed = False # if background acquisition thread stopped on an error
+
 
     def __del__(self):
         """Delete the Camera object by calling close function
-        
+
         Close the Camera and free memory"""
-        del(self._image, self.image)        
-        
+        self.stop_background_acquisition()
+        del(self._image, self.image)
+
+
+    @property
+    def imageAcqLastFailed(self):
+        """If last image acquisition failed (bool).
+
+        Separate value in background acquisition thread, so that its grabs do not change the result seen by the consumer."""
+        if self._producerThread is not None and threading.current_thread() is self._producerThread :
+            return self._producerAcqLastFailed
+        return self.__dict__.get('_imageAcqLastFailed', False)
+
+
+    @imageAcqLastFailed.setter
+    def imageAcqLastFailed(self, failed):
+        if self._producerThread is not None and threading.current_thread() is self._producerThread :
+            self._producerAcqLastFailed = failed
+        else :
+            self._imageAcqLastFailed = failed
+
         
     def setTriggerMode(self, triggerMode):
         """Set the trigger mode 
@@ -130,14 +196,14 @@ class CameraClass:
         
         
     def setCamROI(self, ROI=None) :
-        """Set the ROI of camera (without binning)
+        """Set the ROI of camera (with binning if supported)
         
         Keyword Args:
-            ROI ( None or [int]*4) : [ x offset, y offset, x size, y size],
+            ROI ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels,
                 if None, set to [0, 0, max Width, max height]
             
         Return: 
-            Camera ROI ([int]*4) : [x offset, y offset, x size, y size]
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
         """
         raise NotImplementedError('Function setCamROI not defined')
     
@@ -145,28 +211,335 @@ class CameraClass:
     def startAcquisition(self):
         """Start acquisition or restart if already running """
         raise NotImplementedError('Function startAcquisition not defined')
+
+
+    def setBufferFrames(self, bufferFrames):
+        """Set the number of images in camera driver buffer.
+        Acquisition is restarted (buffer reallocated and cleared) only if the number changes.
+
+        Args:
+            bufferFrames (int) : number of images in buffer
+
+        Return:
+            Number of images in buffer (int)
+        """
+        bufferFrames = int(max(bufferFrames, 1))
+        if bufferFrames != self.bufferFrames :
+            self.bufferFrames = bufferFrames
+            if self.cameraConnected :
+                self.startAcquisition()
+        return self.bufferFrames
     
     
     def clearBuffer(self) :
         """ Clear camera buffer from images. 
         Use before imaging scans to make sure no previously acquired image is present in buffer"""
         raise NotImplementedError('Function startAcquisition not defined')
+
+
+
+    def _discardFrameRing(self):
+        """PROTECTED Mark the unread frames of ring buffer as read, so that get_frame(s) only return frames grabbed after
+        
+        Return:
+            Number of frames discarded (int)
+        """
+        with self._frameRingCondition :
+            discardedFrames = max(self.frameRingWritten - self.frameRingRead, 0)
+            self.frameRingRead = self.frameRingWritten
+        return discardedFrames
+
+
+    def _clearBufferReport(self, discardedFrames, startTime):
+        """PROTECTED Store number of frames discarded by clearBuffer and its duration, print them if clearBufferPrintTiming
+
+        Args:
+            discardedFrames (int) : number of frames discarded from buffer
+
+            startTime (float) : time.perf_counter() value (s) at start of clearBuffer
+        """
+        self.clearBufferDiscardedFrames = int(discardedFrames)
+        self.clearBufferDurationms = (time.perf_counter() - startTime) * 1.e3
+        if self.clearBufferPrintTiming :
+            print('Camera buffer cleared : {0:d} frames discarded in {1:.2f} ms'.format(self.clearBufferDiscardedFrames, self.clearBufferDurationms))
     
         
     def grabArray(self):
         """Get an image from the camera. 
         Wait for trigger if external or generate one if internal.
+        Drivers store (frame index, hardware timestamp) of the image read in Camera.frameInfo.
             
         Return: 
             Camera image (numpy 2D array)
         """
         raise NotImplementedError('Function grabArray not defined')
+
+
+    def _framesMetadata(self, frameInfos, grabStartTime, hostTimes=None):
+        """PROTECTED Make frame metadata records (see Camera.frameMetadataDtype)
+
+        Args:
+            frameInfos ([(int, float)]) : (frame index, hardware timestamp) of each frame given by driver
+
+            grabStartTime (float) : host time (s) at start of grab
+
+        Keyword Args:
+            hostTimes=None (None or [float]) : host time (s) of reception of each frame, if None now
+
+        Return:
+            Frames metadata (numpy 1D structured array)
+        """
+        metadata = np.zeros(len(frameInfos), dtype=self.frameMetadataDtype)
+        if hostTimes is None :
+            hostTimes = time.time()
+        if len(frameInfos) > 0 :
+            metadata['frameIndex'], metadata['hardwareTimestamp'] = zip(*frameInfos)
+        metadata['hostTime'] = hostTimes
+        metadata['grabLatencyms'] = 1e3*(metadata['hostTime'] - grabStartTime)
+        return metadata
+
+
+    def grabArrays(self, n, out=None):
+        """Get n successive images from the camera in one call.
+        Wait for triggers if external or generate them if internal.
+
+            Generic version calling grabArray n times, drivers can redefine it
+            to use the sequence acquisition of the camera.
+            Metadata of the images are stored in Camera.lastFramesMetadata.
+
+        Args:
+            n (int) : number of images
+
+        Keyword Args:
+            out=None (None or numpy 3D array) : preallocated array of shape (n,)+Camera.imageSize to write images in
+
+        Return:
+            Camera images (numpy 3D array, first axis is image index) or False if acquisition failed
+        """
+        if out is None :
+            out = np.zeros((n,)+self.imageSize, dtype=self.imageDtype)
+        grabStartTime = time.time()
+        frameInfos = []
+        hostTimes = []
+        for i in range(n):
+            image = self.grabArray()
+            if self.imageAcqLastFailed :
+                return False
+            hostTimes.append(time.time())
+            frameInfos.append(self.frameInfo)
+            out[i] = image
+        self.lastFramesMetadata = self._framesMetadata(frameInfos, grabStartTime, hostTimes)
+        return out
+
+
+    def start_background_acquisition(self, ringBufferSize=None):
+        """Start a background thread continuously grabbing images into a preallocated ring buffer.
+
+            Images are then obtained with get_frame / get_frames instead of grabArray.
+            Do not change camera settings (trigger, exposure, gain, ROI) while running,
+            stop background acquisition first.
+
+        Keyword Args:
+            ringBufferSize (None or int) : number of frames in ring buffer, if None use Camera.ringBufferSize
+        """
+        if self._producerThread is not None :
+            return
+        if ringBufferSize is not None :
+            self.ringBufferSize = int(ringBufferSize)
+        with self._frameRingCondition :
+            if self.frameRing.shape != (self.ringBufferSize,)+self.imageSize or self.frameRing.dtype != self.imageDtype :
+                self.frameRing = np.zeros((self.ringBufferSize,)+self.imageSize, dtype=self.imageDtype)
+                self.frameRingSequenceNumbers = np.zeros(self.ringBufferSize, dtype=np.int64)
+                self.frameRingMetadata = np.zeros(self.ringBufferSize, dtype=self.frameMetadataDtype)
+                self.frameRingWritten = 0
+                self.frameRingRead = 0
+            self.frameRingRead = self.frameRingWritten # discard frames left by previous background acquisition
+            self.frameRingDropped = 0
+            self.backgroundAcquisitionFailed = False
+        self._producerStop.clear()
+        self._producerAcqLastFailed = False
+        self._producerThread = threading.Thread(target=self._background_acquisition_loop, daemon=True,
+                                                name='CameraProducer'+str(self._cameraNumber))
+        self._producerThread.start()
+
+
+    def stop_background_acquisition(self):
+        """Stop the background acquisition thread.
+
+            Frames left in ring buffer can still be read with get_frame / get_frames until clearBuffer
+            or restart of background acquisition."""
+        producerThread = self._producerThread
+        if producerThread is None :
+            return
+        self._producerStop.set()
+        producerThread.join(self.timeout + 1.)
+        if producerThread.is_alive() :
+            print('WARNING ! : Camera : background acquisition thread did not stop before timeout')
+        self._producerThread = None
+        if self.frameRingDropped > 0 :
+            print('WARNING ! : Camera : '+str(self.frameRingDropped)+' frames dropped (ring buffer full)')
+        with self._frameRingCondition :
+            self._frameRingCondition.notify_all()
+
+
+    def _background_acquisition_loop(self):
+        """PROTECTED producer loop : drain camera into ring buffer until stop is requested or error"""
+        while not self._producerStop.is_set() :
+            grabStartTime = time.time()
+            try :
+                image = self.grabArray()
+            except Exception as error :
+                print('ERROR ! : Camera : background acquisition stopped, error in grabArray : '+repr(error))
+                self._fail_background_acquisition()
+                return
+            if self.imageAcqLastFailed :
+                continue # timeout without trigger
+            metadata = self._framesMetadata([self.frameInfo], grabStartTime)
+            with self._frameRingCondition :
+                if image.shape != self.frameRing.shape[1:] :
+                    print('ERROR ! : Camera : image size changed during background acquisition')
+                    self._fail_background_acquisition()
+                    break
+                if self.frameRingWritten - self.frameRingRead >= self.ringBufferSize :
+                    self.frameRingRead += 1 # overwrite oldest unread frame
+                    self.frameRingDropped += 1
+                slot = self.frameRingWritten % self.ringBufferSize
+                self.frameRing[slot] = image
+                self.frameRingSequenceNumbers[slot] = self.frameRingWritten
+                self.frameRingMetadata[slot] = metadata[0]
+                self.frameRingWritten += 1
+                self._frameRingCondition.notify_all()
+
+
+    def _fail_background_acquisition(self):
+        """PROTECTED set backgroundAcquisitionFailed and wake consumers waiting in get_frame(s), so that they fail at once"""
+        with self._frameRingCondition :
+            self.backgroundAcquisitionFailed = True
+            self._frameRingCondition.notify_all()
+
+
+    def get_frame(self, timeout=None, returnMetadata=False):
+        """Get the oldest unread image.
+
+            Read from ring buffer if background acquisition is running (or unread frames are left),
+            otherwise grab directly with grabArray. Fails at once if background acquisition stopped on an error
+            (backgroundAcquisitionFailed) and no frame is left. Sequence number and metadata of the frame
+            are stored in Camera.lastFrameSequenceNumber and Camera.lastFramesMetadata.
+
+        Keyword Args:
+            timeout (None or float) : maximum waiting time in s, if None use Camera.timeout
+
+            returnMetadata (bool) : if True, also return frame metadata
+
+        Return:
+            Camera image (numpy 2D array), check Camera.imageAcqLastFailed
+            (and frame metadata (numpy structured array of length 1, see Camera.frameMetadataDtype) if returnMetadata)
+        """
+        if timeout is None :
+            timeout = self.timeout
+        with self._frameRingCondition :
+            if self._producerThread is None and self.frameRingWritten <= self.frameRingRead :
+                frame = None
+            elif not self._frameRingCondition.wait_for(lambda : self.frameRingWritten > self.frameRingRead
+                                                       or self._producerThread is None or self.backgroundAcquisitionFailed, timeout) \
+                    or self.frameRingWritten <= self.frameRingRead :
+                if self.backgroundAcquisitionFailed :
+                    print('ERROR ! : Camera : no frame, background acquisition stopped on an error')
+                else :
+                    print('ERROR ! : Camera : timeout, no frame received in background acquisition')
+                self.imageAcqLastFailed = True
+                self.lastFramesMetadata = np.zeros(0, dtype=self.frameMetadataDtype)
+                return (self.image, self.lastFramesMetadata) if returnMetadata else self.image
+            else :
+                slot = self.frameRingRead % self.ringBufferSize
+                frame = self.frameRing[slot].copy()
+                self.lastFrameSequenceNumber = int(self.frameRingSequenceNumbers[slot])
+                self.lastFramesMetadata = self.frameRingMetadata[slot:slot+1].copy()
+                self.frameRingRead += 1
+        if frame is None :
+            grabStartTime = time.time()
+            frame = self.grabArray()
+            self.lastFrameSequenceNumber += 1
+            self.lastFramesMetadata = self._framesMetadata([] if self.imageAcqLastFailed else [self.frameInfo], grabStartTime)
+        else :
+            self.imageAcqLastFailed = False
+            self.image = frame
+        return (frame, self.lastFramesMetadata) if returnMetadata else frame
+
+
+    def get_frames(self, n, timeout=None, returnMetadata=False):
+        """Get the n oldest unread images (see get_frame).
+
+            Use grabArrays if background acquisition is not running and no frame is left in ring buffer.
+
+        Args:
+            n (int) : number of images
+
+        Keyword Args:
+            timeout (None or float) : maximum waiting time in s for each image, if None use Camera.timeout
+
+            returnMetadata (bool) : if True, also return frames metadata
+
+        Return:
+            Camera images (numpy 3D array, first axis is image index), check Camera.imageAcqLastFailed
+            (and frames metadata (numpy structured array of length n, see Camera.frameMetadataDtype) if returnMetadata)
+        """
+        if self._producerThread is None and self.frameRingWritten <= self.frameRingRead :
+            self.lastFramesMetadata = np.zeros(0, dtype=self.frameMetadataDtype)
+            frames = self.grabArrays(n)
+            self.lastFrameSequenceNumber += n
+            return (frames, self.lastFramesMetadata) if returnMetadata else frames
+        frames = np.zeros((n,)+self.imageSize, dtype=self.imageDtype)
+        metadata = np.zeros(n, dtype=self.frameMetadataDtype)
+        for i in range(n):
+            frame = self.get_frame(timeout=timeout)
+            if self.imageAcqLastFailed :
+                frames, metadata = frames[:i], metadata[:i]
+                break
+            frames[i] = frame
+            metadata[i] = self.lastFramesMetadata[0]
+        self.lastFramesMetadata = metadata
+        return (frames, metadata) if returnMetadata else frames
+
+
+    def exposureLevelValue(self, image, Optimization = 'Max'):
+        """Measure the image value optimized by exposureLevelAutoAdjust.
         
+            Only the exposureAutoROI part of the image is used, subsampled with exposureAutoStride.
+            
+        Args:
+            image (numpy 2D array) : camera image
+            
+        Keyword Args:
+            Optimization (str) : 'Max' for exposureAutoMaxPercentile percentile of histogram, or 'Average'
         
+        Return: 
+            Image value (float)          
+        """
+        if self.exposureAutoROI is not None :
+            [x,y,w,h] = self.exposureAutoROI
+            image = image[y:y+h, x:x+w]
+        stride = int(max(self.exposureAutoStride, 1))
+        sample = image[::stride, ::stride]
+        if Optimization == 'Average':
+            return float(sample.mean())
+        elif Optimization == 'Max':
+            rank = min(max(int(np.ceil(self.exposureAutoMaxPercentile/100. * sample.size)) - 1, 0), sample.size - 1)
+            if self.imageBitDepth > 16 : # histogram too large, partial sort of the sample
+                return float(np.partition(sample.ravel(), rank)[rank])
+            histogram = np.bincount(sample.ravel(), minlength=int(self.maxLevel)+1)
+            return float(np.searchsorted(np.cumsum(histogram), rank + 1))
+        else : 
+            raise NameError('Optimisation criterion not defined in exposureLevelAutoAdjust')
+
+
     def exposureLevelAutoAdjust(self, attemptsMax=20, Optimization = 'Max'):
         """Automatic adjustment of exposure for setting image 'Max' or 'Average' to a given level.
         
             Can use  gaindB increase to reach specified level  if maximum exposure is not sufficient.
+            Start at zero gain from the equivalent exposure of the last adjustment of this camera, 
+            bracket the level and refine by secant steps (or bisection) in log-exposure.
+            Gain is only increased again if the maximum exposure is not sufficient.
             
         Keyword Args:
             attemptsMax (int) : Maximum number of steps (images) in optimization
@@ -174,72 +547,70 @@ class CameraClass:
             Optimization (str) : Select image value to optimize 'Max' or 'Average'
         
         Return: 
-            Optimized image value (int)          
+            Optimized image value (float) or False if failed
         """
+        if Optimization == 'Average':
+            level = self.exposureAutoAvLevel/100. * self.maxLevel
+            acceptedRange = self.exposureAutoAvRange/100. * self.maxLevel
+        elif Optimization == 'Max':
+            level = self.exposureAutoMaxLevel/100. * self.maxLevel
+            acceptedRange = self.exposureAutoMaxRange/100. * self.maxLevel
+        else : 
+            raise NameError('Optimisation criterion not defined in exposureLevelAutoAdjust')
+        # start at zero gain from the exposure equivalent to the last converged point of this camera
         self.setGaindB(0)
-        attempts = 0
-        image = self.grabArray()
-        if self.imageAcqLastFailed :
-            return False
-        else :
-            if Optimization == 'Average':
-                level = self.exposureAutoAvLevel/100. * self.maxLevel
-                acceptedRange = self.exposureAutoAvRange/100. * self.maxLevel
-                imageValue = image.mean()
-            elif Optimization == 'Max':
-                level = self.exposureAutoMaxLevel/100. * self.maxLevel
-                acceptedRange = self.exposureAutoMaxRange/100. * self.maxLevel
-                imageValue = image.max()
-            else : 
-                raise NameError('Optimisation criterion not defined in exposureLevelAutoAdjust')
+        if (self._cameraNumber, Optimization) in CameraClass._exposureAutoMemory :
+            exposure, gain = CameraClass._exposureAutoMemory[(self._cameraNumber, Optimization)]
+            self.setExposurems(min(max(exposure * 10.**(gain/20.), self.exposuremsMin), self.exposuremsMax))
+        low = None # (log exposure, log value) below level
+        high = None # (log exposure, log value) above level
+        for attempts in range(attemptsMax) :
             exposure = self.exposurems
-            old_exposure = 0.
-            new_exposure = 0.
-            while abs(imageValue - level) > acceptedRange \
-                    and attempts < attemptsMax:
-                if new_exposure < self.exposuremsMin \
-                        and old_exposure == exposure:
-                    print("WARNING ! : Camera : exposureLevelAutoAdjust \n"\
-                            + "Could not adjust exposure to specified level \n"\
-                            + "Ideal point lower than exposure minimum")
-                    break
-                if new_exposure > self.exposuremsMax \
-                        and old_exposure == exposure:
-                    if self.increaseGain : 
-                        if self.gaindB > (self.gaindBMax-0.1) :
-                            print("WARNING ! : Camera : exposureLevelAutoAdjust"\
-                                    +"\n Could not adjust exposure to specified" \
-                                    +"max level \n Ideal point Higher than "\
-                                    +"exposure maximum\n Maximum hardware gain"\
-                                    +"was used")
-                            break
-                        else:                    
-                            self.setGaindB(self.gaindB + 3)
-                            old_exposure = 0.
-                            continue
-                    else :
-                        print("WARNING !: Camera : exposure_max_level_auto_adjust"\
-                                +"\n Could not adjust exposure to specified level"\
-                                +"level \n Ideal point Higher than exposure"\
-                                +"maximum\n Consider increasing hardware gain")
-                        break  
-                attempts += 1
-                self.setExposurems(new_exposure)
-                exposure =  self.exposurems
-                # return previous image sometime (unknow reason)
-                image = self.grabArray()
-    
-                if Optimization == 'Average':
-                    imageValue = image.mean()
-                elif Optimization == 'Max':
-                    imageValue = image.max()
-                if imageValue == self.maxLevel :
-                    new_exposure = exposure/4.
+            # return previous image sometime (unknow reason)
+            image = self.grabArray()
+            if self.imageAcqLastFailed :
+                return False
+            imageValue = self.exposureLevelValue(image, Optimization=Optimization)
+            if abs(imageValue - level) <= acceptedRange :
+                CameraClass._exposureAutoMemory[(self._cameraNumber, Optimization)] = (self.exposurems, self.gaindB)
+                return imageValue
+            saturated = imageValue >= self.maxLevel
+            point = (np.log(exposure), np.log(max(imageValue, 0.5)))
+            if imageValue < level :
+                low = point
+            else :
+                high = point
+            # next exposure in log scale
+            if saturated and low is None :
+                logExposure = point[0] - np.log(4.) # no information below saturation : divide exposure by 4
+            elif low is not None and high is not None :
+                if saturated :
+                    logExposure = (low[0] + high[0])/2. # bisection
                 else :
-                    new_exposure = exposure * level / (imageValue+ 0.01)
-            if attempts == attemptsMax :
-                print("WARNING ! : Camera : exposure_max_level_auto_adjust \n"\
-                        +"Could not adjust exposure to specified max level")
+                    slope = (high[1] - low[1]) / (high[0] - low[0]) if high[0] != low[0] else 1.
+                    logExposure = low[0] + (np.log(level) - low[1]) / max(slope, 0.1) # secant
+                    if not(min(low[0],high[0]) < logExposure < max(low[0],high[0])) :
+                        logExposure = (low[0] + high[0])/2. # bisection
+            else :
+                logExposure = point[0] + np.log(level) - point[1] # proportional step (linear sensor)
+            newExposure = np.exp(logExposure)
+            if newExposure < self.exposuremsMin and exposure <= self.exposuremsMin :
+                print("WARNING ! : Camera : exposureLevelAutoAdjust \n"\
+                        + "Could not adjust exposure to specified level \n"\
+                        + "Ideal point lower than exposure minimum")
                 return False
-            return imageValue
-        
+            if newExposure > self.exposuremsMax and exposure >= self.exposuremsMax :
+                if self.exposureIncreaseGain and self.gaindB < (self.gaindBMax-0.1) :
+                    # increase gain by missing factor at maximum exposure, signal is measured again from scratch
+                    self.setGaindB(min(self.gaindB + 20.*(logExposure - point[0])/np.log(10.), self.gaindBMax))
+                    low, high = None, None
+                    continue
+                print("WARNING ! : Camera : exposureLevelAutoAdjust"\
+                        +"\n Could not adjust exposure to specified level"\
+                        +"\n Ideal point Higher than exposure maximum"\
+                        +("\n Maximum hardware gain was used" if self.exposureIncreaseGain else "\n Consider increasing hardware gain"))
+                return False
+            self.setExposurems(min(max(newExposure, self.exposuremsMin), self.exposuremsMax))
+        print("WARNING ! : Camera : exposureLevelAutoAdjust \n"\
+                +"Could not adjust exposure to specified level")
+        return False
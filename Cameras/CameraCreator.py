@@ -4,8 +4,10 @@
 Define camera_creator : the Builder / factory that create the Camera object 
 """
 
+import importlib
 from .Config import camerasConfigs
 from .CameraClassDef import CameraClass
+from .ProcessProxyClassDef import ProcessProxyClass
 
 #make lists of cameras driver and model from camerasConfigs
 driverList = []
@@ -27,48 +29,65 @@ for camConfig in camerasConfigs :
         driverList.append('None')
         modelList.append('None') 
 
-# try to import drivers for all cameras listed in camerasConfigs 
-# we do this here rather than on the fly to avoid the import cost at runtime
-loadedDriversList = []
+# record class path of each camera listed in camerasConfigs : driver module is imported only when 
+# the camera is created (in create_Camera) to avoid the import cost of unused SDKs at startup
+loadedDriversDict = {} # cache of imported driver modules : {driver name : module}
 unavailableDriversList = []
 cameraClassNameList = ['None']*len(camerasConfigs)
+cameraClassList = [None]*len(camerasConfigs) # cache of camera classes resolved by load_Camera_class
 for icam in range(len(camerasConfigs)) :
-    if driverList[icam] == 'None' or driverList[icam] in unavailableDriversList :
+    if driverList[icam] == 'None' :
         if icam != 0 :
             print('ERROR ! : Camera number '+str(icam)+' : Config missing driver or driver unvailable')
-    elif driverList[icam] in loadedDriversList and hasattr(eval(driverList[icam]),modelList[icam]+'Class') :
-        # child class for specific model already loaded in previous import, use generic driver class
-        cameraClassNameList[icam] = driverList[icam]+'.'+modelList[icam]+'Class'
-    elif driverList[icam] in loadedDriversList and not(hasattr(eval(driverList[icam]),modelList[icam]+'Class')) :
-        # no child class for specific model, use generic driver class
-        cameraClassNameList[icam] = driverList[icam]+'.'+driverList[icam]+'Class'
-        if modelList[icam] == 'None' and icam != 0 :
-            print('WARNING ! : Camera number '+str(icam)+' : Config missing model')
     else :
+        cameraClassNameList[icam] = driverList[icam]+'.'+modelList[icam]+'Class'
+
+
+def load_Camera_class(cameraNumber) :
+    """Import (once) the driver module of a camera and return its class 
+
+    Use model-specific class if defined in driver module, generic driver class otherwise.
+    
+    Args:
+        cameraNumber (int) : index of camera in camerasConfigs list
+        
+    Return: 
+        Camera class (child class of CameraClass) or None if driver is unavailable
+    """
+    if cameraClassList[cameraNumber] is not None :
+        return cameraClassList[cameraNumber]
+    driver = driverList[cameraNumber]
+    model = modelList[cameraNumber]
+    if driver == 'None' or driver in unavailableDriversList :
+        return None
+    if driver not in loadedDriversDict :
         #try loading the driver
         try : 
-            exec('from . import '+driverList[icam])
-            loadedDriversList.append(driverList[icam])
-            if hasattr(eval(driverList[icam]),modelList[icam]+'Class')  : 
-                # if class exist for model
-                cameraClassNameList[icam] = driverList[icam]+'.'+modelList[icam]+'Class'
-            else : 
-                # no child class for specific model, use generic driver class
-                cameraClassNameList[icam] = driverList[icam]+'.'+driverList[icam]+'Class'
-                if modelList[icam] == 'None' and icam != 0:
-                    print('WARNING ! : Camera number '+str(icam)+' : Config missing model')
-                elif  icam != 0 : 
-                    print("""Advice : Camera number """+str(icam)+""" does not have a model-specific driver. 
-        Loading generic driver class """+str(driverList[icam])+""" instead.
+            loadedDriversDict[driver] = importlib.import_module('.'+driver, __package__)
+        except :
+            unavailableDriversList.append(driver)
+            print('ERROR ! : Camera number '+str(cameraNumber)+' : Config driver '+ driver +'  misspelled or not implemented')
+            return None
+    driverModule = loadedDriversDict[driver]
+    if hasattr(driverModule, model+'Class') : 
+        # if class exist for model
+        cameraClassNameList[cameraNumber] = driver+'.'+model+'Class'
+    else : 
+        # no child class for specific model, use generic driver class
+        cameraClassNameList[cameraNumber] = driver+'.'+driver+'Class'
+        if model == 'None' :
+            print('WARNING ! : Camera number '+str(cameraNumber)+' : Config missing model')
+        else : 
+            print("""Advice : Camera number """+str(cameraNumber)+""" does not have a model-specific driver. 
+        Loading generic driver class """+str(driver)+""" instead.
         If using several camera models from a same manufacturer, 
         define model-specific class (a child class) handling initialization differences.""")
-        except :
-            unavailableDriversList.append(driverList[icam])
-            print('ERROR ! : Camera number '+str(icam)+' : Config driver '+ driverList[icam] +'  misspelled or not implemented')
+    cameraClassList[cameraNumber] = getattr(driverModule, cameraClassNameList[cameraNumber].split('.')[1])
+    return cameraClassList[cameraNumber]
 
 
 
-def create_Camera(cameraNumber, triggerMode=0, exposurems=1., gaindB=0., camROI=None, loadDefault = False): 
+def create_Camera(cameraNumber, triggerMode=0, exposurems=1., gaindB=0., camROI=None, loadDefault = False, processIsolation=None): 
     """Builder / factory that create the Camera object 
     
     With the right specific class (interface with parent class CameraClass) 
@@ -84,11 +103,14 @@ def create_Camera(cameraNumber, triggerMode=0, exposurems=1., gaindB=0., camROI=
         
         gaindB=0. (float) : hardware gain of the camera in dB.
         
-        camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-            [x offset , y offset , x size , y size ] (binning is not implemented)
+        camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+            [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
         
         loadDefault = False  (bool): Decide if default values from cameraConfigs should be set at creation 
         
+        processIsolation = None (None or bool) : Decide if camera driver runs in a separate worker process 
+            (Camera is then a ProcessProxyClass object), if None use cameraConfig key 'processIsolation' (default False)
+        
     Return: 
         Camera object (interface CameraClass)        
     """
@@ -99,15 +121,23 @@ def create_Camera(cameraNumber, triggerMode=0, exposurems=1., gaindB=0., camROI=
             print('WARNING ! : No camera configured for the number '+ str(cameraNumber)+' \n Create empty base camera object')
         #Create empty base camera object if camera number does not match a config
         Camera = CameraClass(0)
+    # initialize camera in a worker process if asked (driver is loaded only in worker process)
+    elif processIsolation or (processIsolation is None and 'processIsolation' in camerasConfigs[cameraNumber] \
+                              and camerasConfigs[cameraNumber]['processIsolation']) :
+        Camera = ProcessProxyClass(cameraNumber, triggerMode=triggerMode, exposurems=exposurems, 
+                                   gaindB=gaindB, camROI=camROI, loadDefault=loadDefault)
+        if not(Camera.cameraDriverInstalled) or not(Camera.cameraConnected) :
+            print('ERROR ! : Camera '+ str(cameraNumber)+' is not connected or driver not installed \n Create empty base camera object')
+            Camera = CameraClass(0)
     # if driver not defined properly => 0 and empty base camera object
-    elif cameraClassNameList[cameraNumber] == 'None' :
+    elif load_Camera_class(cameraNumber) is None :
         print('ERROR ! :Camera '+ str(cameraNumber)+' driver class not defined \n Create empty base camera object')
         #Create empty base camera object if camera number does not match a config
         Camera = CameraClass(0)
     # initialize camera normally
     else :
-        Camera = eval(cameraClassNameList[cameraNumber])(cameraNumber, triggerMode=triggerMode, exposurems=exposurems, 
-                                                         gaindB=gaindB, camROI=camROI, loadDefault=loadDefault)
+        Camera = cameraClassList[cameraNumber](cameraNumber, triggerMode=triggerMode, exposurems=exposurems, 
+                                               gaindB=gaindB, camROI=camROI, loadDefault=loadDefault)
         if not(Camera.cameraDriverInstalled) or not(Camera.cameraConnected) :
             print('ERROR ! : Camera '+ str(cameraNumber)+' is not connected or driver not installed \n Create empty base camera object')
             Camera = CameraClass(0)
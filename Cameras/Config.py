@@ -14,9 +14,10 @@ imageBitDepth = 8, # set bit depth of sensor reading (FLIR : 8 => use mono8 form
 defaultExposurems = 0.2, # default duration of exposition (exposure) in milliseconds
 defaultGaindB = 0., # 'default hardware gain (amplification) at sensor read in dB
 defaultTrigger = 'external', # 'external' or 'software'
-defaultCamROI = None, # (None or [int]*4) : Camera region of interest to read from sensor : None for full senseor or [x offset , y offset , x size , y size ] (binning is not implemented)
+defaultCamROI = None, # (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor : None for full senseor or [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
 defaultFlushSensor = True, # default setting to decide to make flush read of camera before taking an image
 defaultRemoveBackground = False, # default setting to decide if a background image is taken and removed to the previous ones
+bufferFrames = 20, # minimum number of images in camera driver buffer, increased by imaging scans if needed
 defaultROIkrgnames = ['MOT','',''], # try to find the [black, red, green] imaging ROIs via the names indicated here
 pixelCalXumperpx = 1,  #µm/pixel
 pixelCalYumperpx = 1,  #µm/pixel
@@ -43,9 +44,10 @@ imageBitDepth = 10, # set bit depth of sensor reading (Thorlabs => software auto
 defaultExposurems = 0.2, # default duration of exposition (exposure) in milliseconds
 defaultGaindB = 0., # 'default hardware gain (amplification) at sensor read in dB
 defaultTrigger = 'external', # 'external' or 'software'
-defaultCamROI = None, # (None or [int]*4) : Camera region of interest to read from sensor : None for full senseor or [x offset , y offset , x size , y size ] (binning is not implemented)
+defaultCamROI = None, # (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor : None for full senseor or [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
 defaultFlushSensor = False, # default setting to decide to make flush read of camera before taking an image
 defaultRemoveBackground = False, # default setting to decide if a background image is taken and removed to the previous ones
+bufferFrames = 20, # minimum number of images in camera driver buffer, increased by imaging scans if needed
 defaultROIkrgnames = ['MOT','',''],# try to find the [black, red, green] imaging ROIs via the names indicated here
 pixelCalXumperpx = 1, #µm/pixel
 pixelCalYumperpx = 1, #µm/pixel
@@ -64,3 +66,92 @@ Imaging__laserIntensity = 10., # laser intensity used for fluorescence imaging i
 Imaging__laserDetuningMHz = 0., # laser detunning from resonance in fluo imaging : default value
 ),]
 
+# Example configs of cameras without hardware, for tests and benchmarks (see Simulated and Replay drivers in documentation) :
+# uncomment and append to camerasConfigs list to use them
+#
+# # Camera number 3
+# dict(name = 'Simulated MOT', # Name chosen by user 
+# driver = 'Simulated', # Simulated camera : synthetic images without hardware, for tests and benchmarks of acquisition and analysis
+# model = 'Simulated', # Model name if model+'Class' match name of a Class defined in driver file, use specific child class otherwise use generic driver+'Class'
+# serial = 0, # serial number of the camera, not used for simulated camera
+# imageBitDepth = 12, # set bit depth of simulated sensor
+# defaultExposurems = 1., # default duration of exposition (exposure) in milliseconds
+# defaultGaindB = 0., # 'default hardware gain (amplification) at sensor read in dB
+# defaultTrigger = 'external', # 'external' or 'software'
+# defaultCamROI = None, # (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor : None for full senseor or [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
+# defaultFlushSensor = False, # default setting to decide to make flush read of camera before taking an image
+# defaultRemoveBackground = False, # default setting to decide if a background image is taken and removed to the previous ones
+# bufferFrames = 20, # minimum number of images in camera driver buffer, increased by imaging scans if needed
+# defaultROIkrgnames = ['MOT','',''],# try to find the [black, red, green] imaging ROIs via the names indicated here
+# pixelCalXumperpx = 5, #µm/pixel
+# pixelCalYumperpx = 5, #µm/pixel
+# reversedAxes = [False, False], # decide if for each axis X and Y, if it will be reversed 
+# cameraQuantumEff = 0.5, # at imaging wavelenght 
+# numericalAperture = 0.1, # sin(arctan(D/(2f)))
+# sensorSizepx = [1280, 1024], # [width, height] of simulated sensor in pixels
+# simulatedSequence = ['atoms', 'reference'], # cyclic sequence of frame types 'atoms', 'reference', 'background', 'flush' : has to match flush and background settings of Imaging
+# simulatedImagingTypeText = 'Absorption Imaging', # 'Absorption Imaging' or 'Fluorescence Imaging' 
+# simulatedCloudRadiipx = [40., 60.], # [Y, X] gaussian sigma of the simulated cloud in pixels
+# simulatedCloudPositionpx = [0., 0.], # [Y, X] position of the simulated cloud relative to sensor center in pixels
+# simulatedCloudJitterpx = 2., # standard deviation of the shot to shot position jitter in pixels
+# simulatedCloudPeakOD = 1., # peak optical density of the simulated cloud (absorption imaging)
+# simulatedFluoLevel = 0.3, # peak fluorescence level as fraction of maximum level (fluorescence imaging)
+# simulatedLightLevel = 0.6, # imaging light level as fraction of maximum level at reference exposure and 0 dB
+# simulatedBackgroundLevel = 0.02, # background level as fraction of maximum level
+# simulatedReferenceExposurems = 1., # exposure in ms at which light levels are defined
+# simulatedShotNoise = True, # add Poisson noise on counts
+# simulatedReadNoise = 2., # standard deviation of readout noise in counts
+# simulatedFrameRateHz = 0., # maximum frame rate in Hz, 0. to serve frames as fast as possible
+# simulatedSeed = None, # seed of random generator (int) for reproducible images, None for random
+# Imaging__backgroundAcquisition = False, # grab images in a background thread into a ring buffer during scans
+# ringBufferSize = 16, # number of images in ring buffer of background acquisition
+# processIsolation = False, # run camera driver in a separate worker process, images passed through shared memory
+# Imaging__imagingTypeText = 'Absorption Imaging', # 'Absorption Imaging' or 'Fluorescence Imaging' 
+# Imaging__atomicMassAU = 86.909, #e atom mass in atomic units
+# Imaging__atomicFrequencyTHz = 384.23, #transition frequency in THz
+# Imaging__Isat = 16.693, # W/m² effective saturation intensity : default value
+# Imaging__atomicLineFWHWinMHz = 6.066, # Gamma = 2 * pi * Imaging__atomTransitionFWHWinMHz * 10^6,   atomic natural linewidth in MHz (full width at half maximum in frequency)
+# Imaging__thresholdAbsImg = 15, # minimum measureed intensity (e per pixel) on ref frame to compute the absorption : default value
+# Imaging__includeSaturationEffects = True, # add correction due to saturation of atomic response to atomic density : default value
+# Imaging__laserPulseDurationus = 50., # laser pulse lenght used for imaging in µs : default value
+# Imaging__laserIntensity = 10., # laser intensity used for fluorescence imaging in W/m² or uW/mm² : default value
+# Imaging__laserDetuningMHz = 0., # laser detunning from resonance in fluo imaging : default value
+# ),
+# # Camera number 4
+# dict(name = 'Replay MOT', # Name chosen by user 
+# driver = 'Replay', # Replay camera : images saved by Imaging served again without hardware, for re-analysis and benchmarks
+# model = 'Replay', # Model name if model+'Class' match name of a Class defined in driver file, use specific child class otherwise use generic driver+'Class'
+# serial = 0, # serial number of the camera, not used for replay camera
+# imageBitDepth = 12, # bit depth of camera used for saved images
+# defaultExposurems = 1., # default duration of exposition (exposure) in milliseconds
+# defaultGaindB = 0., # 'default hardware gain (amplification) at sensor read in dB
+# defaultTrigger = 'external', # 'external' or 'software'
+# defaultCamROI = None, # (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor : None for full senseor or [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
+# defaultFlushSensor = False, # default setting to decide to make flush read of camera before taking an image
+# defaultRemoveBackground = False, # default setting to decide if a background image is taken and removed to the previous ones
+# bufferFrames = 20, # minimum number of images in camera driver buffer, increased by imaging scans if needed
+# defaultROIkrgnames = ['MOT','',''],# try to find the [black, red, green] imaging ROIs via the names indicated here
+# pixelCalXumperpx = 5, #µm/pixel
+# pixelCalYumperpx = 5, #µm/pixel
+# reversedAxes = [False, False], # decide if for each axis X and Y, if it will be reversed 
+# cameraQuantumEff = 0.5, # at imaging wavelenght 
+# numericalAperture = 0.1, # sin(arctan(D/(2f)))
+# replayDirAndFileName = '', # path and base file name of saved images (Imaging dirAndFileName), without '_scan##' suffixes nor extension
+# replayImagesFormat = 0, # format of saved images : 0:NPZ (numpy) 1: PNG, 2: TIFF
+# replayFlushSensor = False, # insert a black flush frame before each image : has to match flush setting of Imaging
+# replayPreload = True, # load all saved images in memory at camera creation
+# replayFrameRateHz = 0., # maximum frame rate in Hz, 0. to serve frames as fast as possible
+# Imaging__backgroundAcquisition = False, # grab images in a background thread into a ring buffer during scans
+# ringBufferSize = 16, # number of images in ring buffer of background acquisition
+# Imaging__imagingTypeText = 'Absorption Imaging', # 'Absorption Imaging' or 'Fluorescence Imaging' 
+# Imaging__atomicMassAU = 86.909, #e atom mass in atomic units
+# Imaging__atomicFrequencyTHz = 384.23, #transition frequency in THz
+# Imaging__Isat = 16.693, # W/m² effective saturation intensity : default value
+# Imaging__atomicLineFWHWinMHz = 6.066, # Gamma = 2 * pi * Imaging__atomTransitionFWHWinMHz * 10^6,   atomic natural linewidth in MHz (full width at half maximum in frequency)
+# Imaging__thresholdAbsImg = 15, # minimum measureed intensity (e per pixel) on ref frame to compute the absorption : default value
+# Imaging__includeSaturationEffects = True, # add correction due to saturation of atomic response to atomic density : default value
+# Imaging__laserPulseDurationus = 50., # laser pulse lenght used for imaging in µs : default value
+# Imaging__laserIntensity = 10., # laser intensity used for fluorescence imaging in W/m² or uW/mm² : default value
+# Imaging__laserDetuningMHz = 0., # laser detunning from resonance in fluo imaging : default value
+# ),
+
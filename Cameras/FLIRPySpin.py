@@ -4,6 +4,7 @@
 Define camera driver classes for FLIR cameras
 """
 
+import time
 import numpy as np
 from .CameraClassDef import CameraClass
 
@@ -35,8 +36,8 @@ class FLIRPySpinClass(CameraClass) :
             
             gaindB=0. (float) : hardware gain of the camera in dB.
             
-            camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation 
                         
@@ -106,10 +107,7 @@ class FLIRPySpinClass(CameraClass) :
                             self.wpx/2*self.pixelCalXumperpx,
                             -self.hpx/2*self.pixelCalYumperpx,
                             self.hpx/2*self.pixelCalYumperpx]
-        # set camera buffer count to 20 images 
-        self.pySpinCamera.TLStream.StreamBufferCountManual.SetValue(20)
-        # 
-        #start acquisition
+        #start acquisition (with camera buffer count set to bufferFrames images)
         self.startAcquisition()
         self.startAcquisition() # to solve bug appearring on 25/05/2021
         self.cameraConnected = True
@@ -200,11 +198,11 @@ class FLIRPySpinClass(CameraClass) :
         """Rounding of ROI values to closest possible one according to camera rules
         
         Keyword Args:
-            ROI = None ( None or [int]*4) : [# x offset, y offset, x size, y size] 
+            ROI = None ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels 
                 if None, set to [0, 0, max Width, max height]
             
         Return: 
-            Camera ROI ([int]*4): [ x offset, y offset, x size, y size]
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
         """
         rules = [self.pySpinCamera.OffsetX.GetInc(),
                  self.pySpinCamera.OffsetY.GetInc(),
@@ -216,31 +214,33 @@ class FLIRPySpinClass(CameraClass) :
             def rounding(a) :
                 val, step = a
                 return int(val - (val % step))
-            [x,y,w,h] = ROI
+            [x,y,w,h] = ROI[:4]
+            if len(ROI) == 6 and list(ROI[4:6]) != [1,1] :
+                print('WARNING ! : Binning not implemented for FLIRPySpin camera, ROI set without binning')
             x = int(max(min(x,self.wpxmax-w), 0))
             y = int(max(min(y,self.hpxmax-h), 0))
-            return map(rounding, zip([x,y,w,h], rules))
+            return list(map(rounding, zip([x,y,w,h], rules))) + [1, 1]
         else:
-            return [0, 0, self.wpxmax , self.hpxmax]
+            return [0, 0, self.wpxmax , self.hpxmax, 1, 1]
 
 
     def setCamROI(self, ROI=None) :
-        """Set the ROI of camera (without binning)
+        """Set the ROI of camera (with binning if supported)
         
         Keyword Args:
-            ROI = None ( None or [int]*4) : [ x offset, y offset, x size, y size] 
+            ROI = None ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels 
                 if None, set to [0, 0, max Width, max height]
             
         Return: 
-            Camera ROI ([int]*4) : [ x offset, y offset, x size, y size]
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
         """
         acqStarted = self.pySpinCamera.IsStreaming()
         if acqStarted : #stop acquisition if already started
             self.pySpinCamera.EndAcquisition()
         self.camROI = self.roundCamROI(ROI)
-        [x,y,w,h] = self.camROI
+        [x,y,w,h,xbin,ybin] = self.camROI
         self.pySpinCamera.OffsetX.SetValue(x)
-        self.pySpinCamera.OffsetX.SetValue(y)
+        self.pySpinCamera.OffsetY.SetValue(y)
         self.wpx = w #width
         self.pySpinCamera.Width.SetValue(w)
         self.hpx = h #height
@@ -253,14 +253,23 @@ class FLIRPySpinClass(CameraClass) :
         """Start acquisition or restart if already running """
         if self.pySpinCamera.IsStreaming() :
             self.pySpinCamera.EndAcquisition()
+        streamBufferCount = int(min(self.bufferFrames, self.pySpinCamera.TLStream.StreamBufferCountManual.GetMax()))
+        self.pySpinCamera.TLStream.StreamBufferCountManual.SetValue(streamBufferCount)
         self.pySpinCamera.BeginAcquisition()
     
     
     def clearBuffer(self) :
         """ Clear camera buffer from images. 
-        Use before imaging scans to make sure no previously acquired image is present in buffer"""
-        while self.pySpinCamera.TLStream.StreamOutputBufferCount() > 0 :
-            self._image = self.pySpinCamera.GetNextImage(int(100))
+        Use before imaging scans to make sure no previously acquired image is present in buffer.
+        
+            Acquisition is restarted if images are waiting in stream buffers : this flushes them 
+            without transferring them one by one, number of discarded frames and duration are 
+            stored in clearBufferDiscardedFrames and clearBufferDurationms"""
+        startTime = time.perf_counter()
+        discardedFrames = self.pySpinCamera.TLStream.StreamOutputBufferCount()
+        if discardedFrames > 0 or not self.pySpinCamera.IsStreaming() :
+            self.startAcquisition()
+        self._clearBufferReport(discardedFrames + self._discardFrameRing(), startTime)
 
 
     def grabArray(self) :
@@ -282,6 +291,7 @@ class FLIRPySpinClass(CameraClass) :
                 self.imageAcqLastFailed = True
                 return False
             else :
+                self.frameInfo = (self._image.GetFrameID(), 1e-9*self._image.GetTimeStamp()) # timestamp in s
                 if self.reversedAxes == [False, False] :
                     self.image = np.array(self._image.GetNDArray()) >> self.imageBitsToShift
                 elif self.reversedAxes == [True, False] :
@@ -301,6 +311,62 @@ class FLIRPySpinClass(CameraClass) :
         return self.image.copy()
 
 
+    def grabArrays(self, n, out=None) :
+        """Get n successive images from the camera in one call.
+        Wait for triggers if external or generate them if internal.
+
+            Images are written directly in the stacked array and their camera buffers released.
+
+        Args:
+            n (int) : number of images
+
+        Keyword Args:
+            out=None (None or numpy 3D array) : preallocated array of shape (n,)+Camera.imageSize to write images in
+
+        Return:
+            Camera images (numpy 3D array, first axis is image index) or False if acquisition failed
+        """
+        self.imageAcqLastFailed = False
+        if out is None :
+            out = np.empty((n,)+self.imageSize, dtype=self.imageDtype)
+        if self.reversedAxes == [True, False] :
+            orientation = (slice(None), slice(None,None,-1)) #X axis is second dimension in image array
+        elif self.reversedAxes == [False, True] :
+            orientation = (slice(None,None,-1), slice(None)) #Y axis is first dimension in image array
+        elif self.reversedAxes == [True, True] :
+            orientation = (slice(None,None,-1), slice(None,None,-1))
+        else :
+            orientation = (slice(None), slice(None))
+        grabStartTime = time.time()
+        frameInfos = []
+        hostTimes = []
+        try: 
+            if not self.pySpinCamera.IsStreaming() : # normally should not happen but if acquisition stopped, restart it
+                self.startAcquisition()
+            for i in range(n) :
+                if self.triggerMode==1 :   
+                    self.sendSoftwareTrigger()
+                self._image = self.pySpinCamera.GetNextImage(int(1000*self.timeout))
+                if self._image.IsIncomplete():
+                    print('ERROR ! : Image incomplete with image status %d ...' % self._image.GetImageStatus())
+                    self._image.Release()
+                    self.imageAcqLastFailed = True
+                    return False
+                hostTimes.append(time.time())
+                self.frameInfo = (self._image.GetFrameID(), 1e-9*self._image.GetTimeStamp()) # timestamp in s
+                frameInfos.append(self.frameInfo)
+                np.right_shift(self._image.GetNDArray()[orientation], self.imageBitsToShift, out=out[i], casting='unsafe')
+                self._image.Release()
+        except PySpin.SpinnakerException as ex:
+            print('ERROR : %s' % ex)
+            print('Failed to grab array from camera : probably Timeout')
+            self.imageAcqLastFailed = True
+            return False
+        self.image = out[-1]
+        self.lastFramesMetadata = self._framesMetadata(frameInfos, grabStartTime, hostTimes)
+        return out
+
+
 
 class ExampleModelClass(FLIRPySpinClass) :
     """Model-specific class for ... FLIR camera using PySpin python driver.
@@ -322,8 +388,8 @@ class ExampleModelClass(FLIRPySpinClass) :
             
             gaindB=0. (float) : hardware gain of the camera in dB.
             
-            camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation 
                         
@@ -363,8 +429,8 @@ class Chameleon3Class(FLIRPySpinClass) :
             
             gaindB=0. (float) : hardware gain of the camera in dB.
             
-            camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation 
                         
@@ -33,8 +33,8 @@ class IDSueyeClass(PylablibInterfaceClass) :
             
             gaindB=0. (float) : hardware gain of the camera in dB.
             
-            camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation 
                         
@@ -147,7 +147,7 @@ class IDSueyeClass(PylablibInterfaceClass) :
     def startAcquisition(self):
         """Start acquisition or restart if already running """
         # common to Icamera interface but args,kwargs depend on camera driver/model
-        self.pylablibCamera.start_acquisition(frames_per_trigger=1, auto_start=False, nframes=20) #set buffer size to 20
+        self.pylablibCamera.start_acquisition(frames_per_trigger=1, auto_start=False, nframes=self.bufferFrames) #set buffer size
 
 
 
@@ -172,8 +172,8 @@ class ExampleModelClass(IDSueyeClass) :
             
             gaindB=0. (float) : hardware gain of the camera in dB.
             
-            camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation 
                         
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+
+"""
+Define ProcessProxyClass : Camera interface running the camera driver in a separate worker process
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+import time
+import numpy as np
+from .CameraClassDef import CameraClass
+
+
+# Camera attributes copied from the worker process camera to the proxy after each command
+proxyStateAttributes = ['cameraDriverInstalled', 'cameraConnected', 'triggerMode',
+                        'exposurems', 'exposuremsMin', 'exposuremsMax', 'gaindB', 'gaindBMin', 'gaindBMax',
+                        'camROI', 'camBinning', 'wpx', 'hpx', 'wpxmax', 'hpxmax', 'imageSize',
+                        'pixelCalXumperpx', 'pixelCalYumperpx', 'imageLimits', 'reversedAxes',
+                        'imageBitDepth', 'maxLevel', 'imageDtype', 'bufferFrames', 'timeout', 'frameInfo',
+                        'clearBufferDiscardedFrames', 'clearBufferDurationms']
+
+
+def _camera_state(Camera) :
+    """PROTECTED Get the attributes of proxyStateAttributes of a camera
+
+    Args:
+        Camera (CameraClass) : Camera object
+
+    Return:
+        Camera state (dict)
+    """
+    return {k : getattr(Camera, k) for k in proxyStateAttributes if hasattr(Camera, k)}
+
+
+def _camera_worker(cameraNumber, cameraKwargs, conn, freeSlots) :
+    """PROTECTED Main function of the camera worker process : own the camera driver and run the commands of the proxy
+
+        Commands received on conn are tuples (command id, method name, args, kwargs).
+        Images are written in shared memory slots (one free slot is taken from freeSlots semaphore for each image)
+        and announced by ('frame', command id, slot, frame info) messages, the result of each command is sent as
+        ('done', command id, result, imageAcqLastFailed, camera state).
+
+    Args:
+        cameraNumber (int) : index of camera in camerasConfigs list
+
+        cameraKwargs (dict) : keyword arguments of create_Camera
+
+        conn (multiprocessing.connection.Connection) : worker end of the pipe with the proxy
+
+        freeSlots (multiprocessing.Semaphore) : number of shared memory slots free for writing
+    """
+    from .CameraCreator import create_Camera
+    Camera = create_Camera(cameraNumber, processIsolation=False, **cameraKwargs)
+    conn.send(('done', 0, None, False, _camera_state(Camera)))
+    sharedMemory = None
+    slotsNumber = 1
+    slotBytes = 0
+    slotIndex = 0
+    while True :
+        try :
+            commandId, name, args, kwargs = conn.recv()
+        except EOFError : # proxy closed
+            break
+        result = None
+        try :
+            if name == 'close' :
+                break
+            elif name == 'attachSharedMemory' :
+                if sharedMemory is not None :
+                    sharedMemory.close()
+                sharedMemory = shared_memory.SharedMemory(name=args[0])
+                slotsNumber, slotBytes = args[1], args[2]
+            elif name == 'grabArrays' :
+                n = args[0]
+                if n == 1 :
+                    images = Camera.grabArray()
+                    framesMetadata = Camera._framesMetadata([] if Camera.imageAcqLastFailed else [Camera.frameInfo], time.time())
+                    images = None if Camera.imageAcqLastFailed else images[np.newaxis]
+                else :
+                    images = Camera.grabArrays(n)
+                    framesMetadata = Camera.lastFramesMetadata
+                    if Camera.imageAcqLastFailed or images is False :
+                        images = None
+                if images is not None :
+                    for i in range(len(images)) :
+                        if not freeSlots.acquire(timeout=Camera.timeout) :
+                            print('ERROR ! : Camera worker : no shared memory slot freed by proxy')
+                            Camera.imageAcqLastFailed = True
+                            break
+                        slot = slotIndex % slotsNumber
+                        slotIndex += 1
+                        np.ndarray(images[i].shape, dtype=images[i].dtype, buffer=sharedMemory.buf,
+                                   offset=slot*slotBytes)[...] = images[i]
+                        conn.send(('frame', commandId, slot, framesMetadata[i:i+1]))
+            else :
+                result = getattr(Camera, name)(*args, **kwargs)
+        except Exception as e :
+            print('ERROR ! : Camera worker : command '+str(name)+' failed : '+str(e))
+            Camera.imageAcqLastFailed = True
+        conn.send(('done', commandId, result, Camera.imageAcqLastFailed, _camera_state(Camera)))
+    del(Camera)
+    if sharedMemory is not None :
+        sharedMemory.close()
+    conn.close()
+
+
+
+class ProcessProxyClass(CameraClass) :
+    """Camera interface running the camera driver (any driver of camerasConfigs) in a separate worker process.
+
+    Used if cameraConfig key 'processIsolation' is True : the SDK of the camera is loaded only in the worker process,
+    so that SDK calls holding the GIL or hanging do not freeze the user interface and the analysis.
+    Commands are sent to the worker through a pipe, images are passed through shared memory slots
+    ('processSharedSlots' in cameraConfig) without pickling, camera attributes are copied from the worker after each command.
+    A command without answer before the camera timeout (plus 'processTimeoutMargins') is considered failed."""
+
+    def __init__(self, cameraNumber, triggerMode=0, exposurems=1,
+                 gaindB=1, camROI=None, loadDefault = False) :
+        """Initialize the Camera object : start the worker process that creates the camera
+
+        Args:
+            cameraNumber (int) : index of camera in camerasConfigs list
+
+        Keyword Args:
+            triggerMode=0  (int) : 0 for hardware/external, 1 for software/internal
+
+            exposurems=1. (float) : Exposition duration (exposure) in ms.
+
+            gaindB=0. (float) : hardware gain of the camera in dB.
+
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
+
+            loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation
+
+        Return:
+            ProcessProxyClass camera object
+        """
+        super().__init__(cameraNumber, triggerMode=triggerMode, exposurems=exposurems,
+                         gaindB=gaindB, camROI=camROI, loadDefault=loadDefault)
+        self._workerProcess = None
+        self._sharedMemory = None
+        self._commandLock = threading.Lock()
+        self._commandId = 0
+        if self.cameraConfig is None :
+            return
+        self.processSharedSlots = 4 # number of images in shared memory
+        if 'processSharedSlots' in self.cameraConfig :
+            self.processSharedSlots = int(max(self.cameraConfig['processSharedSlots'], 1))
+        self.processTimeoutMargins = 5. # added to camera timeout to wait for worker answers
+        if 'processTimeoutMargins' in self.cameraConfig :
+            self.processTimeoutMargins = float(self.cameraConfig['processTimeoutMargins'])
+        # start worker process (spawn : no copy of parent process state, in particular of GUI)
+        context = multiprocessing.get_context('spawn')
+        self._conn, workerConn = context.Pipe()
+        self._freeSlots = context.Semaphore(self.processSharedSlots)
+        cameraKwargs = dict(triggerMode=triggerMode, exposurems=exposurems, gaindB=gaindB,
+                            camROI=camROI, loadDefault=loadDefault)
+        self._workerProcess = context.Process(target=_camera_worker, args=(cameraNumber, cameraKwargs, workerConn, self._freeSlots),
+                                              daemon=True, name='CameraWorker'+str(cameraNumber))
+        self._workerProcess.start()
+        workerConn.close()
+        # wait for camera creation in worker (connection to camera can be long)
+        if self._waitResult(0, timeout=self.timeout + self.processTimeoutMargins) is None or not(self.cameraConnected) :
+            print('ERROR ! : Camera worker process could not connect camera '+str(cameraNumber))
+            self.close()
+            return
+        # shared memory slots large enough for a full sensor image
+        self._slotBytes = int(self.wpxmax * self.hpxmax * np.dtype(self.imageDtype).itemsize)
+        self._sharedMemory = shared_memory.SharedMemory(create=True, size=max(self._slotBytes*self.processSharedSlots, 1))
+        self._call('attachSharedMemory', self._sharedMemory.name, self.processSharedSlots, self._slotBytes)
+        self.image = np.zeros(self.imageSize, dtype=self.imageDtype)
+
+
+    def __del__(self) :
+        """Delete the Camera object by calling close function
+
+        Close the Camera and free memory"""
+        self.close()
+        super().__del__() #ALWAYS call at end of any child class del
+
+
+    def close(self) :
+        """Stop the worker process (closing the camera) and free shared memory"""
+        workerProcess = self.__dict__.get('_workerProcess', None)
+        if workerProcess is not None :
+            self._workerProcess = None
+            try :
+                self._conn.send((-1, 'close', (), {}))
+                workerProcess.join(self.timeout)
+            except :
+                pass
+            if workerProcess.is_alive() :
+                print('WARNING ! : Camera worker process did not stop, terminate it')
+                workerProcess.terminate()
+            self._conn.close()
+        sharedMemory = self.__dict__.get('_sharedMemory', None)
+        if sharedMemory is not None :
+            self._sharedMemory = None
+            sharedMemory.close()
+            sharedMemory.unlink()
+        self.cameraConnected = False
+
+
+    def _waitResult(self, commandId, timeout=None, out=None) :
+        """PROTECTED Wait for the answer of the worker to a command, and copy images received in out
+
+        Args:
+            commandId (int) : id of the command
+
+        Keyword Args:
+            timeout=None (None or float) : maximum waiting time in s between messages, if None camera timeout plus processTimeoutMargins
+
+            out=None (None or numpy 3D array) : array to write images received in, in order
+
+        Return:
+            (result of command, frames metadata) or None if worker did not answer
+        """
+        if timeout is None :
+            timeout = self.timeout + self.processTimeoutMargins
+        framesMetadata = []
+        while True :
+            if self._workerProcess is None or not self._conn.poll(timeout) :
+                print('ERROR ! : Camera worker process not responding')
+                self.imageAcqLastFailed = True
+                return None
+            message = self._conn.recv()
+            if message[0] == 'frame' :
+                _, messageId, slot, frameMetadata = message
+                if messageId == commandId and out is not None and len(framesMetadata) < len(out) :
+                    out[len(framesMetadata)] = np.ndarray(self.imageSize, dtype=self.imageDtype,
+                                                          buffer=self._sharedMemory.buf, offset=slot*self._slotBytes)
+                    framesMetadata.append(frameMetadata)
+                self._freeSlots.release() # slot copied (or image of an old command) : free for worker
+            elif message[1] == commandId :
+                _, _, result, failed, state = message
+                for k, v in state.items() :
+                    setattr(self, k, v)
+                self.imageAcqLastFailed = failed
+                if len(framesMetadata) > 0 :
+                    framesMetadata = np.concatenate(framesMetadata)
+                else :
+                    framesMetadata = np.zeros(0, dtype=self.frameMetadataDtype)
+                return result, framesMetadata
+            # else : answer of an old command after timeout, ignored
+
+
+    def _call(self, name, *args, out=None, **kwargs) :
+        """PROTECTED Run a method of the camera in the worker process and update proxy attributes
+
+        Args:
+            name (str) : name of method
+
+            args : arguments of method
+
+        Keyword Args:
+            out=None (None or numpy 3D array) : array to write images received in
+
+            kwargs : keyword arguments of method
+
+        Return:
+            (result of method, frames metadata) or None if worker did not answer
+        """
+        with self._commandLock :
+            self._commandId += 1
+            try :
+                self._conn.send((self._commandId, name, args, kwargs))
+            except :
+                print('ERROR ! : Camera worker process is closed')
+                self.imageAcqLastFailed = True
+                return None
+            return self._waitResult(self._commandId, out=out)
+
+
+    def _callResult(self, name, *args, **kwargs) :
+        """PROTECTED Run a method of the camera in the worker process and return its result (None if failed)"""
+        answer = self._call(name, *args, **kwargs)
+        return None if answer is None else answer[0]
+
+
+    def setTriggerMode(self, triggerMode):
+        """Set the trigger mode
+
+        Args:
+            triggerMode (int) :  0 for hardware/external, 1 for software/internal
+        """
+        if not(triggerMode in [0, 1]) :
+            raise NameError('Trigger mode number not defined ')
+        self._callResult('setTriggerMode', triggerMode)
+
+
+    def sendSoftwareTrigger(self):
+        """Send a software trigger to the camera to start an exposure"""
+        self._callResult('sendSoftwareTrigger')
+
+
+    def setExposurems(self, exposurems):
+        """Set the duration of the exposition
+
+        Args:
+            exposurems (float) : Exposition duration (exposure) in ms.
+        """
+        self._callResult('setExposurems', exposurems)
+
+
+    def setGaindB(self, gaindB):
+        """Set the hardware gain of camera readout
+
+        Args:
+            gaindB (float) : hardware gain of the camera in dB.
+        """
+        self._callResult('setGaindB', gaindB)
+
+
+    def roundCamROI(self, ROI=None) :
+        """Rounding of ROI values to closest possible one according to camera rules
+
+        Keyword Args:
+            ROI = None ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels
+                if None, set to [0, 0, max Width, max height]
+
+        Return:
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
+        """
+        return self._callResult('roundCamROI', ROI)
+
+
+    def setCamROI(self, ROI=None) :
+        """Set the ROI of camera (with binning if supported)
+
+        Keyword Args:
+            ROI ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels,
+                if None, set to [0, 0, max Width, max height]
+
+        Return:
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
+        """
+        self._callResult('setCamROI', ROI)
+        return self.camROI
+
+
+    def startAcquisition(self):
+        """Start acquisition or restart if already running """
+        self._callResult('startAcquisition')
+
+
+    def setBufferFrames(self, bufferFrames):
+        """Set the number of images in camera driver buffer.
+        Acquisition is restarted (buffer reallocated and cleared) only if the number changes.
+
+        Args:
+            bufferFrames (int) : number of images in buffer
+
+        Return:
+            Number of images in buffer (int)
+        """
+        self._callResult('setBufferFrames', bufferFrames)
+        return self.bufferFrames
+
+
+    def clearBuffer(self) :
+        """ Clear camera buffer from images.
+        Use before imaging scans to make sure no previously acquired image is present in buffer
+        (in worker process and in ring buffer of background acquisition)"""
+        self._discardFrameRing()
+        self._callResult('clearBuffer')
+
+
+    def grabArray(self) :
+        """Get an image from the camera.
+        Wait for trigger if external or generate one if internal.
+
+        Return:
+            Camera image (numpy 2D array)
+        """
+        images = self.grabArrays(1)
+        if self.imageAcqLastFailed :
+            return False
+        self.image = images[0]
+        return self.image
+
+
+    def grabArrays(self, n, out=None) :
+        """Get n successive images from the camera in one call.
+        Wait for triggers if external or generate them if internal.
+
+            The worker grabs all images (Camera.grabArrays) before writing them in shared memory slots, 
+            images are copied from a slot as soon as it is written, while the worker writes the next slots.
+            Metadata of the images are stored in Camera.lastFramesMetadata.
+
+        Args:
+            n (int) : number of images
+
+        Keyword Args:
+            out=None (None or numpy 3D array) : preallocated array of shape (n,)+Camera.imageSize to write images in
+
+        Return:
+            Camera images (numpy 3D array, first axis is image index) or False if acquisition failed
+        """
+        if out is None :
+            out = np.zeros((n,)+self.imageSize, dtype=self.imageDtype)
+        answer = self._call('grabArrays', n, out=out)
+        if answer is None or self.imageAcqLastFailed or len(answer[1]) < n :
+            self.imageAcqLastFailed = True
+            return False
+        self.lastFramesMetadata = answer[1]
+        self.frameInfo = (int(answer[1]['frameIndex'][-1]), float(answer[1]['hardwareTimestamp'][-1]))
+        return out
@@ -4,6 +4,7 @@
 Define class interface of PyLabLib general driver for most of cameras
 """
 
+import time
 import numpy as np
 
 from .CameraClassDef import CameraClass
@@ -36,8 +37,8 @@ class PylablibInterfaceClass(CameraClass) :
             
             gaindB=0. (float) : hardware gain of the camera in dB.
             
-            camROI=None (None or [int]*4) : Camera region of interest to read from sensor
-                [x offset , y offset , x size , y size ] (binning is not implemented)
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
             
             loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation 
                         
@@ -103,11 +104,11 @@ class PylablibInterfaceClass(CameraClass) :
         """Rounding of ROI values to closest possible one according to camera rules
         
         Keyword Args:
-            ROI ( None or [int]*4) : [ x offset, y offset, x size, y size],
+            ROI ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels,
                 if None, set to [0, 0, max Width, max height]
             
         Return: 
-            Camera ROI ([int]*4) : [x offset, y offset, x size, y size]  
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]  
         """
         xlims,ylims = self.pylablibCamera.get_roi_limits()
         rules = [xlims[2], ylims[2], xlims[3], ylims[3]] # x offset step, y offset step, x size step, y size step
@@ -117,30 +118,36 @@ class PylablibInterfaceClass(CameraClass) :
             def rounding(a) :
                 val, step = a
                 return int(val - (val % step))
-            [x,y,w,h] = ROI
+            [x,y,w,h] = ROI[:4]
+            [xbin,ybin] = ROI[4:6] if len(ROI) == 6 else [1,1]
+            xbin = int(max(min(xbin, xlims[4]), 1)) # maximum binning given by camera
+            ybin = int(max(min(ybin, ylims[4]), 1))
+            w = int(max(w - (w % xbin), xbin)) # size in sensor pixels multiple of binning
+            h = int(max(h - (h % ybin), ybin))
             x = int(max(min(x,self.wpxmax-w), 0))
             y = int(max(min(y,self.hpxmax-h), 0))
-            return map(rounding, zip([x,y,w,h], rules))
+            return list(map(rounding, zip([x,y,w,h], rules))) + [xbin, ybin]
         else:
-            return [0, 0, self.wpxmax , self.hpxmax]
+            return [0, 0, self.wpxmax , self.hpxmax, 1, 1]
 
 
     def setCamROI(self, ROI=None) :
-        """Set the ROI of camera (without binning)
+        """Set the ROI of camera (with binning if supported)
         
         Keyword Args:
-            ROI ( None or [int]*4) : [ x offset, y offset, x size, y size],
+            ROI ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels,
                 if None, set to [0, 0, max Width, max height]
             
         Return: 
-            Camera ROI ([int]*4) : [x offset, y offset, x size, y size]  
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]  
         """
-        [x,y,w,h] = self.roundCamROI(ROI)
-        self.pylablibCamera.set_roi(hstart=x, hend=w, vstart=y, vend=h)
-        x,w,y,h,xbin,ybin = self.pylablibCamera.get_roi()
-        self.wpx = w #width
-        self.hpx = h #height
-        self.camROI = [x,y,w,h]
+        [x,y,w,h,xbin,ybin] = self.roundCamROI(ROI)
+        self.pylablibCamera.set_roi(hstart=x, hend=x+w, vstart=y, vend=y+h, hbin=xbin, vbin=ybin)
+        hstart,hend,vstart,vend,xbin,ybin = self.pylablibCamera.get_roi()
+        self.camBinning = [xbin, ybin]
+        self.wpx = (hend-hstart)//xbin #width in binned pixels
+        self.hpx = (vend-vstart)//ybin #height in binned pixels
+        self.camROI = [hstart,vstart,hend-hstart,vend-vstart,xbin,ybin]
         return self.camROI
     
     
@@ -152,17 +159,43 @@ class PylablibInterfaceClass(CameraClass) :
         
     def clearBuffer(self) :
         """ Clear camera buffer from images. 
-        Use before imaging scans to make sure no previously acquired image is present in buffer"""
+        Use before imaging scans to make sure no previously acquired image is present in buffer.
+        
+            Unread frames are marked as read in one call without being transferred from driver buffer 
+            (reading an empty range ending at the last acquired frame), 
+            number of discarded frames and duration are stored in clearBufferDiscardedFrames and clearBufferDurationms"""
+        startTime = time.perf_counter()
         if not self.pylablibCamera.acquisition_in_progress() : # normally should not happen but if acquisition stopped, restart it
             self.startAcquisition()
-        while self.pylablibCamera.get_frames_status()[1] > 0 :
-            self._image = self.pylablibCamera.read_oldest_image()
+        discardedFrames = self.pylablibCamera.get_frames_status()[1]
+        rng = self.pylablibCamera.get_new_images_range()
+        if rng is not None :
+            try :
+                self.pylablibCamera.read_multiple_images(rng=(rng[1],rng[1]))
+            except :
+                rng = None
+        if rng is None : # fallback : read frames one by one
+            while self.pylablibCamera.get_frames_status()[1] > 0 :
+                self._image = self.pylablibCamera.read_oldest_image()
+        self._clearBufferReport(discardedFrames + self._discardFrameRing(), startTime)
         
 
-    def grabArray(self) :
+    def grabArray(self, copy=True, out=None) :
         """Get an image from the camera. 
         Wait for trigger if external or generate one if software.
+
+            Default returns a new array owned by the caller.
+            With copy=False, return a read-only view on the frame read from the driver,
+            with reversedAxes applied as negative strides (no copy). The view is only valid 
+            until the next call of grabArray : copy it if it has to be kept longer.
+            With out, the frame is written in the caller preallocated array (only copy made, 
+            dtype conversion included) which is returned, the caller keeps ownership of it.
             
+        Keyword Args:
+            copy=True (bool) : if False, return a view instead of a copy (see above)
+
+            out=None (None or numpy 2D array) : preallocated array of shape Camera.imageSize to write image in
+
         Return: 
             Camera image (numpy 2D array)
         """
@@ -173,25 +206,113 @@ class PylablibInterfaceClass(CameraClass) :
             if self.triggerMode==1 :   
                 self.sendSoftwareTrigger()
             self.pylablibCamera.wait_for_frame(since="lastread", nframes=1, timeout=self.timeout, error_on_stopped=True)
-            self._image = self.pylablibCamera.read_oldest_image()
+            self._image, info = self.pylablibCamera.read_oldest_image(return_info=True)
+            self._image = np.asarray(self._image)
+            self.frameInfo = self.frameInfoFromPylablib(info)
             if self.reversedAxes == [False, False] :
-                self.image = np.array(self._image) 
+                self.image = self._image
             elif self.reversedAxes == [True, False] :
-                self.image = np.flip(np.array(self._image) , 1) #X axis is second dimension in image array
+                self.image = self._image[:,::-1] #X axis is second dimension in image array
             elif self.reversedAxes == [False, True] :
-                self.image = np.flip(np.array(self._image) , 0) #Y axis is first dimension in image array
+                self.image = self._image[::-1,:] #Y axis is first dimension in image array
             elif self.reversedAxes == [True, True] :
-                self.image = np.flip(np.array(self._image) , (0,1))
+                self.image = self._image[::-1,::-1]
             else :
-                self.image = np.array(self._image) 
+                self.image = self._image
                 print('WARNING ! : \n reversedAxes in camera config is not properly defined as [True/False , True/False] \n Axes unchanged from default [False, False]')
         except pllDeviceError as ex:
             print('ERROR ! : Error doc :  %s' % ex.__doc__)
             self.imageAcqLastFailed = True
             return False
+        if out is not None :
+            np.copyto(out, self.image, casting='unsafe')
+            return out
+        if not copy :
+            image = self.image.view()
+            image.flags.writeable = False
+            return image
         return self.image.copy()
 
 
+    def grabArrays(self, n, out=None) :
+        """Get n successive images from the camera in one call.
+        Wait for triggers if external or generate them if software.
+
+            In external trigger mode, wait for the n frames of the sequence 
+            and read them together from the pylablib buffer.
+
+        Args:
+            n (int) : number of images
+
+        Keyword Args:
+            out=None (None or numpy 3D array) : preallocated array of shape (n,)+Camera.imageSize to write images in
+
+        Return:
+            Camera images (numpy 3D array, first axis is image index) or False if acquisition failed
+        """
+        if self.triggerMode==1 : # one software trigger per image
+            return super().grabArrays(n, out=out)
+        self.imageAcqLastFailed = False
+        try: 
+            if not self.pylablibCamera.acquisition_in_progress() : # normally should not happen but if acquisition stopped, restart it
+                self.startAcquisition()
+            grabStartTime = time.time()
+            self.pylablibCamera.wait_for_frame(since="lastread", nframes=n, timeout=n*self.timeout, error_on_stopped=True)
+            first = self.pylablibCamera.get_new_images_range()[0]
+            images, infos = self.pylablibCamera.read_multiple_images(rng=(first, first+n), return_info=True)
+            images = np.asarray(images)
+        except pllDeviceError as ex:
+            print('ERROR ! : Error doc :  %s' % ex.__doc__)
+            self.imageAcqLastFailed = True
+            return False
+        if images.shape[0] != n :
+            print('ERROR ! : Camera : '+str(n-images.shape[0])+' images missing in sequence')
+            self.imageAcqLastFailed = True
+            return False
+        if self.reversedAxes == [True, False] :
+            images = images[:,:,::-1] #X axis is last dimension in images array
+        elif self.reversedAxes == [False, True] :
+            images = images[:,::-1,:] #Y axis is second dimension in images array
+        elif self.reversedAxes == [True, True] :
+            images = images[:,::-1,::-1]
+        if out is None :
+            out = np.empty(images.shape, dtype=self.imageDtype)
+        np.copyto(out, images, casting='unsafe')
+        self.image = out[-1]
+        self.frameInfo = self.frameInfoFromPylablib(infos[-1])
+        self.lastFramesMetadata = self._framesMetadata([self.frameInfoFromPylablib(info) for info in infos], grabStartTime)
+        return out
+
+
+    def frameInfoFromPylablib(self, info) :
+        """Get frame index and hardware timestamp from pylablib frame info
+
+            Timestamp field depends on camera SDK (units of camera SDK, tuples as (seconds, microseconds)).
+
+        Args:
+            info (namedtuple or None) : frame info returned by pylablib camera
+
+        Return:
+            (frame index (int), hardware timestamp (float)) : -1 and nan if not available
+        """
+        if info is None :
+            return (-1, np.nan)
+        frameIndex = int(getattr(info, 'frame_index', -1))
+        hardwareTimestamp = np.nan
+        for field in getattr(info, '_fields', ()) :
+            if 'timestamp' in field :
+                value = getattr(info, field)
+                try :
+                    if isinstance(value, tuple) :
+                        hardwareTimestamp = float(value[0]) + 1e-6*float(value[1])
+                    else :
+                        hardwareTimestamp = float(value)
+                except (TypeError, ValueError, IndexError) :
+                    continue
+                break
+        return (frameIndex, hardwareTimestamp)
+
+
         
 
 
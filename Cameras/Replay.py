@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+
+"""
+Define camera driver classes for replay of images saved by Imaging (no hardware needed)
+"""
+
+import glob
+import os
+import re
+import time
+import numpy as np
+from .CameraClassDef import CameraClass
+
+# Pillow and tifffile packages are only needed to replay PNG and TIFF files
+try :
+    from PIL import Image
+    PILInstalled = True
+except :
+    PILInstalled = False
+try :
+    import tifffile
+    tifffileInstalled = True
+except :
+    tifffileInstalled = False
+
+
+# file name suffixes added by ImagingClass.save_images_during_atom_imaging : [_T## or _LT##] _scan## [_av##]
+replayFileSuffixRegex = r'(?:_L?T(\d+))?(?:_scan(\d+))?(?:_av(\d+))?'
+# names and order of images in files saved by ImagingClass.save_images
+replayImagesNames = ['imAt', 'imRef', 'imBkgd']
+replayImagesFormatsExtensions = ['.npz', '.png', '.tiff']
+
+
+class ReplayClass(CameraClass) :
+    """Parent class for replay cameras serving images previously saved by ImagingClass.save_images.
+
+    Used to re-run the analysis of a recorded measurement (for example with new imaging parameters)
+    and to profile the acquisition and analysis chain on real data at full speed, without any camera connected.
+    The files are found from the cameraConfig key 'replayDirAndFileName' (same path as the Imaging dirAndFileName,
+    without extension) followed by the '_T##'/'_LT##', '_scan##' and '_av##' suffixes of automatically saved images,
+    and sorted in the order of the original measurement.
+    Each file gives the frames of one average of atom_imaging : atoms, (reference), (background),
+    each one preceded by a black flush frame if 'replayFlushSensor' is True.
+    If a background image was saved, it is added back to the atoms and reference images (saved after background removal)
+    so that the analysis gives the same images as during the original measurement.
+    The replay restarts from the first file at each call of clearBuffer (start of a measurement)
+    and loops to the first file after the last one.
+
+    Frames are served as fast as the consumer takes them, unless 'replayFrameRateHz' is set.
+
+    Used as generic driver class if no model-specific child class is defined in same file below"""
+
+    def __init__(self, cameraNumber, triggerMode=0, exposurems=1,
+                 gaindB=1, camROI=None, loadDefault = False) :
+        """Initialize the Camera object
+
+        Args:
+            cameraNumber (int) : index of camera in camerasConfigs list
+
+        Keyword Args:
+            triggerMode=0  (int) : 0 for hardware/external, 1 for software/internal
+
+            exposurems=1. (float) : Exposition duration (exposure) in ms.
+
+            gaindB=0. (float) : hardware gain of the camera in dB.
+
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from replayed images
+                [x offset , y offset , x size , y size (, x binning , y binning)] in pixels of saved images
+
+            loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation
+
+        Return:
+            ReplayClass camera object
+        """
+        super().__init__(cameraNumber, triggerMode=triggerMode, exposurems=exposurems,
+                         gaindB=gaindB, camROI=camROI, loadDefault=loadDefault)
+        # no driver to install for a replay camera
+        self.cameraDriverInstalled = True
+        if self.cameraConfig is None :
+            return
+        # replay parameters from cameraConfig, with default values if not given
+        replayConfig = dict(replayDirAndFileName = '', # path and base file name of saved images, without suffixes nor extension
+                            replayImagesFormat = 0, # format of saved images : 0:NPZ (numpy) 1: PNG, 2: TIFF
+                            replayFlushSensor = False, # insert a black flush frame before each image, as with flush setting of Imaging
+                            replayPreload = True, # load all files in memory at creation, to serve frames without file reading
+                            replayFrameRateHz = 0.) # maximum frame rate, 0. for frames served as fast as possible
+        replayConfig.update({k : self.cameraConfig[k] for k in replayConfig if k in self.cameraConfig})
+        for k, v in replayConfig.items() :
+            setattr(self, k, v)
+        self.replayFileIndex = 0 # index of file of next frame in replayFilesList
+        self.replayFrameInFileIndex = 0 # index of next frame in frames of current file
+        self.replayFrameIndex = -1 # index of last frame served since camera creation
+        self.replayLastFrameTime = 0. # time of last frame served (s), used to limit frame rate
+        self.replayFramesCache = {} # frames of loaded files : {file index : list of frames}
+        # bit depth and dtype from cameraConfig
+        self.imageBitDepth = int(self.cameraConfig['imageBitDepth'])
+        if self.imageBitDepth <= 8 :
+            self.imageDtype = np.uint8
+        elif self.imageBitDepth <= 16 :
+            self.imageDtype = np.uint16
+        elif self.imageBitDepth <= 32:
+            self.imageDtype = np.uint32
+        else :
+            print('ERROR ! : Replay camera bit depth larger than 32 !')
+            return
+        self.maxLevel = 2**self.imageBitDepth - 1
+        # find saved files
+        if self.replayImagesFormat == 1 and not(PILInstalled) :
+            print('ERROR ! : Pillow package is not installed, can not replay PNG images')
+            return
+        if self.replayImagesFormat == 2 and not(tifffileInstalled) :
+            print('ERROR ! : tifffile package is not installed, can not replay TIFF images')
+            return
+        self.replayFilesList = self.findReplayFiles()
+        if len(self.replayFilesList) == 0 :
+            print('ERROR ! : No saved images found to replay for : \n' + str(self.replayDirAndFileName))
+            return
+        if self.replayPreload :
+            for fileIndex in range(len(self.replayFilesList)) :
+                self.loadReplayFile(fileIndex)
+        # sensor size from first file
+        firstFrame = self.loadReplayFile(0)[0]
+        self.sensorSizepx = [firstFrame.shape[1], firstFrame.shape[0]]
+        # set trigger mode
+        self.setTriggerMode(self.triggerMode)
+        # exposure and gain are only stored, replayed images do not depend on them
+        self.exposuremsMin = 1.e-3
+        self.exposuremsMax = 1.e3
+        self.setExposurems(self.exposurems)
+        self.gaindBMin, self.gaindBMax = (0., 24.)
+        self.setGaindB(self.gaindB)
+        # set camera ROI,
+        self.setCamROI(ROI=self.camROI)
+        # numpy image array
+        self.image = np.zeros(self.imageSize, dtype=self.imageDtype)
+        # image scaling and properties
+        self.pixelCalXumperpx = self.cameraConfig['pixelCalXumperpx']
+        self.pixelCalYumperpx = self.cameraConfig['pixelCalYumperpx']
+        self.reversedAxes = self.cameraConfig['reversedAxes'] # saved images are already reversed : not applied again
+        self.imageLimits = [-self.wpx/2*self.pixelCalXumperpx,
+                            self.wpx/2*self.pixelCalXumperpx,
+                            -self.hpx/2*self.pixelCalYumperpx,
+                            self.hpx/2*self.pixelCalYumperpx]
+        #start acquisition
+        self.startAcquisition()
+        self.cameraConnected = True
+
+
+    def __del__(self) :
+        """Delete the Camera object by calling close function
+
+        Close the Camera and free memory"""
+        super().__del__() #ALWAYS call at end of any child class del
+
+
+    def findReplayFiles(self) :
+        """Find files saved with replayDirAndFileName base name and sort them in measurement order
+
+        Return:
+            Files to replay ([str]) : for PNG format, file names without '_imAt.png', '_imRef.png' or '_imBkgd.png' ending
+        """
+        extension = replayImagesFormatsExtensions[self.replayImagesFormat]
+        base = str(self.replayDirAndFileName)
+        if self.replayImagesFormat == 1 : # PNG : one file per image, files grouped by their base name
+            ending = '_imAt' + extension
+        else :
+            ending = extension
+        fileRegex = re.compile(re.escape(base) + replayFileSuffixRegex + re.escape(ending) + '$')
+        filesKeys = []
+        for fname in glob.glob(glob.escape(base) + '*' + ending) :
+            match = fileRegex.match(fname)
+            if match is None :
+                continue
+            # sort by T/LT scan, then scan, then average index
+            key = tuple(-1 if g is None else int(g) for g in match.groups())
+            filesKeys.append((key, fname[:len(fname)-len(ending)] if self.replayImagesFormat == 1 else fname))
+        return [fname for key, fname in sorted(filesKeys)]
+
+
+    def loadReplayFile(self, fileIndex) :
+        """Load the images of one saved file as frames of one atom_imaging average
+
+        Args:
+            fileIndex (int) : index of file in replayFilesList
+
+        Return:
+            frames ([numpy 2D array]) : [flush], atoms, ([flush], reference), ([flush], background) images
+        """
+        if fileIndex in self.replayFramesCache :
+            return self.replayFramesCache[fileIndex]
+        fname = self.replayFilesList[fileIndex]
+        images = {}
+        if self.replayImagesFormat == 0 : #NPZ
+            with np.load(fname) as data :
+                images = {k : data[k] for k in replayImagesNames if k in data}
+        elif self.replayImagesFormat == 1 : #PNG
+            for k in replayImagesNames :
+                if os.path.isfile(fname + '_' + k + '.png') :
+                    images[k] = np.array(Image.open(fname + '_' + k + '.png'))
+        elif self.replayImagesFormat == 2 : #TIFF
+            with tifffile.TiffFile(fname) as tif :
+                stack = tif.asarray()
+                metadata = tif.shaped_metadata
+                names = metadata[0].get('Labels', None) if metadata else None
+            if stack.ndim == 2 :
+                stack = stack[np.newaxis]
+            if names is None or len(names) != len(stack) :
+                names = replayImagesNames[:len(stack)]
+            images = dict(zip(names, stack))
+        # undo bit shift of PNG and TIFF saving for bit depth larger than 8
+        if self.replayImagesFormat in [1, 2] and self.imageBitDepth > 8 :
+            images = {k : v.astype(np.int64) >> (16-self.imageBitDepth) for k, v in images.items()}
+        if 'imBkgd' in images :
+            # saved atoms and reference images had background removed : add it back
+            for k in ['imAt', 'imRef'] :
+                if k in images :
+                    images[k] = images[k].astype(np.int64) + images['imBkgd']
+        frames = []
+        for k in replayImagesNames :
+            if k in images :
+                image = np.clip(images[k], 0, self.maxLevel).astype(self.imageDtype)
+                if self.replayFlushSensor :
+                    frames.append(np.zeros(image.shape, dtype=self.imageDtype))
+                frames.append(image)
+        if self.replayPreload :
+            self.replayFramesCache[fileIndex] = frames
+        else : # keep only last loaded file
+            self.replayFramesCache = {fileIndex : frames}
+        return frames
+
+
+    def setTriggerMode(self, triggerMode):
+        """Set the trigger mode
+
+        Args:
+            triggerMode (int) :  0 for hardware/external, 1 for software/internal
+        """
+        if not(triggerMode in [0, 1]) :
+            raise NameError('Trigger mode number not defined ')
+        self.triggerMode = triggerMode
+
+
+    def sendSoftwareTrigger(self):
+        """Send a software trigger to the camera to start an exposure (no effect for replay)"""
+        pass
+
+
+    def setExposurems(self, exposurems) :
+        """Set the duration of the exposition
+
+        Args:
+            exposurems (float) : Exposition duration (exposure) in ms.
+        """
+        self.exposurems = float(min(max(exposurems, self.exposuremsMin), self.exposuremsMax))
+
+
+    def setGaindB(self, gaindB) :
+        """Set the hardware gain of camera readout
+
+        Args:
+            gaindB (float) : hardware gain of the camera in dB.
+        """
+        self.gaindB = float(min(max(gaindB, self.gaindBMin), self.gaindBMax))
+
+
+    def roundCamROI(self, ROI=None) :
+        """Rounding of ROI values to closest possible one according to camera rules
+
+        Keyword Args:
+            ROI = None ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in pixels of saved images
+                if None, set to [0, 0, max Width, max height]
+
+        Return:
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
+        """
+        self.wpxmax = int(self.sensorSizepx[0])
+        self.hpxmax = int(self.sensorSizepx[1])
+        if ROI is not None:
+            [x,y,w,h] = ROI[:4]
+            [xbin,ybin] = ROI[4:6] if len(ROI) == 6 else [1,1]
+            xbin = int(max(xbin, 1))
+            ybin = int(max(ybin, 1))
+            w = int(max(min(w,self.wpxmax), xbin))
+            h = int(max(min(h,self.hpxmax), ybin))
+            w -= w % xbin # size in pixels multiple of binning
+            h -= h % ybin
+            x = int(max(min(x,self.wpxmax-w), 0))
+            y = int(max(min(y,self.hpxmax-h), 0))
+            return [x,y,w,h,xbin,ybin]
+        else:
+            return [0, 0, self.wpxmax , self.hpxmax, 1, 1]
+
+
+    def setCamROI(self, ROI=None) :
+        """Set the ROI of camera (with binning) cropped from replayed images
+
+        Keyword Args:
+            ROI = None ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in pixels of saved images
+                if None, set to [0, 0, max Width, max height]
+
+        Return:
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
+        """
+        self.camROI = self.roundCamROI(ROI)
+        [x,y,w,h,xbin,ybin] = self.camROI
+        self.camBinning = [xbin, ybin]
+        self.wpx = w//xbin #width in binned pixels
+        self.hpx = h//ybin #height in binned pixels
+        self.imageSize = (self.hpx,self.wpx)
+        return self.camROI
+
+
+    def startAcquisition(self):
+        """Start acquisition or restart if already running """
+        self.replayLastFrameTime = 0.
+
+
+    def clearBuffer(self) :
+        """ Clear camera buffer from images.
+        Use before imaging scans to make sure no previously acquired image is present in buffer.
+        Restart the replay from the first saved file."""
+        self.replayFileIndex = 0
+        self.replayFrameInFileIndex = 0
+        self._clearBufferReport(self._discardFrameRing(), time.perf_counter())
+
+
+    def grabArray(self) :
+        """Get the next replayed image.
+
+        Return:
+            Camera image (numpy 2D array)
+        """
+        self.imageAcqLastFailed = False
+        # limit frame rate to replayFrameRateHz
+        if self.replayFrameRateHz > 0. :
+            waitTime = self.replayLastFrameTime + 1./self.replayFrameRateHz - time.perf_counter()
+            if waitTime > self.timeout :
+                print('ERROR ! : Replay camera timeout')
+                self.imageAcqLastFailed = True
+                return False
+            elif waitTime > 0. :
+                time.sleep(waitTime)
+        self.replayLastFrameTime = time.perf_counter()
+        self.replayFrameIndex += 1
+        self.frameInfo = (self.replayFrameIndex, self.replayLastFrameTime) # hardware timestamp in s of performance counter
+        # next frame of current file, go to next file (or loop to first) at end of file
+        frames = self.loadReplayFile(self.replayFileIndex)
+        image = frames[self.replayFrameInFileIndex]
+        self.replayFrameInFileIndex += 1
+        if self.replayFrameInFileIndex >= len(frames) :
+            self.replayFrameInFileIndex = 0
+            self.replayFileIndex = (self.replayFileIndex + 1) % len(self.replayFilesList)
+        # crop and bin to camera ROI
+        [x,y,w,h,xbin,ybin] = self.camROI
+        image = image[y:y+h, x:x+w]
+        if [xbin, ybin] != [1, 1] :
+            image = np.clip(image.reshape(self.hpx, ybin, self.wpx, xbin).sum(axis=(1,3), dtype=np.int64),
+                            0, self.maxLevel).astype(self.imageDtype)
+        self.image = image
+        return self.image.copy()
+
+
+
+class ExampleModelClass(ReplayClass) :
+    """Model-specific class for ... replay camera.
+
+        Child Class of ReplayClass.
+        Use to implement specific initialization for this replay camera model"""
+
+    def __init__(self, cameraNumber, triggerMode=0, exposurems=1,
+                 gaindB=1, camROI=None, loadDefault = False) :
+        """Initialize the Camera object
+
+        Args:
+            cameraNumber (int) : index of camera in camerasConfigs list
+
+        Keyword Args:
+            triggerMode=0  (int) : 0 for hardware/external, 1 for software/internal
+
+            exposurems=1. (float) : Exposition duration (exposure) in ms.
+
+            gaindB=0. (float) : hardware gain of the camera in dB.
+
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from replayed images
+                [x offset , y offset , x size , y size (, x binning , y binning)] in pixels of saved images
+
+            loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation
+
+        Return:
+            ExampleModelClass camera object
+        """
+        super().__init__(cameraNumber, triggerMode=triggerMode, exposurems=exposurems,
+                          gaindB=gaindB, camROI=camROI, loadDefault=loadDefault)
+
+
+    def __del__(self) :
+        """Delete the Camera object by calling close function
+
+        Close the Camera and free memory"""
+        super().__del__() #ALWAYS call at end of any child class del
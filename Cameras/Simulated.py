@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+"""
+Define camera driver classes for a simulated camera (no hardware needed)
+"""
+
+import time
+import numpy as np
+from .CameraClassDef import CameraClass
+
+
+class SimulatedClass(CameraClass) :
+    """Parent class for simulated cameras producing synthetic images of a cold atom cloud.
+
+    Used to test the acquisition and analysis chain (and measure its speed) without any camera connected.
+    The frames are served following the cyclic sequence of frame types given by the
+    cameraConfig key 'simulatedSequence' (for example ['atoms', 'reference'] for absorption imaging
+    or ['flush', 'atoms', 'flush', 'reference', 'flush', 'background'] with flush and background removal).
+    The sequence restarts from its beginning at each call of clearBuffer.
+
+    The external trigger mode is simulated by a free-running trigger at 'simulatedFrameRateHz'.
+
+    Used as generic driver class if no model-specific child class is defined in same file below"""
+
+    def __init__(self, cameraNumber, triggerMode=0, exposurems=1,
+                 gaindB=1, camROI=None, loadDefault = False) :
+        """Initialize the Camera object
+
+        Args:
+            cameraNumber (int) : index of camera in camerasConfigs list
+
+        Keyword Args:
+            triggerMode=0  (int) : 0 for hardware/external, 1 for software/internal
+
+            exposurems=1. (float) : Exposition duration (exposure) in ms.
+
+            gaindB=0. (float) : hardware gain of the camera in dB.
+
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
+
+            loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation
+
+        Return:
+            SimulatedClass camera object
+        """
+        super().__init__(cameraNumber, triggerMode=triggerMode, exposurems=exposurems,
+                         gaindB=gaindB, camROI=camROI, loadDefault=loadDefault)
+        # no driver to install for a simulated camera
+        self.cameraDriverInstalled = True
+        if self.cameraConfig is None :
+            return
+        # simulation parameters from cameraConfig, with default values if not given
+        simConfig = dict(sensorSizepx = [1280, 1024], # [width, height] of simulated sensor in pixels
+                         simulatedSequence = ['atoms', 'reference'], # cyclic sequence of frame types : 'atoms', 'reference', 'background' or 'flush'
+                         simulatedImagingTypeText = 'Absorption Imaging', # 'Absorption Imaging' or 'Fluorescence Imaging'
+                         simulatedCloudRadiipx = [40., 60.], # [Y, X] gaussian sigma of the cloud in pixels
+                         simulatedCloudPositionpx = [0., 0.], # [Y, X] position of the cloud relative to sensor center in pixels
+                         simulatedCloudJitterpx = 2., # standard deviation of the shot to shot cloud position jitter in pixels
+                         simulatedCloudPeakOD = 1., # peak optical density for absorption imaging
+                         simulatedFluoLevel = 0.3, # peak fluorescence level (fraction of maxLevel at reference exposure and 0 dB) for fluorescence imaging
+                         simulatedLightLevel = 0.6, # level of imaging light (fraction of maxLevel at reference exposure and 0 dB)
+                         simulatedBackgroundLevel = 0.02, # level of background light and offset (fraction of maxLevel)
+                         simulatedReferenceExposurems = 1., # exposure at which light levels are defined
+                         simulatedShotNoise = True, # add Poisson noise on the number of counts
+                         simulatedReadNoise = 1., # standard deviation of the gaussian readout noise in counts
+                         simulatedFrameRateHz = 0., # maximum frame rate, 0. for frames served as fast as possible
+                         simulatedSeed = None) # seed of random generator for reproducible images
+        simConfig.update({k : self.cameraConfig[k] for k in simConfig if k in self.cameraConfig})
+        for k, v in simConfig.items() :
+            setattr(self, k, v)
+        self.simulatedRandomGenerator = np.random.default_rng(self.simulatedSeed)
+        self.simulatedSequenceIndex = 0 # index of next frame type in simulatedSequence
+        self.simulatedFrameIndex = -1 # index of last frame generated since camera creation
+        self.simulatedCloudJitterCurrentpx = np.zeros(2) # jitter of current shot, drawn for each 'atoms' frame
+        self.simulatedLastFrameTime = 0. # time of last frame generation (s), used to limit frame rate
+        self.simulatedTriggerPending = False # software trigger received and not yet used
+        # bit depth and dtype from cameraConfig
+        self.imageBitDepth = int(self.cameraConfig['imageBitDepth'])
+        if self.imageBitDepth <= 8 :
+            self.imageDtype = np.uint8
+        elif self.imageBitDepth <= 16 :
+            self.imageDtype = np.uint16
+        elif self.imageBitDepth <= 32:
+            self.imageDtype = np.uint32
+        else :
+            print('ERROR ! : Simulated camera bit depth larger than 32 !')
+            return
+        self.maxLevel = 2**self.imageBitDepth - 1
+        # set trigger mode
+        self.setTriggerMode(self.triggerMode)
+        # exposure and gain limits
+        self.exposuremsMin = 1.e-3
+        self.exposuremsMax = 1.e3
+        self.setExposurems(self.exposurems)
+        self.gaindBMin, self.gaindBMax = (0., 24.)
+        self.setGaindB(self.gaindB)
+        # set camera ROI,
+        self.setCamROI(ROI=self.camROI)
+        # numpy image array
+        self.imageSize = (self.hpx,self.wpx)
+        self.image = np.zeros(self.imageSize, dtype=self.imageDtype)
+        # image scaling and properties
+        self.pixelCalXumperpx = self.cameraConfig['pixelCalXumperpx']
+        self.pixelCalYumperpx = self.cameraConfig['pixelCalYumperpx']
+        self.reversedAxes = self.cameraConfig['reversedAxes']
+        self.imageLimits = [-self.wpx/2*self.pixelCalXumperpx,
+                            self.wpx/2*self.pixelCalXumperpx,
+                            -self.hpx/2*self.pixelCalYumperpx,
+                            self.hpx/2*self.pixelCalYumperpx]
+        #start acquisition
+        self.startAcquisition()
+        self.cameraConnected = True
+
+
+    def __del__(self) :
+        """Delete the Camera object by calling close function
+
+        Close the Camera and free memory"""
+        super().__del__() #ALWAYS call at end of any child class del
+
+
+    def setTriggerMode(self, triggerMode):
+        """Set the trigger mode
+
+        Args:
+            triggerMode (int) :  0 for hardware/external, 1 for software/internal
+        """
+        if not(triggerMode in [0, 1]) :
+            raise NameError('Trigger mode number not defined ')
+        self.triggerMode = triggerMode
+        self.simulatedTriggerPending = False
+
+
+    def sendSoftwareTrigger(self):
+        """Send a software trigger to the camera to start an exposure"""
+        self.simulatedTriggerPending = True
+
+
+    def setExposurems(self, exposurems) :
+        """Set the duration of the exposition
+
+        Args:
+            exposurems (float) : Exposition duration (exposure) in ms.
+        """
+        self.exposurems = float(min(max(exposurems, self.exposuremsMin), self.exposuremsMax))
+
+
+    def setGaindB(self, gaindB) :
+        """Set the hardware gain of camera readout
+
+        Args:
+            gaindB (float) : hardware gain of the camera in dB.
+        """
+        self.gaindB = float(min(max(gaindB, self.gaindBMin), self.gaindBMax))
+
+
+    def roundCamROI(self, ROI=None) :
+        """Rounding of ROI values to closest possible one according to camera rules
+
+        Keyword Args:
+            ROI = None ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels
+                if None, set to [0, 0, max Width, max height]
+
+        Return:
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
+        """
+        self.wpxmax = int(self.sensorSizepx[0])
+        self.hpxmax = int(self.sensorSizepx[1])
+        if ROI is not None:
+            [x,y,w,h] = ROI[:4]
+            [xbin,ybin] = ROI[4:6] if len(ROI) == 6 else [1,1]
+            xbin = int(max(xbin, 1))
+            ybin = int(max(ybin, 1))
+            w = int(max(min(w,self.wpxmax), xbin))
+            h = int(max(min(h,self.hpxmax), ybin))
+            w -= w % xbin # size in sensor pixels multiple of binning
+            h -= h % ybin
+            x = int(max(min(x,self.wpxmax-w), 0))
+            y = int(max(min(y,self.hpxmax-h), 0))
+            return [x,y,w,h,xbin,ybin]
+        else:
+            return [0, 0, self.wpxmax , self.hpxmax, 1, 1]
+
+
+    def setCamROI(self, ROI=None) :
+        """Set the ROI of camera (with binning if supported)
+
+        Keyword Args:
+            ROI = None ( None or [int]*4 or [int]*6) : [ x offset, y offset, x size, y size (, x binning, y binning)] in sensor pixels
+                if None, set to [0, 0, max Width, max height]
+
+        Return:
+            Camera ROI ([int]*6) : [x offset, y offset, x size, y size, x binning, y binning]
+        """
+        self.camROI = self.roundCamROI(ROI)
+        [x,y,w,h,xbin,ybin] = self.camROI
+        self.camBinning = [xbin, ybin]
+        self.wpx = w//xbin #width in binned pixels
+        self.hpx = h//ybin #height in binned pixels
+        self.imageSize = (self.hpx,self.wpx)
+        # pixel coordinates relative to sensor center along X and Y axes, used for image generation
+        self.simulatedXaxispx = np.arange(x, x+w) - self.wpxmax/2.
+        self.simulatedYaxispx = np.arange(y, y+h) - self.hpxmax/2.
+        return self.camROI
+
+
+    def startAcquisition(self):
+        """Start acquisition or restart if already running """
+        self.simulatedLastFrameTime = 0.
+
+
+    def clearBuffer(self) :
+        """ Clear camera buffer from images.
+        Use before imaging scans to make sure no previously acquired image is present in buffer.
+        Restart the simulated sequence of frames from its beginning."""
+        self.simulatedSequenceIndex = 0
+        self.simulatedTriggerPending = False
+        self._clearBufferReport(self._discardFrameRing(), time.perf_counter())
+
+
+    def simulateImage(self, frameType) :
+        """Generate a synthetic image of given type, without noise and in counts.
+
+            Image is computed on sensor pixels and binned pixels are summed, as for on chip binning.
+
+        Args:
+            frameType (str) : 'atoms', 'reference', 'background' or 'flush'
+
+        Return:
+            Simulated image (numpy 2D array float)
+        """
+        scaling = self.exposurems / self.simulatedReferenceExposurems * 10.**(self.gaindB/20.) * self.maxLevel
+        [xbin, ybin] = self.camBinning
+        background = np.full(self.imageSize, self.simulatedBackgroundLevel * self.maxLevel * xbin * ybin)
+        if frameType in ['background', 'flush'] :
+            return background
+        lightLevel = self.simulatedLightLevel * scaling * xbin * ybin
+        if frameType == 'reference' :
+            if self.simulatedImagingTypeText == 'Fluorescence Imaging' :
+                return background
+            return background + lightLevel
+        if frameType != 'atoms' :
+            raise NameError('Simulated frame type '+str(frameType)+' not defined')
+        # new shot : draw position jitter and make separable gaussian profile of the cloud
+        self.simulatedCloudJitterCurrentpx = self.simulatedRandomGenerator.normal(0., self.simulatedCloudJitterpx, 2)
+        [y0, x0] = np.array(self.simulatedCloudPositionpx) + self.simulatedCloudJitterCurrentpx
+        [sigmaY, sigmaX] = self.simulatedCloudRadiipx
+        profile = np.outer(np.exp(-(self.simulatedYaxispx - y0)**2 / (2*sigmaY**2)),
+                           np.exp(-(self.simulatedXaxispx - x0)**2 / (2*sigmaX**2)))
+        if self.simulatedImagingTypeText == 'Fluorescence Imaging' :
+            signal = self.simulatedFluoLevel * scaling * profile
+        else :
+            signal = self.simulatedLightLevel * scaling * np.exp(- self.simulatedCloudPeakOD * profile)
+        if [xbin, ybin] != [1, 1] :
+            signal = signal.reshape(self.hpx, ybin, self.wpx, xbin).sum(axis=(1,3))
+        return background + signal
+
+
+    def grabArray(self) :
+        """Get an image from the camera.
+        Wait for trigger if external or generate one if internal.
+
+        Return:
+            Camera image (numpy 2D array)
+        """
+        self.imageAcqLastFailed = False
+        if self.triggerMode==1 :
+            self.sendSoftwareTrigger()
+        # simulated external trigger : limit frame rate to simulatedFrameRateHz
+        if self.simulatedFrameRateHz > 0. :
+            waitTime = self.simulatedLastFrameTime + 1./self.simulatedFrameRateHz - time.perf_counter()
+            if waitTime > self.timeout :
+                print('ERROR ! : Simulated camera timeout')
+                self.imageAcqLastFailed = True
+                return False
+            elif waitTime > 0. :
+                time.sleep(waitTime)
+        self.simulatedLastFrameTime = time.perf_counter()
+        self.simulatedTriggerPending = False
+        self.simulatedFrameIndex += 1
+        self.frameInfo = (self.simulatedFrameIndex, self.simulatedLastFrameTime) # hardware timestamp in s of performance counter
+        # generate image of next type in sequence
+        frameType = self.simulatedSequence[self.simulatedSequenceIndex % len(self.simulatedSequence)]
+        self.simulatedSequenceIndex = (self.simulatedSequenceIndex + 1) % len(self.simulatedSequence)
+        image = self.simulateImage(frameType)
+        # shot noise (gaussian approximation of Poisson noise) and readout noise in a single random draw
+        noiseVariance = float(self.simulatedReadNoise)**2
+        if self.simulatedShotNoise :
+            noiseVariance = image + noiseVariance
+        if np.any(noiseVariance > 0.) :
+            image += np.sqrt(noiseVariance) * self.simulatedRandomGenerator.standard_normal(self.imageSize)
+        self._image = np.clip(np.rint(image), 0, self.maxLevel).astype(self.imageDtype)
+        if self.reversedAxes == [False, False] :
+            self.image = self._image
+        elif self.reversedAxes == [True, False] :
+            self.image = np.flip(self._image, 1) #X axis is second dimension in image array
+        elif self.reversedAxes == [False, True] :
+            self.image = np.flip(self._image, 0) #Y axis is first dimension in image array
+        elif self.reversedAxes == [True, True] :
+            self.image = np.flip(self._image, (0,1))
+        else :
+            self.image = self._image
+            print('WARNING ! : \n reversedAxes in camera config is not properly defined as [True/False , True/False] \n Axes unchanged from default [False, False]')
+        return self.image.copy()
+
+
+
+class ExampleModelClass(SimulatedClass) :
+    """Model-specific class for ... simulated camera.
+
+        Child Class of SimulatedClass.
+        Use to implement specific initialization for this simulated camera model"""
+
+    def __init__(self, cameraNumber, triggerMode=0, exposurems=1,
+                 gaindB=1, camROI=None, loadDefault = False) :
+        """Initialize the Camera object
+
+        Args:
+            cameraNumber (int) : index of camera in camerasConfigs list
+
+        Keyword Args:
+            triggerMode=0  (int) : 0 for hardware/external, 1 for software/internal
+
+            exposurems=1. (float) : Exposition duration (exposure) in ms.
+
+            gaindB=0. (float) : hardware gain of the camera in dB.
+
+            camROI=None (None or [int]*4 or [int]*6) : Camera region of interest to read from sensor
+                [x offset , y offset , x size , y size (, x binning , y binning)] in sensor pixels
+
+            loadDefault = True  (bool): Decide if default values from cameraConfigs should be set at creation
+
+        Return:
+            ExampleModelClass camera object
+        """
+        super().__init__(cameraNumber, triggerMode=triggerMode, exposurems=exposurems,
+                          gaindB=gaindB, camROI=camROI, loadDefault=loadDefault)
+
+
+    def __del__(self) :
+        """Delete the Camera object by calling close function
+
+        Close the Camera and free memory"""
+        super().__del__() #ALWAYS call at end of any child class del
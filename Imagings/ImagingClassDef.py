@@ -6,6 +6,9 @@ Define Imaging class and functions for aquisition and analysis
 """
 
 from . import fittool 
+from . import densitytool
+from . import pipelinetool
+from . import fitpooltool
 
 import numpy as np
 import matplotlib.pyplot as plt
@@ -13,10 +16,31 @@ import matplotlib.cm
 import matplotlib.patches as patches
 import time
 import pickle
+import copy
+import queue
 from PIL import Image
 import tifffile
 
 
+# results of one point measurement of atom_imaging, passed from analysis thread to GUI in imaging_scan_pipeline
+atomImagingResults = ['atomNumber', 'cloudRadiium', 'cloudPositionspx', 'cloudPositionsum', 'cloudZonepx',
+                      'atomNumberList', 'cloudRadiiumList', 'cloudPositionspxList', 'cloudPositionsumList',
+                      'atomNumberAv', 'atomNumberAvErr', 'cloudRadiiumAv', 'cloudRadiiumAvErr', 'cloudPositionspxAv',
+                      'cloudPositionsumAv', 'cloudPositionsumAvErr',
+                      'cloudAvZonepx', 'cloudAvRadiium', 'cloudAvPositionspx', 'cloudAvPositionsum']
+
+# events emitted by scans to the callbacks (see ImagingClass.add_callback) : arguments of callbacks
+imagingEvents = {'singleImage' : '(image) : camera image with atoms of each average, if plotSingleImage',
+                 'atomicDensityAv' : '(data2D) : average atomic density of each scan point, if plotAtomicDensityAv',
+                 'scanPointDone' : '(i) : results of scan point i stored in scan result arrays',
+                 'scanFailed' : '() : image acquisition failed, scan stopped',
+                 'plotAxisVarChanged' : "(axis, index) : variable of 'left' or 'right' axis of analysis graph changed by scan",
+                 'TmeasurementDone' : '(i) : temperature measurement i fitted and stored',
+                 'TscanDone' : '() : end of scan of temperature measurements',
+                 'LTmeasurementDone' : '(i) : lifetime measurement i fitted and stored',
+                 'LTscanDone' : '() : end of scan of lifetime measurements'}
+
+
 class ImagingClass():
     """Class of Imaging object : the center object for aquisition, analysis and saving"""
     
@@ -43,12 +67,21 @@ class ImagingClass():
         self.cameraTriggerMode = 0
         self.flushSensor = False
         self.removeBackground = False
+        self.backgroundAcquisition = False # grab images in camera background thread during scans
+        self.cameraBufferFrames = 20 # minimum number of images in camera driver buffer
+        self.bufferLookaheadPoints = 2 # number of scan points that camera driver buffer can hold before being read
         self.pixelCalXumperpx = 1.
         self.pixelCalYumperpx = 1.
         self.pixelCalAreaum2 = 1. # in m^2
+        self.cameraBinning = [1, 1] # [X, Y] camera binning included in pixel calibration
+        self.cropCameraToROIs = False # read only the part of camera sensor containing the analysis ROIs during scans
+        self.cropCameraMarginpx = 16 # margin in image pixels kept around analysis ROIs when camera readout is cropped
+        self.cameraROIbeforeCrop = None # camera ROI to restore after a scan with cropped readout, None if not cropped
+        self.imageOriginpxBeforeCrop = None # imageOriginpx of uncropped image, restored with cameraROIbeforeCrop
         self.imageSize = (1,1)
         self.wpx = 1 # with in pixel : X axis : in image array image[Y,X]
         self.hpx = 1 # hieght in pixel : Y axis : in image array image[Y,X]
+        self.imageOriginpx = [self.wpx/2., self.hpx/2.] # [X, Y] position in image pixels of micrometer coordinates origin : center of uncropped image
         self.imageLimits = [0.,1.,0.,1.]
         self.cameraMaxLevel = 255
         self.imageDtype = np.uint8
@@ -94,6 +127,27 @@ class ImagingClass():
         self.crossSectionum2 = 0.2906 # effective value (um^2) of cross section  = 1e+12*self.hplanck*self.atomicFrequencyTHz*1.e+12*self.atomicgamma / self.Isat
         self.coeffAbsStrongSatcalc = 0. # float(self.includeSaturationEffects) / self.atomicgamma / (self.pixelCalAreaum2 * self.cameraQuantumEff *self.laserPulseDurationus*1.e-6 )
         self.ODe = np.zeros((1,1)) # OD defined by ln(imAt/Iref)
+        self.useDensityLUT = True # compute OD and atomic density with lookup tables (8 bits images)
+        self.densityLUT = densitytool.AbsorptionDensityLUT() # lookup tables, rebuilt only when absorption parameters change
+        self.analysisBuffers = densitytool.AnalysisBuffers() # float32 work arrays of atom_imaging, reallocated only when imageSize changes
+        self.densityInROIsOnly = False # compute atomic density only inside bounding box of analysis ROIs (0 outside) in atom_imaging
+        self.useSummedAreaTable = None # ROI sums and fit projections of atomic density from its integral image built once per shot : True, False or None for automatic choice
+        self.densitySAT = densitytool.SummedAreaTable() # integral image of atomic density over bounding box of analysis ROIs
+        self.densityPreviewDecimation = 4 # if densityInROIsOnly, atomic density also computed every densityPreviewDecimation pixels for display (0 : no preview)
+        self.densityRegions = [(slice(None), slice(None))] # regions of image where atomic density is computed, set by set_atom_imaging_parameters
+        self.backgroundRegions = [(slice(None), slice(None))] # regions of images where background is removed, set by set_atom_imaging_parameters
+        self.densityLUTactive = False # if lookup tables are used in current measurement, set by set_atom_imaging_parameters
+        self.pipelinedScans = False # acquire, analyse and save images of imaging_scan_measurement in a pipeline of threads
+        self.pipelineQueueSize = 2 # maximum number of shots waiting between two stages of the pipeline
+        self.fitWorkers = 0 # number of workers fitting the ROIs concurrently (serial fits if less than 2)
+        self.fitExecutorType = 'process' # workers of concurrent fits : 'process' or 'thread'
+        self.batchFits = False # fit the profiles of all ROIs together with fittool.BatchFitUtility (not plotted fits)
+        self.cloudDimensionsMethod = 'fit' # cloud radii and positions from 'fit' (Gaussian fits) or 'moments' (moments of projections, faster)
+        self.fitWarmStart = False # start the cloud fits of each ROI from the last converged fits of the ROI (fitParametersCache)
+        self.fitWarmStartResidualRatio = 2. # warm started fits with residual above ratio x residual of last fit are done again from automatic initial parameters
+        self.fitParametersCache = {} # warm starts of the 4 cloud fits per (ROI index, 'single' or 'average' image) (see fitpooltool.fit_cloud_1D), reset when ROIs change
+        self.fitPool = fitpooltool.FitPool() # pool of workers of concurrent fits, restarted when fitWorkers or fitExecutorType change
+        self.callbacks = {} # functions called on events of scans (see add_callback), e.g. to show results on GUI
         # define varaibles for Fluo
         self.laserIntensity = 1. # in W/m² 
         self.laserDetuningMHz = 0. # detuning from resonance in MHz
@@ -251,31 +305,55 @@ class ImagingClass():
         self.loaded = False
         
         
-    def set_Imaging_variables_from_cam(self,Camera):
+    def set_Imaging_variables_from_cam(self, Camera, imageOriginpx=None):
         """Initialize some Imaging object variables from the Camera object variables
         
         Args:
             Camera (CameraClass) :  Camera object
+            
+        Keyword Args:
+            imageOriginpx=None (None or [float]*2) : [X, Y] position in image pixels of micrometer coordinates origin,
+                if None, center of image, each binned pixel being at the center of its bin. 
+                Set by crop_camera_to_ROIs to keep coordinates of uncropped image
         """
         self.cameraConfig = Camera.cameraConfig
         self.cameraNumber = Camera._cameraNumber
         self.cameraExposurems = Camera.exposurems
         self.cameraGaindB = Camera.gaindB
         self.cameraTriggerMode = Camera.triggerMode
-        self.pixelCalXumperpx = Camera.pixelCalXumperpx
-        self.pixelCalYumperpx = Camera.pixelCalYumperpx
+        if (self.cameraConfig is not None) and ('bufferFrames' in self.cameraConfig) :
+            self.cameraBufferFrames = int(self.cameraConfig['bufferFrames'])
+        # imaging options of camera config, keys 'Imaging__'+attribute name, converted to the type of the default value
+        for name in ('backgroundAcquisition', 'cropCameraToROIs', 'cropCameraMarginpx', 'densityInROIsOnly',
+                     'densityPreviewDecimation', 'pipelinedScans', 'pipelineQueueSize', 'fitWorkers', 'fitExecutorType',
+                     'batchFits', 'cloudDimensionsMethod', 'fitWarmStart', 'fitWarmStartResidualRatio') :
+            if (self.cameraConfig is not None) and ('Imaging__'+name in self.cameraConfig) :
+                setattr(self, name, type(getattr(self, name))(self.cameraConfig['Imaging__'+name]))
+        # effective calibration of image pixels, including camera binning
+        self.cameraBinning = list(Camera.camBinning)
+        self.pixelCalXumperpx = Camera.pixelCalXumperpx * self.cameraBinning[0]
+        self.pixelCalYumperpx = Camera.pixelCalYumperpx * self.cameraBinning[1]
         self.pixelCalAreaum2 = self.pixelCalXumperpx*self.pixelCalYumperpx #♠ in um^2
         self.imageSize = Camera.imageSize
         self.wpx = Camera.wpx # with in pixel : X axis : in image array image[Y,X]
         self.hpx = Camera.hpx # hieght in pixel : Y axis : in image array image[Y,X]
-        self.imageLimits = Camera.imageLimits
+        if imageOriginpx is None :
+            # image pixel k is at unbinned pixel k*binning + (binning-1)/2 : same micrometer coordinates with and without binning
+            self.imageOriginpx = [self.wpx/2. - (self.cameraBinning[0]-1)/(2.*self.cameraBinning[0]), 
+                                  self.hpx/2. - (self.cameraBinning[1]-1)/(2.*self.cameraBinning[1])]
+        else :
+            self.imageOriginpx = [float(imageOriginpx[0]), float(imageOriginpx[1])]
+        self.imageLimits = [-self.imageOriginpx[0]*self.pixelCalXumperpx,
+                            (self.wpx-self.imageOriginpx[0])*self.pixelCalXumperpx,
+                            -(self.hpx-self.imageOriginpx[1])*self.pixelCalYumperpx,
+                            self.imageOriginpx[1]*self.pixelCalYumperpx] # in micrometers
         self.imageBitDepth = Camera.imageBitDepth
         self.cameraMaxLevel = Camera.maxLevel
         self.imageDtype = Camera.imageDtype
         self.Xaxispx = np.arange(self.wpx)
         self.Yaxispx = np.arange(self.hpx)
-        self.Xaxisum = (np.arange(self.wpx)-float(self.wpx)/2.)*self.pixelCalXumperpx
-        self.Yaxisum = (np.arange(self.hpx)-float(self.hpx)/2.)*self.pixelCalXumperpx
+        self.Xaxisum = (np.arange(self.wpx)-self.imageOriginpx[0])*self.pixelCalXumperpx
+        self.Yaxisum = (np.arange(self.hpx)-self.imageOriginpx[1])*self.pixelCalYumperpx
         # define images 
         self.imAt = np.zeros(self.imageSize, dtype=self.imageDtype) #image with atoms
         self.imRef = np.zeros(self.imageSize, dtype=self.imageDtype) # image reference without atoms for absorption
@@ -287,14 +365,13 @@ class ImagingClass():
         self.atomicFrequencyTHz = self.cameraConfig['Imaging__atomicFrequencyTHz']
         self.atomicLineFWHWinMHz = self.cameraConfig['Imaging__atomicLineFWHWinMHz']  # atomic natural linewidth in MHz (full width at half maximum in frequency)
         self.atomicgamma = np.pi * self.atomicLineFWHWinMHz * 1.0e+6 # gamma = Gamma/2 : coherence/dipole decay
-        self.atomicDensityIntZperum2 = np.zeros(self.imageSize)# atomic density integrated along camera axis : calculated from images, unit atoms/µm²      
-        self.atomicDensityIntZperum2Av = np.zeros(self.imageSize)
+        # atomic density integrated along camera axis (atoms/µm²), OD and Fluo arrays are preallocated buffers
+        self.set_analysis_buffers()
+        self.analysisBuffers.zero_averages()
         # define variables for absorption
         self.crossSectionum2 = 1e+12*self.hplanck*self.atomicFrequencyTHz*1.e+12*self.atomicgamma / self.Isat
         self.coeffAbsStrongSatcalc = float(self.includeSaturationEffects) / self.atomicgamma \
                                       / (self.pixelCalAreaum2 * self.cameraQuantumEff * self.laserPulseDurationus*1.e-6 )
-        self.ODe = np.zeros(self.imageSize) # OD defined by ln(imAt/Iref)
-        self.ODeAv = np.zeros(self.imageSize) # OD average defined by ln(imAt/Iref)  
         # define varaibles for Fluo
         self.rateScattFluoPerAtom = self.atomicgamma *(self.laserIntensity/self.Isat)\
                                         /(1 + (self.laserIntensity/self.Isat) \
@@ -302,8 +379,69 @@ class ImagingClass():
         self.coeffFluoCalc = 2./( (1-np.sqrt(1-self.numericalAperture**2)) *self.cameraQuantumEff\
                                         *self.laserPulseDurationus*1.e-6\
                                         *self.rateScattFluoPerAtom*self.pixelCalAreaum2)
-        self.Fluo = np.zeros(self.imageSize) # Fluo defined by I-Iref
-        self.FluoAv = np.zeros(self.imageSize) # Fluo average defined by I-Iref
+        
+        
+    def set_analysis_buffers(self):
+        """Set analysis arrays to the preallocated float32 buffers (allocated only if image size changed)
+        
+            Arrays atomicDensityIntZperum2, ODe, Fluo and their averages are overwritten by the next atom_imaging.
+        """
+        self.analysisBuffers.resize(self.imageSize, self.imageDtype)
+        self.atomicDensityIntZperum2 = self.analysisBuffers.density
+        self.atomicDensityIntZperum2Av = self.analysisBuffers.densityAv
+        self.ODe = self.analysisBuffers.ODe
+        self.ODeAv = self.analysisBuffers.ODeAv
+        self.Fluo = self.analysisBuffers.Fluo
+        self.FluoAv = self.analysisBuffers.FluoAv
+        
+        
+    def ROIs_bounding_box(self):
+        """Bounding box of analysis ROIs in image pixels
+        
+        Return:
+            box (list of 4 int) : [Yminpx, Ymaxpx, Xminpx, Xmaxpx], full image if no ROI
+        """
+        if self.ROIn == 0 :
+            return [0, self.hpx, 0, self.wpx]
+        return [int(self.ROIlimitsTabpx[:,0,0].min()), int(self.ROIlimitsTabpx[:,0,1].max()),
+                int(self.ROIlimitsTabpx[:,1,0].min()), int(self.ROIlimitsTabpx[:,1,1].max())]
+    
+    
+    def analysis_regions(self):
+        """Disjoint regions of image where atomic density is computed by atom_imaging
+        
+            If densityInROIsOnly, the bounding box of analysis ROIs and, outside this box, a grid of one pixel 
+            every densityPreviewDecimation pixels for display. Otherwise the full image.
+        
+        Return:
+            list of regions (list of tuple of 2 slices) : regions [Y slice, X slice] of image arrays
+        """
+        if not(self.densityInROIsOnly) or self.ROIn == 0 :
+            return [(slice(None), slice(None))]
+        Yminpx, Ymaxpx, Xminpx, Xmaxpx = self.ROIs_bounding_box()
+        regions = [(slice(Yminpx, Ymaxpx), slice(Xminpx, Xmaxpx))]
+        d = self.densityPreviewDecimation
+        if d > 0 :
+            # grid rows above and below the box, then grid columns left and right of the box
+            YafterBoxpx = -(-Ymaxpx//d)*d # first grid row after box
+            YinBoxpx = -(-Yminpx//d)*d # first grid row in box
+            XafterBoxpx = -(-Xmaxpx//d)*d # first grid column after box
+            regions += [(slice(0, Yminpx, d), slice(None, None, d)),
+                        (slice(YafterBoxpx, None, d), slice(None, None, d)),
+                        (slice(YinBoxpx, Ymaxpx, d), slice(0, Xminpx, d)),
+                        (slice(YinBoxpx, Ymaxpx, d), slice(XafterBoxpx, None, d))]
+        return regions
+    
+    
+    def atomic_density_preview(self):
+        """Average atomic density to display : decimated image if only computed in ROIs with preview
+        
+        Return:
+            atomic density average (2D numpy array) : full image or view of one pixel every densityPreviewDecimation pixels
+        """
+        if self.densityInROIsOnly and self.densityPreviewDecimation > 1 :
+            return self.atomicDensityIntZperum2Av[::self.densityPreviewDecimation, ::self.densityPreviewDecimation]
+        return self.atomicDensityIntZperum2Av
         
         
     def set_ROIs_from_ROIarray(self, ROIarray) :
@@ -317,17 +455,24 @@ class ImagingClass():
         self.ROInameTab = ROIarray[self.ROIarrayIndexTab, 1]
         #ROI x center, y center, x width, y height
         self.ROIxywhTabum = ROIarray[ self.ROIarrayIndexTab, 2:6].astype(float) #ROI x center, y center, x width, y height
+        self.set_ROIs_limits()
+        
+        
+    def set_ROIs_limits(self) :
+        """ Compute analysis ROI limits in micrometers and in image pixels from ROI definitions in micrometers, 
+        limited to the image"""
         self.ROIlimitsTabum = np.zeros((self.ROIn, 2,2))
         self.ROIlimitsTabpx = np.zeros((self.ROIn, 2,2),dtype=np.int)
+        self.fitParametersCache = {}
         for i in range(self.ROIn) : 
             self.ROIlimitsTabum[i] =  [[min(max((self.ROIxywhTabum[i,1]-self.ROIxywhTabum[i,3]/2.),self.imageLimits[2]),self.imageLimits[3]),
                                         max(min((self.ROIxywhTabum[i,1]+self.ROIxywhTabum[i,3]/2.),self.imageLimits[3]),self.imageLimits[2])],
                                         [min(max((self.ROIxywhTabum[i,0]-self.ROIxywhTabum[i,2]/2.),self.imageLimits[0]),self.imageLimits[1]),
                                          max(min((self.ROIxywhTabum[i,0]+self.ROIxywhTabum[i,2]/2.),self.imageLimits[1]),self.imageLimits[0])]]
-            self.ROIlimitsTabpx[i] =  [[int(min(max((-self.ROIxywhTabum[i,1]-self.ROIxywhTabum[i,3]/2.)/self.pixelCalYumperpx+self.hpx/2.,0),self.hpx)),
-                                        int(max(min((-self.ROIxywhTabum[i,1]+self.ROIxywhTabum[i,3]/2.)/self.pixelCalYumperpx+self.hpx/2.,self.hpx),0))],
-                                       [int(min(max((self.ROIxywhTabum[i,0]-self.ROIxywhTabum[i,2]/2.)/self.pixelCalXumperpx+self.wpx/2.,0),self.wpx)),
-                                        int(max(min((self.ROIxywhTabum[i,0]+self.ROIxywhTabum[i,2]/2.)/self.pixelCalXumperpx+self.wpx/2.,self.wpx),0))]]
+            self.ROIlimitsTabpx[i] =  [[int(min(max((-self.ROIxywhTabum[i,1]-self.ROIxywhTabum[i,3]/2.)/self.pixelCalYumperpx+self.imageOriginpx[1],0),self.hpx)),
+                                        int(max(min((-self.ROIxywhTabum[i,1]+self.ROIxywhTabum[i,3]/2.)/self.pixelCalYumperpx+self.imageOriginpx[1],self.hpx),0))],
+                                       [int(min(max((self.ROIxywhTabum[i,0]-self.ROIxywhTabum[i,2]/2.)/self.pixelCalXumperpx+self.imageOriginpx[0],0),self.wpx)),
+                                        int(max(min((self.ROIxywhTabum[i,0]+self.ROIxywhTabum[i,2]/2.)/self.pixelCalXumperpx+self.imageOriginpx[0],self.wpx),0))]]
             if (self.ROIlimitsTabpx[i][0,0] == self.ROIlimitsTabpx[i][0,1]) or (self.ROIlimitsTabpx[i][1,0] == self.ROIlimitsTabpx[i][1,1]) :
                 print("Warning : ROI " + self.ROInameTab[i] + " defined out of field of view. \n Redefine this ROI in Imaging as full field of view !")
                 self.ROIlimitsTabpx[i] =  [[0, self.hpx], [0, self.wpx]]
@@ -383,7 +528,7 @@ class ImagingClass():
         ImagingDict = vars(self).copy()
         #remove large useless objects from imaging object
         excludedVars = ['mplwidgetImage', 'mplwidgetAnalysisGraph', 'ODe', 'ODeAv', 'atomicDensityIntZperum2', 
-                        'imAt','imRef','imBkgd', 'Fluo', 'FluoAv']
+                        'imAt','imRef','imBkgd', 'Fluo', 'FluoAv', 'densityLUT', 'analysisBuffers', 'fitPool', 'fitParametersCache', 'callbacks']
         if not(SaveAtomicDensity) or not(type(ImagingDict['atomicDensityIntZperum2Av']) == type(np.zeros((10,10)))) :
             excludedVars.append('atomicDensityIntZperum2Av')
         else :
@@ -421,7 +566,7 @@ class ImagingClass():
             print('ERROR : could not load Imaging data from file : \n' + dirAndFileName + '.imo')
     
     
-    def save_images(self, dirAndFileNameImages, saveImagesFormat=None):
+    def save_images(self, dirAndFileNameImages, saveImagesFormat=None, images=None):
         """ Save images taken during last atom_imaging.
         
         Args:
@@ -431,18 +576,23 @@ class ImagingClass():
         Keyword Args:
            saveImagesFormat=None (None or str) : file format : 0:NPZ (numpy) 1: PNG, 2: TIFF,
                if None or not int or not 0<= <=2 : take saveImagesFormat attribute
+           
+           images=None (None or 3-tuple of numpy 2D arrays) : (imAt, imRef, imBkgd) images to save, 
+               if None : images of Imaging object
         """
         if saveImagesFormat is not None and saveImagesFormat.type == int and 0<=saveImagesFormat<=2 :
             self.saveImagesFormat = saveImagesFormat
+        if images is None :
+            images = (self.imAt, self.imRef, self.imBkgd)
         # first list images to save depending on imaging settings
-        imagesToSave = [self.imAt]
+        imagesToSave = [images[0]]
         imagesToSaveNames = ['imAt']
         if self.imagingType == 0 : # absorption
-            imagesToSave.append(self.imRef)
+            imagesToSave.append(images[1])
             imagesToSaveNames.append('imRef')
         if self.removeBackground : 
-            imagesToSave.append(self.imBkgd)
-            imagesToSaveNames.append('imRef')
+            imagesToSave.append(images[2])
+            imagesToSaveNames.append('imBkgd')
         # save images
         if self.saveImagesFormat == 0 : #NPZ
             try: 
@@ -480,221 +630,414 @@ class ImagingClass():
             print('ERROR : Invalid self.saveImagesFormat in save_images method of Imaging class')
 
 
-    def save_images_during_atom_imaging(self, averages=1):
-        """ Save images automatically (called in atom imaging)."""
+    def save_images_during_atom_imaging(self, averages=1, images=None, scanIndex=None, averageIndex=None):
+        """ Save images automatically (called in atom imaging).
+        
+        Keyword Args:
+            averages=1 (int) : number of averages 
+            
+            images=None (None or 3-tuple of numpy 2D arrays) : (imAt, imRef, imBkgd) images to save, if None : images of Imaging object
+            
+            scanIndex=None, averageIndex=None (None or int) : indices of images in file name, if None : current indices
+        """
+        if scanIndex is None :
+            scanIndex = self.scanIndex
+        if averageIndex is None :
+            averageIndex = self.averageIndex
         dirAndFileNameImages = self.dirAndFileName
         if self.isTemperatureMeas and self.T_scans>1 :
             dirAndFileNameImages += '_T{0:02d}'.format(self.T_scanIndex)
         elif self.isLifetimeMeas and self.LT_scans>1 :
             dirAndFileNameImages += '_LT{0:02d}'.format(self.LT_scanIndex)
-        dirAndFileNameImages += '_scan{0:02d}'.format(self.scanIndex)
+        dirAndFileNameImages += '_scan{0:02d}'.format(scanIndex)
         if averages > 1 :
-            dirAndFileNameImages += '_av{0:02d}'.format(self.averageIndex)
-        self.save_images(dirAndFileNameImages)
+            dirAndFileNameImages += '_av{0:02d}'.format(averageIndex)
+        self.save_images(dirAndFileNameImages, images=images)
         
     
-    def imaging_scan(self, Camera, ui):
-        """ Do a standard scan of acquistion and analysis (Imaging tab)
+    def frames_per_average(self):
+        """ Number of camera images taken for one average of atom_imaging 
+        
+        Return:
+            [flush], atoms, ([flush], reference), ([flush], background) images number (int)
+        """
+        framesNumber = 1 + int(self.flushSensor)
+        if self.imagingType == 0 : #absorption
+            framesNumber += 1 + int(self.flushSensor)
+        if self.removeBackground :
+            framesNumber += 1 + int(self.flushSensor)
+        return framesNumber
+    
+    
+    def check_frames_metadata(self, framesMetadata, scanIndex=None, averageIndex=None):
+        """ Store metadata of the images of one average and warn if frames were dropped or swapped
+        
+            Frame indices given by camera should be consecutive in the sequence of one average.
+        
+        Args: 
+            framesMetadata (numpy structured array) : metadata of images (see CameraClass.frameMetadataDtype)
+        
+        Keyword Args:
+            scanIndex=None, averageIndex=None (None or int) : indices of images in scan, if None : current indices
+        """
+        if scanIndex is None :
+            scanIndex = self.scanIndex
+        if averageIndex is None :
+            averageIndex = self.averageIndex
+        if hasattr(self, 'framesMetadataArray') and scanIndex < self.framesMetadataArray.shape[0] \
+                and averageIndex < self.framesMetadataArray.shape[1] \
+                and len(framesMetadata) == self.framesMetadataArray.shape[2] :
+            self.framesMetadataArray[scanIndex, averageIndex] = framesMetadata
+        frameIndices = framesMetadata['frameIndex']
+        if np.all(frameIndices >= 0) and np.any(np.diff(frameIndices) != 1) :
+            print('WARNING ! : Camera frames dropped or swapped in imaging sequence : frame indices '+str(list(frameIndices)))
+    
+    
+    def set_camera_buffer_for_scan(self, Camera, averages=1):
+        """ Request a camera driver buffer holding bufferLookaheadPoints scan points (not less than config value)
+        
+            The camera reallocates its buffer only if its size changes.
         
         Args: 
             Camera (CameraClass) :  Camera object
             
+        Keyword Args:
+            averages=1 (int) : number of averages (atom_imaging) per scan point
+        """
+        framesPerPoint = self.frames_per_average() * averages
+        Camera.setBufferFrames(max(self.cameraBufferFrames, framesPerPoint*self.bufferLookaheadPoints))
+
+    
+    def crop_camera_to_ROIs(self, Camera):
+        """ Restrict camera readout to the bounding box of analysis ROIs (plus cropCameraMarginpx), if cropCameraToROIs
+        
+            The box is rounded by the camera driver (setCamROI) and the image axes, limits and ROI pixel limits 
+            are offset so that results in micrometers stay in the coordinates of the uncropped image.
+            Pixel results (cloudPositionspx, ROIlimitsTabpx...) are indices in the cropped image.
+            Camera ROI and uncropped image geometry are restored by restore_camera_ROI.
+        
+        Args: 
+            Camera (CameraClass) :  Camera object
+        """
+        if not(self.cropCameraToROIs) or self.ROIn == 0 or self.cameraROIbeforeCrop is not None :
+            return
+        self.cameraROIbeforeCrop = list(Camera.camROI)
+        self.imageOriginpxBeforeCrop = list(self.imageOriginpx)
+        [x0, y0, w0, h0] = self.cameraROIbeforeCrop[:4]
+        [xbin, ybin] = self.cameraBinning
+        # bounding box of ROIs with margin in image pixels : [[Ymin, Ymax], [Xmin, Xmax]]
+        Ymin = max(int(self.ROIlimitsTabpx[:,0,0].min()) - self.cropCameraMarginpx, 0)
+        Ymax = min(int(self.ROIlimitsTabpx[:,0,1].max()) + self.cropCameraMarginpx, self.hpx)
+        Xmin = max(int(self.ROIlimitsTabpx[:,1,0].min()) - self.cropCameraMarginpx, 0)
+        Xmax = min(int(self.ROIlimitsTabpx[:,1,1].max()) + self.cropCameraMarginpx, self.wpx)
+        # image pixels to sensor pixels, image axes can be reversed relative to sensor 
+        if Camera.reversedAxes[0] :
+            Xmin, Xmax = self.wpx - Xmax, self.wpx - Xmin
+        if Camera.reversedAxes[1] :
+            Ymin, Ymax = self.hpx - Ymax, self.hpx - Ymin
+        cropROI = [x0 + Xmin*xbin, y0 + Ymin*ybin, (Xmax-Xmin)*xbin, (Ymax-Ymin)*ybin, xbin, ybin]
+        [x, y, w, h] = Camera.setCamROI(cropROI)[:4]
+        # offset of cropped image in uncropped image (in image pixels), from ROI as rounded by camera
+        if Camera.reversedAxes[0] :
+            Xoffsetpx = (x0 + w0 - x - w) / xbin
+        else :
+            Xoffsetpx = (x - x0) / xbin
+        if Camera.reversedAxes[1] :
+            Yoffsetpx = (y0 + h0 - y - h) / ybin
+        else :
+            Yoffsetpx = (y - y0) / ybin
+        self.set_Imaging_variables_from_cam(Camera, imageOriginpx=[self.imageOriginpx[0] - Xoffsetpx, 
+                                                                   self.imageOriginpx[1] - Yoffsetpx])
+        self.set_ROIs_limits()
+    
+    
+    def restore_camera_ROI(self, Camera):
+        """ Restore camera ROI used before crop_camera_to_ROIs, and the uncropped image geometry 
+            (image axes, limits and ROI pixel limits) for live images and next scans
+        
+        Args: 
+            Camera (CameraClass) :  Camera object
+        """
+        if self.cameraROIbeforeCrop is not None :
+            Camera.setCamROI(self.cameraROIbeforeCrop)
+            self.set_Imaging_variables_from_cam(Camera, imageOriginpx=self.imageOriginpxBeforeCrop)
+            self.set_ROIs_limits()
+            self.cameraROIbeforeCrop = None
+            self.imageOriginpxBeforeCrop = None
+        
+        
+    def add_callback(self, event, callback):
+        """ Call a function on an event of scans. Callbacks are called in the thread running the scan, in order of addition.
+        
+        Args: 
+            event (str) : name of event, see imagingEvents
+            
+            callback (function) : function called with event arguments, see imagingEvents
+        """
+        if event not in imagingEvents :
+            print('WARNING ! : Imaging : unknown event '+str(event)+' for callback')
+        self.callbacks.setdefault(event, []).append(callback)
+        
+        
+    def remove_callback(self, event, callback):
+        """ Remove a function called on an event of scans 
+        
+        Args: 
+            event (str) : name of event, see imagingEvents
+            
+            callback (function) : function added with add_callback
+        """
+        if callback in self.callbacks.get(event, []) :
+            self.callbacks[event].remove(callback)
+        
+        
+    def emit(self, event, *args):
+        """ Call the functions added for an event of scans 
+        
+        Args: 
+            event (str) : name of event, see imagingEvents
+            
+            args : arguments of event, see imagingEvents
+        """
+        for callback in self.callbacks.get(event, []) :
+            callback(*args)
+        
+        
+    def connect_ui(self, ui):
+        """ Show results of scans on GUI : add GUI callbacks for events of scans 
+        
+        Args: 
             ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
+        """
+        def plot_axis_var_changed(axis, index) :
+            if axis == 'left' :
+                ui.Imaging__plotLeftAxisVar.setCurrentIndex(index)
+            else :
+                ui.Imaging__plotRightAxisVar.setCurrentIndex(index)
+        def clear_image() :
+            ui.mplwidgetImage.figure.clf()
+            ui.mplwidgetImage.draw()
+            ui.mplwidgetImage.repaint()
+        def plot_scan(plot_measurement_scan) :
+            # wait 1s to see last scan result before plotting global result
+            time.sleep(1.) 
+            plot_measurement_scan()
+        self.add_callback('singleImage', self.plot_Image_on_mplwidgetImage)
+        self.add_callback('atomicDensityAv', self.plot_2Ddata_on_mplwidgetImage)
+        self.add_callback('scanPointDone', lambda i : self.show_scan_point_results(ui, i))
+        self.add_callback('scanFailed', clear_image)
+        self.add_callback('plotAxisVarChanged', plot_axis_var_changed)
+        self.add_callback('TmeasurementDone', lambda i : self.show_T_measurement_results(ui))
+        self.add_callback('TscanDone', lambda : plot_scan(self.plot_T_measurement_scan))
+        self.add_callback('LTmeasurementDone', lambda i : self.show_LT_measurement_results(ui))
+        self.add_callback('LTscanDone', lambda : plot_scan(self.plot_LT_measurement_scan))
+        
+        
+    def imaging_scan(self, Camera):
+        """ Do a standard scan of acquistion and analysis (Imaging tab). 
+            Results are passed to GUI or scripts by callbacks (see add_callback).
+        
+        Args: 
+            Camera (CameraClass) :  Camera object
             
         Return:
             If scan performed normally (bool) 
         """
         self.isTemperatureMeas = False
         self.isLifetimeMeas = False
-        # clear camera buffer
-        Camera.clearBuffer()
-        # set var name and unit
-        self.scanVarName = ui.lineEdit_scanVarName.text()
-        self.scanUnitName = ui.lineEdit_scanUnitName.text()
-        self.scanDone = self.imaging_scan_measurement(Camera, ui, averages=self.averages, scans=self.scans)
+        # crop camera readout to analysis ROIs if asked, restored at end of scan
+        self.crop_camera_to_ROIs(Camera)
+        try :
+            # size camera buffer to scan and clear it
+            self.set_camera_buffer_for_scan(Camera, averages=self.averages)
+            Camera.clearBuffer()
+            self.scanDone = self.imaging_scan_measurement(Camera, averages=self.averages, scans=self.scans)
+        finally :
+            self.restore_camera_ROI(Camera)
         return self.scanDone
         
         
-    def temperature_measurement_scan(self, Camera, ui):
+    def temperature_measurement_scan(self, Camera):
         """ Do a scan of temperature measurements and analysis (Temperature tab) 
+            Results are passed to GUI or scripts by callbacks (see add_callback).
         
         Args: 
             Camera (CameraClass) :  Camera object
             
-            ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
-            
         Return:
             If scan performed normally (bool) 
         """
         self.isTemperatureMeas = True
         self.isLifetimeMeas = False
-        # clear camera buffer
-        Camera.clearBuffer()
-        #set right axis to cloud radii during the scan
-        ui.Imaging__plotRightAxisVar.setCurrentIndex(1)
-        self.plotRightAxisVar = 1
-        #define result arrays
-        self.scanVarName = ui.lineEdit_scanVarName.text()
-        self.scanUnitName = ui.lineEdit_scanUnitName.text()
-        self.T_tempXaxisuKList = np.zeros((self.ROIn,self.T_scans))
-        # self.T_tempXaxisuKErrList = np.zeros((self.ROIn,self.T_scans))
-        self.T_tempYaxisuKList = np.zeros((self.ROIn,self.T_scans))
-        # self.T_tempYaxisuKErrList = np.zeros((self.ROIn,self.T_scans))
-        self.T_atomNumberArray = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,self.T_averages))
-        self.T_atomNumberAvList =  np.zeros((self.ROIn,self.T_scans,self.T_TOFscans))
-        self.T_atomNumberAvErrList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans))
-        self.T_cloudRadiiumArray = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,self.T_averages,2))
-        self.T_cloudRadiiumAvList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
-        self.T_cloudRadiiumAvErrList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
-        self.T_cloudAvRadiiumList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
-        self.T_cloudPositionsumArray = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,self.T_averages,2))
-        self.T_cloudPositionsumAvList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
-        self.T_cloudPositionsumAvErrList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
-        self.T_cloudAvPositionsumList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
-        self.atomNumberAvAvList = np.zeros((self.ROIn,self.T_scans))
-        self.atomNumberAvAvErrList = np.zeros((self.ROIn,self.T_scans))
-        self.cloudAvRadiiumAvList = np.zeros((self.ROIn,self.T_scans,2))
-        self.cloudAvRadiiumAvErrList = np.zeros((self.ROIn,self.T_scans,2))
-        self.cloudAvPositionsumAvList = np.zeros((self.ROIn,self.T_scans,2))
-        self.cloudAvPositionsumAvErrList = np.zeros((self.ROIn,self.T_scans,2))
-        for i in range(self.T_scans) :
-            self.T_scanIndex = i
-            self.scanDone = self.imaging_scan_measurement(Camera, ui, averages=self.T_averages, 
-                                                     scans=self.T_TOFscans)
-            if not(self.scanDone) : 
-                return False
-            else : 
-                self.fit_T_measurement(ui)
-                self.plot_T_measurement()
-                self.T_tempXaxisuKList[:,i] = self.T_tempXaxisuK
-                # self.T_tempXaxisuKErrList[:,i] = self.T_tempXaxisuKErr
-                self.T_tempYaxisuKList[:,i] = self.T_tempYaxisuK
-                # self.T_tempYaxisuKErrList[:,i] = self.T_tempYaxisuKErr
-                self.T_atomNumberArray[:,i] = self.atomNumberArray
-                self.T_atomNumberAvList[:,i] =  self.atomNumberAvList
-                self.T_atomNumberAvErrList[:,i] = self.atomNumberAvErrList
-                self.T_cloudRadiiumArray[:,i] = self.cloudRadiiumArray
-                self.T_cloudRadiiumAvList[:,i] = self.cloudRadiiumAvList
-                self.T_cloudRadiiumAvErrList[:,i] = self.cloudRadiiumAvErrList
-                self.T_cloudAvRadiiumList[:,i] = self.cloudAvRadiiumList
-                self.T_cloudPositionsumArray[:,i] = self.cloudPositionsumArray
-                self.T_cloudPositionsumAvList[:,i] = self.cloudPositionsumAvList
-                self.T_cloudPositionsumAvErrList[:,i] = self.cloudPositionsumAvErrList
-                self.T_cloudAvPositionsumList[:,i] = self.cloudAvPositionsumList
-                self.atomNumberAvAvList[:,i] = self.atomNumberAvList.mean(axis=(1))
-                self.atomNumberAvAvErrList[:,i] = self.atomNumberArray.std(axis=(1,2))/np.sqrt(self.atomNumberArray[0].size)
-                self.cloudAvRadiiumAvList[:,i] = self.cloudAvRadiiumList.mean(axis=(1))
-                self.cloudAvRadiiumAvErrList[:,i] = self.cloudAvRadiiumList.std(axis=(1))/np.sqrt(self.T_TOFscans)
-                self.cloudAvPositionsumAvList[:,i] = self.cloudAvPositionsumList.mean(axis=(1))
-                self.cloudAvPositionsumAvErrList[:,i] = self.cloudAvPositionsumList.std(axis=(1))/np.sqrt(self.T_TOFscans)
-        if self.T_scans > 1:
-            #set right axis to temperature at the end of the scan
-            ui.Imaging__plotRightAxisVar.setCurrentIndex(3)
-            self.plotRightAxisVar = 3
-            # wait 1s to see last scan result before plotting global result
-            time.sleep(1.) 
-            self.plot_T_measurement_scan()
+        # crop camera readout to analysis ROIs if asked, restored at end of scan
+        self.crop_camera_to_ROIs(Camera)
+        try :
+            # size camera buffer to scan and clear it
+            self.set_camera_buffer_for_scan(Camera, averages=self.T_averages)
+            Camera.clearBuffer()
+            #set right axis to cloud radii during the scan
+            self.plotRightAxisVar = 1
+            self.emit('plotAxisVarChanged', 'right', self.plotRightAxisVar)
+            #define result arrays
+            self.T_tempXaxisuKList = np.zeros((self.ROIn,self.T_scans))
+            # self.T_tempXaxisuKErrList = np.zeros((self.ROIn,self.T_scans))
+            self.T_tempYaxisuKList = np.zeros((self.ROIn,self.T_scans))
+            # self.T_tempYaxisuKErrList = np.zeros((self.ROIn,self.T_scans))
+            self.T_atomNumberArray = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,self.T_averages))
+            self.T_atomNumberAvList =  np.zeros((self.ROIn,self.T_scans,self.T_TOFscans))
+            self.T_atomNumberAvErrList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans))
+            self.T_cloudRadiiumArray = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,self.T_averages,2))
+            self.T_cloudRadiiumAvList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
+            self.T_cloudRadiiumAvErrList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
+            self.T_cloudAvRadiiumList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
+            self.T_cloudPositionsumArray = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,self.T_averages,2))
+            self.T_cloudPositionsumAvList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
+            self.T_cloudPositionsumAvErrList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
+            self.T_cloudAvPositionsumList = np.zeros((self.ROIn,self.T_scans,self.T_TOFscans,2))
+            self.atomNumberAvAvList = np.zeros((self.ROIn,self.T_scans))
+            self.atomNumberAvAvErrList = np.zeros((self.ROIn,self.T_scans))
+            self.cloudAvRadiiumAvList = np.zeros((self.ROIn,self.T_scans,2))
+            self.cloudAvRadiiumAvErrList = np.zeros((self.ROIn,self.T_scans,2))
+            self.cloudAvPositionsumAvList = np.zeros((self.ROIn,self.T_scans,2))
+            self.cloudAvPositionsumAvErrList = np.zeros((self.ROIn,self.T_scans,2))
+            for i in range(self.T_scans) :
+                self.T_scanIndex = i
+                self.scanDone = self.imaging_scan_measurement(Camera, averages=self.T_averages, 
+                                                         scans=self.T_TOFscans)
+                if not(self.scanDone) : 
+                    return False
+                else : 
+                    self.fit_T_measurement()
+                    self.T_tempXaxisuKList[:,i] = self.T_tempXaxisuK
+                    # self.T_tempXaxisuKErrList[:,i] = self.T_tempXaxisuKErr
+                    self.T_tempYaxisuKList[:,i] = self.T_tempYaxisuK
+                    # self.T_tempYaxisuKErrList[:,i] = self.T_tempYaxisuKErr
+                    self.T_atomNumberArray[:,i] = self.atomNumberArray
+                    self.T_atomNumberAvList[:,i] =  self.atomNumberAvList
+                    self.T_atomNumberAvErrList[:,i] = self.atomNumberAvErrList
+                    self.T_cloudRadiiumArray[:,i] = self.cloudRadiiumArray
+                    self.T_cloudRadiiumAvList[:,i] = self.cloudRadiiumAvList
+                    self.T_cloudRadiiumAvErrList[:,i] = self.cloudRadiiumAvErrList
+                    self.T_cloudAvRadiiumList[:,i] = self.cloudAvRadiiumList
+                    self.T_cloudPositionsumArray[:,i] = self.cloudPositionsumArray
+                    self.T_cloudPositionsumAvList[:,i] = self.cloudPositionsumAvList
+                    self.T_cloudPositionsumAvErrList[:,i] = self.cloudPositionsumAvErrList
+                    self.T_cloudAvPositionsumList[:,i] = self.cloudAvPositionsumList
+                    self.atomNumberAvAvList[:,i] = self.atomNumberAvList.mean(axis=(1))
+                    self.atomNumberAvAvErrList[:,i] = self.atomNumberArray.std(axis=(1,2))/np.sqrt(self.atomNumberArray[0].size)
+                    self.cloudAvRadiiumAvList[:,i] = self.cloudAvRadiiumList.mean(axis=(1))
+                    self.cloudAvRadiiumAvErrList[:,i] = self.cloudAvRadiiumList.std(axis=(1))/np.sqrt(self.T_TOFscans)
+                    self.cloudAvPositionsumAvList[:,i] = self.cloudAvPositionsumList.mean(axis=(1))
+                    self.cloudAvPositionsumAvErrList[:,i] = self.cloudAvPositionsumList.std(axis=(1))/np.sqrt(self.T_TOFscans)
+                    self.emit('TmeasurementDone', i)
+            if self.T_scans > 1:
+                #set right axis to temperature at the end of the scan
+                self.plotRightAxisVar = 3
+                self.emit('plotAxisVarChanged', 'right', self.plotRightAxisVar)
+                self.emit('TscanDone')
+        finally :
+            self.restore_camera_ROI(Camera)
         return self.scanDone
     
     
-    def lifetime_measurement_scan(self, Camera, ui):
+    def lifetime_measurement_scan(self, Camera):
         """ Do a scan of lifetime measurements and analysis (Lifetime tab) 
+            Results are passed to GUI or scripts by callbacks (see add_callback).
         
         Args: 
             Camera (CameraClass) :  Camera object
             
-            ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
-            
         Return:
             If scan performed normally (bool) 
         """
         self.isTemperatureMeas = False
         self.isLifetimeMeas = True
-        # clear camera buffer
-        Camera.clearBuffer()
-        #set left axis to atom number during scan
-        ui.Imaging__plotLeftAxisVar.setCurrentIndex(0)
-        self.plotLeftAxisVar = 0
-        #define result arrays
-        self.scanVarName = ui.lineEdit_scanVarName.text()
-        self.scanUnitName = ui.lineEdit_scanUnitName.text()
-        self.LT_LifetimemsList = np.zeros((self.ROIn,self.LT_scans))
-        self.LT_LifetimemsErrList = np.zeros((self.ROIn,self.LT_scans))
-        self.LT_atomNumberTStartFittedList = np.zeros((self.ROIn,self.LT_scans))
-        self.LT_atomNumberTStartFittedErrList = np.zeros((self.ROIn,self.LT_scans))
-        self.LT_atomNumberOffsetFittedList = np.zeros((self.ROIn,self.LT_scans))
-        self.LT_atomNumberOffsetFittedErrList = np.zeros((self.ROIn,self.LT_scans))
-        self.LT_atomNumberAvTStartList = np.zeros((self.ROIn,self.LT_scans))
-        self.LT_atomNumberAvTStartErrList = np.zeros((self.ROIn,self.LT_scans))
-        self.LT_atomNumberArray = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,self.LT_averages))
-        self.LT_atomNumberAvList =  np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans))
-        self.LT_atomNumberAvErrList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans))
-        self.LT_cloudRadiiumArray = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,self.LT_averages,2))
-        self.LT_cloudRadiiumAvList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
-        self.LT_cloudRadiiumAvErrList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
-        self.LT_cloudAvRadiiumList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
-        self.LT_cloudPositionsumArray = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,self.LT_averages,2))
-        self.LT_cloudPositionsumAvList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
-        self.LT_cloudPositionsumAvErrList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
-        self.LT_cloudAvPositionsumList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
-        self.atomNumberAvAvList = np.zeros((self.ROIn,self.LT_scans))
-        self.atomNumberAvAvErrList = np.zeros((self.ROIn,self.LT_scans))
-        self.cloudAvRadiiumAvList = np.zeros((self.ROIn,self.LT_scans,2))
-        self.cloudAvRadiiumAvErrList = np.zeros((self.ROIn,self.LT_scans,2))
-        self.cloudAvPositionsumAvList = np.zeros((self.ROIn,self.LT_scans,2))
-        self.cloudAvPositionsumAvErrList = np.zeros((self.ROIn,self.LT_scans,2))
-        for i in range(self.LT_scans) :
-            self.LT_scanIndex = i
-            self.scanDone = self.imaging_scan_measurement(Camera, ui, averages=self.LT_averages, 
-                                                     scans=self.LT_Tscans)
-            if not(self.scanDone) : 
-                return False
-            else : 
-                self.fit_LT_measurement(ui)
-                self.plot_LT_measurement()
-                self.LT_LifetimemsList[:,i] = self.LT_Lifetimems
-                self.LT_LifetimemsErrList[:,i] = self.LT_LifetimemsErr
-                self.LT_atomNumberTStartFittedList[:,i] = self.LT_atomNumberTStartFitted
-                self.LT_atomNumberTStartFittedErrList[:,i] = self.LT_atomNumberTStartFittedErr
-                self.LT_atomNumberOffsetFittedList[:,i] = self.LT_atomNumberOffsetFitted
-                self.LT_atomNumberOffsetFittedErrList[:,i] = self.LT_atomNumberOffsetFittedErr
-                self.LT_atomNumberAvTStartList[:,i] = self.atomNumberAvList[:,0] 
-                self.LT_atomNumberAvTStartErrList[:,i] = self.atomNumberAvErrList[:,0] 
-                self.LT_atomNumberArray[:,i] = self.atomNumberArray
-                self.LT_atomNumberAvList[:,i] =  self.atomNumberAvList
-                self.LT_atomNumberAvErrList[:,i] = self.atomNumberAvErrList
-                self.LT_cloudRadiiumArray[:,i] = self.cloudRadiiumArray
-                self.LT_cloudRadiiumAvList[:,i] = self.cloudRadiiumAvList
-                self.LT_cloudRadiiumAvErrList[:,i] = self.cloudRadiiumAvErrList
-                self.LT_cloudAvRadiiumList[:,i] = self.cloudAvRadiiumList
-                self.LT_cloudPositionsumArray[:,i] = self.cloudPositionsumArray
-                self.LT_cloudPositionsumAvList[:,i] = self.cloudPositionsumAvList
-                self.LT_cloudPositionsumAvErrList[:,i] = self.cloudPositionsumAvErrList
-                self.LT_cloudAvPositionsumList[:,i] = self.cloudAvPositionsumList
-                self.atomNumberAvAvList[:,i] = self.atomNumberAvList.mean(axis=(1))
-                self.atomNumberAvAvErrList[:,i] = self.atomNumberArray.std(axis=(1,2))/np.sqrt(self.atomNumberArray[0].size)
-                self.cloudAvRadiiumAvList[:,i] = self.cloudAvRadiiumList.mean(axis=(1))
-                self.cloudAvRadiiumAvErrList[:,i] = self.cloudAvRadiiumList.std(axis=(1))/np.sqrt(self.LT_Tscans)
-                self.cloudAvPositionsumAvList[:,i] = self.cloudAvPositionsumList.mean(axis=(1))
-                self.cloudAvPositionsumAvErrList[:,i] = self.cloudAvPositionsumList.std(axis=(1))/np.sqrt(self.LT_Tscans)
-        if self.LT_scans > 1:
-            #set right axis to Lifetime at the end of the scan
-            ui.Imaging__plotRightAxisVar.setCurrentIndex(4)
-            self.plotRightAxisVar = 4
-            # wait 1s to see last scan result before plotting global result
-            time.sleep(1.) 
-            self.plot_LT_measurement_scan()
+        # crop camera readout to analysis ROIs if asked, restored at end of scan
+        self.crop_camera_to_ROIs(Camera)
+        try :
+            # size camera buffer to scan and clear it
+            self.set_camera_buffer_for_scan(Camera, averages=self.LT_averages)
+            Camera.clearBuffer()
+            #set left axis to atom number during scan
+            self.plotLeftAxisVar = 0
+            self.emit('plotAxisVarChanged', 'left', self.plotLeftAxisVar)
+            #define result arrays
+            self.LT_LifetimemsList = np.zeros((self.ROIn,self.LT_scans))
+            self.LT_LifetimemsErrList = np.zeros((self.ROIn,self.LT_scans))
+            self.LT_atomNumberTStartFittedList = np.zeros((self.ROIn,self.LT_scans))
+            self.LT_atomNumberTStartFittedErrList = np.zeros((self.ROIn,self.LT_scans))
+            self.LT_atomNumberOffsetFittedList = np.zeros((self.ROIn,self.LT_scans))
+            self.LT_atomNumberOffsetFittedErrList = np.zeros((self.ROIn,self.LT_scans))
+            self.LT_atomNumberAvTStartList = np.zeros((self.ROIn,self.LT_scans))
+            self.LT_atomNumberAvTStartErrList = np.zeros((self.ROIn,self.LT_scans))
+            self.LT_atomNumberArray = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,self.LT_averages))
+            self.LT_atomNumberAvList =  np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans))
+            self.LT_atomNumberAvErrList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans))
+            self.LT_cloudRadiiumArray = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,self.LT_averages,2))
+            self.LT_cloudRadiiumAvList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
+            self.LT_cloudRadiiumAvErrList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
+            self.LT_cloudAvRadiiumList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
+            self.LT_cloudPositionsumArray = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,self.LT_averages,2))
+            self.LT_cloudPositionsumAvList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
+            self.LT_cloudPositionsumAvErrList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
+            self.LT_cloudAvPositionsumList = np.zeros((self.ROIn,self.LT_scans,self.LT_Tscans,2))
+            self.atomNumberAvAvList = np.zeros((self.ROIn,self.LT_scans))
+            self.atomNumberAvAvErrList = np.zeros((self.ROIn,self.LT_scans))
+            self.cloudAvRadiiumAvList = np.zeros((self.ROIn,self.LT_scans,2))
+            self.cloudAvRadiiumAvErrList = np.zeros((self.ROIn,self.LT_scans,2))
+            self.cloudAvPositionsumAvList = np.zeros((self.ROIn,self.LT_scans,2))
+            self.cloudAvPositionsumAvErrList = np.zeros((self.ROIn,self.LT_scans,2))
+            for i in range(self.LT_scans) :
+                self.LT_scanIndex = i
+                self.scanDone = self.imaging_scan_measurement(Camera, averages=self.LT_averages, 
+                                                         scans=self.LT_Tscans)
+                if not(self.scanDone) : 
+                    return False
+                else : 
+                    self.fit_LT_measurement()
+                    self.LT_LifetimemsList[:,i] = self.LT_Lifetimems
+                    self.LT_LifetimemsErrList[:,i] = self.LT_LifetimemsErr
+                    self.LT_atomNumberTStartFittedList[:,i] = self.LT_atomNumberTStartFitted
+                    self.LT_atomNumberTStartFittedErrList[:,i] = self.LT_atomNumberTStartFittedErr
+                    self.LT_atomNumberOffsetFittedList[:,i] = self.LT_atomNumberOffsetFitted
+                    self.LT_atomNumberOffsetFittedErrList[:,i] = self.LT_atomNumberOffsetFittedErr
+                    self.LT_atomNumberAvTStartList[:,i] = self.atomNumberAvList[:,0] 
+                    self.LT_atomNumberAvTStartErrList[:,i] = self.atomNumberAvErrList[:,0] 
+                    self.LT_atomNumberArray[:,i] = self.atomNumberArray
+                    self.LT_atomNumberAvList[:,i] =  self.atomNumberAvList
+                    self.LT_atomNumberAvErrList[:,i] = self.atomNumberAvErrList
+                    self.LT_cloudRadiiumArray[:,i] = self.cloudRadiiumArray
+                    self.LT_cloudRadiiumAvList[:,i] = self.cloudRadiiumAvList
+                    self.LT_cloudRadiiumAvErrList[:,i] = self.cloudRadiiumAvErrList
+                    self.LT_cloudAvRadiiumList[:,i] = self.cloudAvRadiiumList
+                    self.LT_cloudPositionsumArray[:,i] = self.cloudPositionsumArray
+                    self.LT_cloudPositionsumAvList[:,i] = self.cloudPositionsumAvList
+                    self.LT_cloudPositionsumAvErrList[:,i] = self.cloudPositionsumAvErrList
+                    self.LT_cloudAvPositionsumList[:,i] = self.cloudAvPositionsumList
+                    self.atomNumberAvAvList[:,i] = self.atomNumberAvList.mean(axis=(1))
+                    self.atomNumberAvAvErrList[:,i] = self.atomNumberArray.std(axis=(1,2))/np.sqrt(self.atomNumberArray[0].size)
+                    self.cloudAvRadiiumAvList[:,i] = self.cloudAvRadiiumList.mean(axis=(1))
+                    self.cloudAvRadiiumAvErrList[:,i] = self.cloudAvRadiiumList.std(axis=(1))/np.sqrt(self.LT_Tscans)
+                    self.cloudAvPositionsumAvList[:,i] = self.cloudAvPositionsumList.mean(axis=(1))
+                    self.cloudAvPositionsumAvErrList[:,i] = self.cloudAvPositionsumList.std(axis=(1))/np.sqrt(self.LT_Tscans)
+                    self.emit('LTmeasurementDone', i)
+            if self.LT_scans > 1:
+                #set right axis to Lifetime at the end of the scan
+                self.plotRightAxisVar = 4
+                self.emit('plotAxisVarChanged', 'right', self.plotRightAxisVar)
+                self.emit('LTscanDone')
+        finally :
+            self.restore_camera_ROI(Camera)
         return self.scanDone
 
     
-    def imaging_scan_measurement(self, Camera, ui, averages=1, scans=1):
-        """ Do a one-axis scan of measurements and analysis 
+    def imaging_scan_measurement(self, Camera, averages=1, scans=1):
+        """ Do a one-axis scan of measurements and analysis, 
+            emit 'scanPointDone' event after each scan point and 'scanFailed' if acquisition failed
         
         Args: 
             Camera (CameraClass) :  Camera object
             
-            ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
-            
         Keyword Args:
             averages=1 (int) : number of averages (atom_imaging) per scan point
             
@@ -715,46 +1058,173 @@ class ImagingClass():
         self.cloudPositionsumAvList = np.zeros((self.ROIn,scans,2))
         self.cloudPositionsumAvErrList = np.zeros((self.ROIn,scans,2))
         self.cloudAvPositionsumList = np.zeros((self.ROIn,scans,2)) 
-        for i in range(scans):
-            self.scanIndex = i
-            self.atomImagingDone = self.atom_imaging(Camera, averages=averages) # calculate OD and atomic density
-            if not(self.atomImagingDone) :
-                ui.mplwidgetImage.figure.clf()
-                ui.mplwidgetImage.draw()
-                ui.mplwidgetImage.repaint()
-                return False
-            else :
-                self.atomNumberArray[:,i] = self.atomNumberList 
-                self.atomNumberAvList[:,i] = self.atomNumberAv
-                ui.lcdNumber_Imaging_NumberofAtomsAv.display(self.atomNumberAv[self.ROIblackTabIndex])
-                ui.lcdNumber_T_NumberofAtomsAv.display(self.atomNumberAv[self.ROIblackTabIndex])
-                self.atomNumberAvErrList[:,i] = self.atomNumberAvErr
-                ui.lcdNumber_Imaging_NumberofAtomsAvErr.display(self.atomNumberAvErr[self.ROIblackTabIndex])
-                ui.lcdNumber_T_NumberofAtomsAvErr.display(self.atomNumberAvErr[self.ROIblackTabIndex])
-                self.cloudRadiiumArray[:,i] = self.cloudRadiiumList
-                self.cloudRadiiumAvList[:,i] = self.cloudRadiiumAv
-                ui.lcdNumber_Imaging_CloudRadiusXaxisumAv.display(self.cloudAvRadiium[self.ROIblackTabIndex][1])
-                ui.lcdNumber_Imaging_CloudRadiusYaxisumAv.display(self.cloudAvRadiium[self.ROIblackTabIndex][0])
-                self.cloudRadiiumAvErrList[:,i] = self.cloudRadiiumAvErr
-                ui.lcdNumber_Imaging_CloudRadiusXaxisumAvErr.display(self.cloudRadiiumAvErr[self.ROIblackTabIndex][1])
-                ui.lcdNumber_Imaging_CloudRadiusYaxisumAvErr.display(self.cloudRadiiumAvErr[self.ROIblackTabIndex][0])
-                self.cloudAvRadiiumList[:,i] = self.cloudAvRadiium
-                self.cloudPositionsumArray[:,i] = self.cloudPositionsumList
-                self.cloudPositionsumAvList[:,i] = self.cloudPositionsumAv
-                ui.lcdNumber_Imaging_CloudPositionXaxisumAv.display(self.cloudAvPositionsum[self.ROIblackTabIndex][1])
-                ui.lcdNumber_Imaging_CloudPositionYaxisumAv.display(self.cloudAvPositionsum[self.ROIblackTabIndex][0])
-                self.cloudPositionsumAvErrList[:,i] = self.cloudPositionsumAvErr
-                ui.lcdNumber_Imaging_CloudPositionXaxisumAvErr.display(self.cloudPositionsumAvErr[self.ROIblackTabIndex][1])
-                ui.lcdNumber_Imaging_CloudPositionYaxisumAvErr.display(self.cloudPositionsumAvErr[self.ROIblackTabIndex][0])
-                self.cloudAvPositionsumList[:,i] = self.cloudAvPositionsum
-                # if standard scan plot dynamically
-                if not(self.isTemperatureMeas) and not(self.isLifetimeMeas) : 
-                    self.plot_scan_results()
-                #update GUI
-                ui.widget.repaint()
+        # metadata (frame index, hardware timestamp, host time, grab latency) of all camera images of the scan
+        self.framesMetadataArray = np.zeros((scans,averages,self.frames_per_average()), dtype=Camera.frameMetadataDtype)
+        # background acquisition thread fills camera ring buffer while analysing previous images
+        if self.backgroundAcquisition :
+            Camera.start_background_acquisition()
+        try :
+            if self.pipelinedScans :
+                self.atomImagingDone = self.imaging_scan_pipeline(Camera, averages=averages, scans=scans)
+                return self.atomImagingDone
+            for i in range(scans):
+                self.scanIndex = i
+                self.atomImagingDone = self.atom_imaging(Camera, averages=averages) # calculate OD and atomic density
+                if not(self.atomImagingDone) :
+                    self.emit('scanFailed')
+                    return False
+                else :
+                    self.store_scan_point_results(i)
+                    self.emit('scanPointDone', i)
+        finally :
+            if self.backgroundAcquisition :
+                Camera.stop_background_acquisition()
         return self.atomImagingDone
                 
     
+    def store_scan_point_results(self, i):
+        """ Store results of last atom_imaging in scan result arrays 
+        
+        Args: 
+            i (int) : scan point index
+        """
+        self.atomNumberArray[:,i] = self.atomNumberList 
+        self.atomNumberAvList[:,i] = self.atomNumberAv
+        self.atomNumberAvErrList[:,i] = self.atomNumberAvErr
+        self.cloudRadiiumArray[:,i] = self.cloudRadiiumList
+        self.cloudRadiiumAvList[:,i] = self.cloudRadiiumAv
+        self.cloudRadiiumAvErrList[:,i] = self.cloudRadiiumAvErr
+        self.cloudAvRadiiumList[:,i] = self.cloudAvRadiium
+        self.cloudPositionsumArray[:,i] = self.cloudPositionsumList
+        self.cloudPositionsumAvList[:,i] = self.cloudPositionsumAv
+        self.cloudPositionsumAvErrList[:,i] = self.cloudPositionsumAvErr
+        self.cloudAvPositionsumList[:,i] = self.cloudAvPositionsum
+    
+    
+    def show_scan_point_results(self, ui, i):
+        """ Show results of scan point on GUI ('scanPointDone' event callback, see connect_ui)
+        
+        Args: 
+            ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
+            
+            i (int) : scan point index
+        """
+        ui.lcdNumber_Imaging_NumberofAtomsAv.display(self.atomNumberAv[self.ROIblackTabIndex])
+        ui.lcdNumber_T_NumberofAtomsAv.display(self.atomNumberAv[self.ROIblackTabIndex])
+        ui.lcdNumber_Imaging_NumberofAtomsAvErr.display(self.atomNumberAvErr[self.ROIblackTabIndex])
+        ui.lcdNumber_T_NumberofAtomsAvErr.display(self.atomNumberAvErr[self.ROIblackTabIndex])
+        ui.lcdNumber_Imaging_CloudRadiusXaxisumAv.display(self.cloudAvRadiium[self.ROIblackTabIndex][1])
+        ui.lcdNumber_Imaging_CloudRadiusYaxisumAv.display(self.cloudAvRadiium[self.ROIblackTabIndex][0])
+        ui.lcdNumber_Imaging_CloudRadiusXaxisumAvErr.display(self.cloudRadiiumAvErr[self.ROIblackTabIndex][1])
+        ui.lcdNumber_Imaging_CloudRadiusYaxisumAvErr.display(self.cloudRadiiumAvErr[self.ROIblackTabIndex][0])
+        ui.lcdNumber_Imaging_CloudPositionXaxisumAv.display(self.cloudAvPositionsum[self.ROIblackTabIndex][1])
+        ui.lcdNumber_Imaging_CloudPositionYaxisumAv.display(self.cloudAvPositionsum[self.ROIblackTabIndex][0])
+        ui.lcdNumber_Imaging_CloudPositionXaxisumAvErr.display(self.cloudPositionsumAvErr[self.ROIblackTabIndex][1])
+        ui.lcdNumber_Imaging_CloudPositionYaxisumAvErr.display(self.cloudPositionsumAvErr[self.ROIblackTabIndex][0])
+        # if standard scan plot dynamically
+        if not(self.isTemperatureMeas) and not(self.isLifetimeMeas) : 
+            self.plot_scan_results()
+        #update GUI
+        ui.widget.repaint()
+    
+    
+    def imaging_scan_pipeline(self, Camera, averages=1, scans=1):
+        """ Do the measurements of imaging_scan_measurement in a pipeline of worker threads 
+        
+            Stages : acquire (Camera.get_frames) -> density -> fit -> persist (save images) -> display (in calling GUI thread).
+            Stages are connected by queues of at most pipelineQueueSize items, so that the camera is read 
+            while previous images are analysed and saved. Results are stored in scan order.
+            Analysis stages use a shallow copy of the Imaging object, single images results are computed in a pool 
+            of preallocated buffers released after display : images are saved by persist stage before release, 
+            and copied for display callbacks. Fit of average atomic density is not plotted (plotFit1D).
+        
+        Args: 
+            Camera (CameraClass) :  Camera object
+            
+        Keyword Args:
+            averages=1 (int) : number of averages (atom_imaging) per scan point
+            
+            scans=1 (int) : lenght of scan axis (number of scan points)
+        
+        Return:
+            If scan performed normally (bool) 
+        """
+        # analysis state of worker threads, results copied to Imaging object by display stage
+        worker = copy.copy(self)
+        worker.analysisBuffers = densitytool.AnalysisBuffers()
+        worker.densitySAT = densitytool.SummedAreaTable()
+        worker.plotFit1D = False
+        worker.set_atom_imaging_parameters()
+        framesNumber = worker.frames_per_average()
+        # pool of buffers for single images results : limits the number of images in the pipeline
+        buffersPool = queue.Queue()
+        for k in range(self.pipelineQueueSize + 2) :
+            buffers = densitytool.AnalysisBuffers(withAverages=False)
+            buffers.resize(worker.imageSize, worker.imageDtype)
+            buffersPool.put(buffers)
+
+        def acquire(shot) :
+            shot['frames'], framesMetadata = Camera.get_frames(framesNumber, returnMetadata=True)
+            shot['failed'] = Camera.imageAcqLastFailed
+            if shot['failed'] :
+                pipeline.abort()
+            else :
+                worker.check_frames_metadata(framesMetadata, shot['scanIndex'], shot['averageIndex'])
+            return shot
+
+        def density(shot) :
+            shot['buffers'] = buffersPool.get()
+            shot['images'] = worker.compute_atomic_density(shot['frames'], shot['buffers'])
+            return shot
+
+        def fit(shot) :
+            i = shot['averageIndex']
+            if i == 0 :
+                worker.reset_atom_imaging_results(averages)
+            for region in worker.densityRegions :
+                worker.analysisBuffers.accumulate(worker.imagingType == 0, region, source=shot['buffers'])
+            worker.fit_single_image(shot['buffers'].density, i)
+            if i == averages-1 :
+                worker.finish_atom_imaging(averages)
+                shot['results'] = {name : getattr(worker, name) for name in atomImagingResults}
+                shot['results']['atomicDensityIntZperum2Av'] = worker.atomicDensityIntZperum2Av.copy()
+            return shot
+
+        def persist(shot) :
+            if worker.autoSaveImages :
+                worker.save_images_during_atom_imaging(averages=averages, images=shot['images'], 
+                                                       scanIndex=shot['scanIndex'], averageIndex=shot['averageIndex'])
+            return shot
+
+        pipeline = pipelinetool.Pipeline([('Acquire', acquire), ('Density', density), ('Fit', fit), ('Persist', persist)],
+                                         queueSize=self.pipelineQueueSize, name='ImagingPipeline')
+        for i in range(scans) :
+            for j in range(averages) :
+                pipeline.put({'scanIndex' : i, 'averageIndex' : j})
+        pipeline.close()
+        pipeline.start()
+        # display stage : results in scan order, all items are read to release buffers even if pipeline aborted
+        for shot in pipeline.results() :
+            if 'buffers' in shot :
+                if self.plotSingleImage and not(pipeline.aborted.is_set()) :
+                    self.emit('singleImage', shot['images'][0].copy())
+                shot.pop('images')
+                buffersPool.put(shot.pop('buffers'))
+            if 'results' in shot and not(pipeline.aborted.is_set()) :
+                self.scanIndex = shot['scanIndex']
+                for name, value in shot['results'].items() :
+                    setattr(self, name, value)
+                self.store_scan_point_results(shot['scanIndex'])
+                if self.plotAtomicDensityAv :
+                    self.emit('atomicDensityAv', self.atomic_density_preview())
+                self.emit('scanPointDone', shot['scanIndex'])
+        pipeline.join(Camera.timeout + 1.)
+        if pipeline.aborted.is_set() :
+            self.emit('scanFailed')
+            return False
+        return True
+    
+    
     def atom_imaging(self, Camera, averages=1):
         """ Do one point measurements and analysis 
         
@@ -767,20 +1237,76 @@ class ImagingClass():
         Return:
             If scan performed normally (bool) 
         """
+        self.set_atom_imaging_parameters()
+        self.reset_atom_imaging_results(averages)
+        # images in one sequence per average : [flush], atoms, ([flush], reference), ([flush], background)
+        framesNumber = self.frames_per_average()
+        for i in range(averages) :
+            self.averageIndex = i
+            frames, framesMetadata = Camera.get_frames(framesNumber, returnMetadata=True)
+            if Camera.imageAcqLastFailed :
+                return False
+            self.check_frames_metadata(framesMetadata)
+            # reckon atomic density in preallocated buffers, sum for averages
+            # imAt, imRef, imBkgd can be arrays of analysisBuffers, overwritten by the next shot : 
+            # saved before next shot, copied for display callbacks
+            imAt, imRef, imBkgd = self.compute_atomic_density(frames, self.analysisBuffers)
+            self.imAt = imAt
+            if imRef is not None :
+                self.imRef = imRef
+            if imBkgd is not None :
+                self.imBkgd = imBkgd
+            for region in self.densityRegions :
+                self.analysisBuffers.accumulate(self.imagingType == 0, region)
+            # fit cloud dimensions and atom number for each ROI
+            self.fit_single_image(self.atomicDensityIntZperum2, i)
+            # plot each image with atoms if asked for
+            if self.plotSingleImage : 
+                self.emit('singleImage', self.imAt.copy())
+            # save each image if asked for
+            if self.autoSaveImages :
+                self.save_images_during_atom_imaging(averages=averages)
+        self.finish_atom_imaging(averages)
+        # plot average OD if asked for
+        if self.plotAtomicDensityAv :
+            self.emit('atomicDensityAv', self.atomic_density_preview())
+        return True
+    
+    
+    def set_atom_imaging_parameters(self):
+        """ Compute absorption or fluorescence coefficients and analysis regions before atom_imaging (same for a scan)"""
+        self.set_analysis_buffers()
+        self.densityRegions = self.analysis_regions()
+        if self.densityInROIsOnly :
+            self.analysisBuffers.zero_shot()
+        # images with background removed in full only if plotted or saved
+        if self.plotSingleImage or self.autoSaveImages :
+            self.backgroundRegions = [(slice(None), slice(None))]
+        else :
+            self.backgroundRegions = self.densityRegions
         if self.imagingType == 0 : #absorption
-            self.ODeAv *= 0.
             self.crossSectionum2 = 1e+12*self.hplanck*self.atomicFrequencyTHz*1.e+12*self.atomicgamma / self.Isat
             self.coeffAbsStrongSatcalc = float(self.includeSaturationEffects) / self.atomicgamma \
                                           / (self.pixelCalAreaum2 * self.cameraQuantumEff * self.laserPulseDurationus*1.e-6 )
+            self.densityLUTactive = self.useDensityLUT and np.dtype(self.imageDtype) == np.uint8 \
+                                    and self.densityLUT.set_parameters(self.cameraMaxLevel, self.crossSectionum2, 
+                                                                       self.coeffAbsStrongSatcalc, self.thresholdAbsImg)
         else : #fluorescence
-            self.FluoAv *= 0.
             self.rateScattFluoPerAtom = self.atomicgamma *(self.laserIntensity/self.Isat)\
                                         /(1 + (self.laserIntensity/self.Isat)*float(self.includeSaturationEffects) \
                                             + (2*self.laserDetuningMHz/self.atomicLineFWHWinMHz)**2 )
             self.coeffFluoCalc = 2./( (1-np.sqrt(1-self.numericalAperture**2)) *self.cameraQuantumEff\
                                         *self.laserPulseDurationus*1.e-6\
                                         *self.rateScattFluoPerAtom*self.pixelCalAreaum2)
-        self.atomicDensityIntZperum2Av *= 0.
+    
+    
+    def reset_atom_imaging_results(self, averages=1):
+        """ Set averages to 0 and allocate result arrays of one point measurement
+        
+        Keyword Args:
+            averages=1 (int) : number of averages 
+        """
+        self.analysisBuffers.zero_averages()
         self.atomNumber = np.zeros(self.ROIn)
         self.cloudRadiium = np.zeros((self.ROIn,2))
         self.cloudPositionspx = np.zeros((self.ROIn,2))
@@ -790,85 +1316,91 @@ class ImagingClass():
         self.cloudRadiiumList = np.zeros((self.ROIn, averages, 2))
         self.cloudPositionspxList = np.zeros((self.ROIn, averages, 2))
         self.cloudPositionsumList = np.zeros((self.ROIn, averages, 2))
-        for i in range(averages) :
-            self.averageIndex = i
-            # flush sensor if asked
-            if self.flushSensor :
-                Camera.grabArray()
-                if Camera.imageAcqLastFailed :
-                    return False
-            #image with atoms
-            self.imAt = Camera.grabArray()
-            if Camera.imageAcqLastFailed :
-                    return False
-            #reference image for absorption imaging
-            if self.imagingType == 0 : #absorption
-                #flush sensor if asked
-                if self.flushSensor :
-                    Camera.grabArray()
-                    if Camera.imageAcqLastFailed :
-                        return False
-                #reference image 
-                self.imRef = Camera.grabArray()
-            if Camera.imageAcqLastFailed :
-                    return False
-            # take and remove background image if asked
-            if self.removeBackground : 
-                # flush sensor if asked
-                if self.flushSensor :
-                    Camera.grabArray()
-                    if Camera.imageAcqLastFailed :
-                        return False
-                #image without light : background
-                self.imBkgd = Camera.grabArray()
-                if Camera.imageAcqLastFailed :
-                        return False
-                # remove background without letting negative values
-                self.imAt = np.where(self.imAt<self.imBkgd, np.zeros(self.imAt.shape, dtype=self.imageDtype), self.imAt - self.imBkgd)
-                self.imRef = np.where(self.imRef<self.imBkgd, np.zeros(self.imRef.shape, dtype=self.imageDtype), self.imRef - self.imBkgd)
-            # reckon atomic density
-            if self.imagingType == 0 : #absorption
-                #calulate ODe sum for average
-                self.ODe = - np.log(np.where(self.imAt==0, np.ones(self.imAt.shape), self.imAt.astype(np.float)))\
-                                + np.log(np.where(self.imRef==0, np.ones(self.imRef.shape), self.imRef.astype(np.float)))
-                self.ODe[self.imRef<self.thresholdAbsImg] = 0.
-                self.ODeAv += self.ODe
-                #calculate atomic density sum with strong saturation part 
-                self.atomicDensityIntZperum2 = self.ODe / self.crossSectionum2 \
-                                                + (self.imRef.astype(np.float)-self.imAt.astype(np.float))*self.coeffAbsStrongSatcalc     
-                self.atomicDensityIntZperum2[self.imRef<self.thresholdAbsImg] = 0.
+    
+    
+    def compute_atomic_density(self, frames, buffers):
+        """ Remove background and compute OD (or Fluo) and atomic density of one average, in analysis regions only
+        
+        Args: 
+            frames (numpy 3D array) : camera images of one average (see frames_per_average)
+            
+            buffers (AnalysisBuffers) : preallocated buffers receiving images without background and results
+        
+        Return:
+            imAt, imRef, imBkgd (numpy 2D arrays) : images with atoms, reference (None in fluorescence) 
+                and background (None if not removeBackground)
+        """
+        frameIndex = int(self.flushSensor)
+        #image with atoms
+        imAt = frames[frameIndex]
+        imRef, imBkgd = None, None
+        #reference image for absorption imaging
+        if self.imagingType == 0 : #absorption
+            frameIndex += 1 + int(self.flushSensor)
+            imRef = frames[frameIndex]
+        # remove background image if asked
+        if self.removeBackground : 
+            #image without light : background
+            frameIndex += 1 + int(self.flushSensor)
+            imBkgd = frames[frameIndex]
+            # remove background without letting negative values, in preallocated images
+            for region in self.backgroundRegions :
+                buffers.subtract_background(imAt, imBkgd, buffers.imAt, region)
+                if self.imagingType == 0 :
+                    buffers.subtract_background(imRef, imBkgd, buffers.imRef, region)
+            imAt = buffers.imAt
+            if self.imagingType == 0 :
+                imRef = buffers.imRef
+        # reckon atomic density in preallocated buffers, in analysis regions only
+        for region in self.densityRegions :
+            if self.imagingType == 0 and self.densityLUTactive : #absorption with lookup tables
+                self.densityLUT.compute(imAt[region], imRef[region], buffers.ODe[region], buffers.density[region])
+            elif self.imagingType == 0 : #absorption
+                #calulate ODe and atomic density with strong saturation part 
+                buffers.absorption(imAt, imRef, self.crossSectionum2, self.coeffAbsStrongSatcalc, self.thresholdAbsImg, region)
             else : #fluorescence
-                self.Fluo = self.imAt.astype(np.float)
-                self.FluoAv += self.Fluo
-                self.atomicDensityIntZperum2 = self.Fluo * self.coeffFluoCalc
-            # average integrated atomic density
-            self.atomicDensityIntZperum2Av += self.atomicDensityIntZperum2
-            # fit cloud dimensions for each ROI
-            for ROIi in range(self.ROIn) :
-                cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum = self.fit_Atomic_Cloud_1D(self.atomicDensityIntZperum2, ROIi)
-                self.cloudRadiium[ROIi] = cloudRadiium
-                self.cloudRadiiumList[ROIi][i] = cloudRadiium
-                self.cloudPositionspx[ROIi] = cloudPositionspx
-                self.cloudPositionspxList[ROIi][i] = cloudPositionspx
-                self.cloudPositionsum[ROIi] = cloudPositionsum
-                self.cloudPositionsumList[ROIi][i] = cloudPositionsum
-                #calculate atom number : : sum only ROI region : minus on y coordinate because inverted in pixel
-                self.cloudZonepx[ROIi] =  self.ROIlimitsTabpx[ROIi]
-                # sum only in region of +/- 3 * fitted sigma inside ROI if asked
-                if self.atomNumberUseFit3sigma :
-                    self.cloudZonepx[ROIi] = np.array([[int(min(max(cloudPositionspx[0]-3*cloudRadiipx[0],self.ROIlimitsTabpx[ROIi][0,0]),self.ROIlimitsTabpx[ROIi][0,1])),
-                                                  int(max(min(cloudPositionspx[0]+3*cloudRadiipx[0],self.ROIlimitsTabpx[ROIi][0,1]),self.ROIlimitsTabpx[ROIi][0,0]))],
-                                                [int(min(max(cloudPositionspx[1]-3*cloudRadiipx[1],self.ROIlimitsTabpx[ROIi][1,0]),self.ROIlimitsTabpx[ROIi][1,1])),
-                                                 int(max(min(cloudPositionspx[1]+3*cloudRadiipx[1],self.ROIlimitsTabpx[ROIi][1,1]),self.ROIlimitsTabpx[ROIi][1,0]))]])
-                self.atomNumber[ROIi] = self.atomicDensityIntZperum2[self.cloudZonepx[ROIi][0,0]:self.cloudZonepx[ROIi][0,1],
-                                                               self.cloudZonepx[ROIi][1,0]:self.cloudZonepx[ROIi][1,1]].sum()*self.pixelCalAreaum2
-                self.atomNumberList[ROIi][i] = self.atomNumber[ROIi]
-            # plot each image with atoms if asked for
-            if self.plotSingleImage : 
-                self.plot_Image_on_mplwidgetImage(self.imAt)
-            # save each image if asked for
-            if self.autoSaveImages :
-                self.save_images_during_atom_imaging(averages=averages)
+                buffers.fluorescence(imAt, self.coeffFluoCalc, region)
+        return imAt, imRef, imBkgd
+    
+    
+    def fit_single_image(self, atomicDensityIntZperum2, i):
+        """ Fit cloud dimensions and calculate atom number for each ROI from atomic density of one average
+        
+        Args: 
+            atomicDensityIntZperum2 (2D numpy array float) : atomic density of one average
+            
+            i (int) : average index in result lists
+        """
+        # integral image for ROI sums and fits projections
+        summedAreaTable = self.build_density_SAT(atomicDensityIntZperum2)
+        # fit cloud dimensions for each ROI
+        cloudsFits = self.fit_Atomic_Clouds_1D(atomicDensityIntZperum2, summedAreaTable=summedAreaTable)
+        for ROIi in range(self.ROIn) :
+            cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum = cloudsFits[ROIi]
+            self.cloudRadiium[ROIi] = cloudRadiium
+            self.cloudRadiiumList[ROIi][i] = cloudRadiium
+            self.cloudPositionspx[ROIi] = cloudPositionspx
+            self.cloudPositionspxList[ROIi][i] = cloudPositionspx
+            self.cloudPositionsum[ROIi] = cloudPositionsum
+            self.cloudPositionsumList[ROIi][i] = cloudPositionsum
+            #calculate atom number : : sum only ROI region : minus on y coordinate because inverted in pixel
+            self.cloudZonepx[ROIi] =  self.ROIlimitsTabpx[ROIi]
+            # sum only in region of +/- 3 * fitted sigma inside ROI if asked
+            if self.atomNumberUseFit3sigma :
+                self.cloudZonepx[ROIi] = np.array([[int(min(max(cloudPositionspx[0]-3*cloudRadiipx[0],self.ROIlimitsTabpx[ROIi][0,0]),self.ROIlimitsTabpx[ROIi][0,1])),
+                                              int(max(min(cloudPositionspx[0]+3*cloudRadiipx[0],self.ROIlimitsTabpx[ROIi][0,1]),self.ROIlimitsTabpx[ROIi][0,0]))],
+                                            [int(min(max(cloudPositionspx[1]-3*cloudRadiipx[1],self.ROIlimitsTabpx[ROIi][1,0]),self.ROIlimitsTabpx[ROIi][1,1])),
+                                             int(max(min(cloudPositionspx[1]+3*cloudRadiipx[1],self.ROIlimitsTabpx[ROIi][1,1]),self.ROIlimitsTabpx[ROIi][1,0]))]])
+            self.atomNumber[ROIi] = self.density_sum(atomicDensityIntZperum2, self.cloudZonepx[ROIi], summedAreaTable)*self.pixelCalAreaum2
+            self.atomNumberList[ROIi][i] = self.atomNumber[ROIi]
+    
+    
+    def finish_atom_imaging(self, averages=1):
+        """ Calculate averages, their errors and fit average atomic density at the end of one point measurement
+        
+        Keyword Args:
+            averages=1 (int) : number of averages 
+        """
         #calc average OD
         if self.imagingType == 0 : #absorption
             self.ODeAv /= averages
@@ -890,9 +1422,11 @@ class ImagingClass():
         self.cloudAvPositionsum  = self.cloudPositionsumAv
         self.atomNumberAv = self.atomNumber
         if averages > 1 :
+            summedAreaTable = self.build_density_SAT(self.atomicDensityIntZperum2Av)
+            cloudsAvFits = self.fit_Atomic_Clouds_1D(self.atomicDensityIntZperum2Av, plotFit1D = self.plotFit1D,
+                                                     summedAreaTable=summedAreaTable, fitImage='average')
             for ROIi in range(self.ROIn) :
-                cloudAvRadiipx, cloudAvPositionspx, cloudAvRadiium, cloudAvPositionsum =\
-                                self.fit_Atomic_Cloud_1D(self.atomicDensityIntZperum2Av, ROIi, plotFit1D = self.plotFit1D)
+                cloudAvRadiipx, cloudAvPositionspx, cloudAvRadiium, cloudAvPositionsum = cloudsAvFits[ROIi]
                 self.cloudAvRadiium[ROIi] = cloudAvRadiium
                 self.cloudAvPositionspx[ROIi] = cloudAvPositionspx
                 self.cloudAvPositionsum[ROIi] = cloudAvPositionsum
@@ -904,20 +1438,62 @@ class ImagingClass():
                                                     int(max(min(cloudAvPositionspx[0]+3*cloudAvRadiipx[0],self.ROIlimitsTabpx[ROIi][0,1]),self.ROIlimitsTabpx[ROIi][0,0]))],
                                                     [int(min(max(cloudAvPositionspx[1]-3*cloudAvRadiipx[1],self.ROIlimitsTabpx[ROIi][1,0]),self.ROIlimitsTabpx[ROIi][1,1])),
                                                      int(max(min(cloudAvPositionspx[1]+3*cloudAvRadiipx[1],self.ROIlimitsTabpx[ROIi][1,1]),self.ROIlimitsTabpx[ROIi][1,0]))]])
-                self.atomNumberAv[ROIi] = self.atomicDensityIntZperum2Av[self.cloudAvZonepx[ROIi][0,0]:self.cloudAvZonepx[ROIi][0,1],
-                                                                   self.cloudAvZonepx[ROIi][1,0]:self.cloudAvZonepx[ROIi][1,1]].sum()*self.pixelCalAreaum2
-
-        # plot average OD if asked for
-        if self.plotAtomicDensityAv :
-            self.plot_2Ddata_on_mplwidgetImage(self.atomicDensityIntZperum2Av)
-        return True
-
+                self.atomNumberAv[ROIi] = self.density_sum(self.atomicDensityIntZperum2Av, self.cloudAvZonepx[ROIi], summedAreaTable)\
+                                            *self.pixelCalAreaum2
+    
     
-    def fit_Atomic_Cloud_1D(self, atomicDensityIntZperum2, ROIi, plotFit1D = False):
+    def build_density_SAT(self, atomicDensityIntZperum2):
+        """Build integral image of atomic density over the bounding box of analysis ROIs, if useSummedAreaTable
+        
+            If useSummedAreaTable is None, integral image is used only if the ROIs overlap a lot :
+            building it costs about 5 times more per pixel of bounding box than direct sums per pixel of each ROI.
+        
+        Args: 
+            atomicDensityIntZperum2 (2D numpy array float) : atomic density data
+        
+        Return:
+            summedAreaTable (SummedAreaTable or None) : densitySAT built on data, None if integral image not used
+        """
+        box = self.ROIs_bounding_box()
+        if self.useSummedAreaTable is None :
+            ROIsAreapx = ((self.ROIlimitsTabpx[:,0,1]-self.ROIlimitsTabpx[:,0,0])*(self.ROIlimitsTabpx[:,1,1]-self.ROIlimitsTabpx[:,1,0])).sum()
+            useSummedAreaTable = ROIsAreapx > 5 * (box[1]-box[0]) * (box[3]-box[2])
+        else :
+            useSummedAreaTable = self.useSummedAreaTable
+        if not(useSummedAreaTable) :
+            return None
+        self.densitySAT.build(atomicDensityIntZperum2, box)
+        return self.densitySAT
+    
+    
+    def density_sum(self, atomicDensityIntZperum2, zonepx, summedAreaTable=None):
+        """Sum of atomic density over a zone
+        
+        Args: 
+            atomicDensityIntZperum2 (2D numpy array float) : atomic density data
+            
+            zonepx (2*2 numpy array int) : [[Yminpx, Ymaxpx], [Xminpx, Xmaxpx]] zone in image pixels
+        
+        Keyword Args:
+            summedAreaTable=None (SummedAreaTable or None) : integral image of data, direct sum if None
+        
+        Return:
+            sum of atomic density (float)
+        """
+        if summedAreaTable is not None :
+            return summedAreaTable.sum(zonepx[0,0], zonepx[0,1], zonepx[1,0], zonepx[1,1])
+        return atomicDensityIntZperum2[zonepx[0,0]:zonepx[0,1], zonepx[1,0]:zonepx[1,1]].sum()
+    
+    
+    def fit_Atomic_Cloud_1D(self, atomicDensityIntZperum2, ROIi, plotFit1D = False, summedAreaTable=None, fitImage='single'):
         """ Make fits for estimation of cloud radii, positions with Gaussian functions.
             Fits are done on data integrated along one axis.
             Fits are done a second time with adjusted position and integration width 
             dependin on other axis results.
+            If fitWarmStart is set, fits start from the last converged fits of the ROI on the same kind of image
+            (fitParametersCache).
+            If cloudDimensionsMethod is 'moments', fits are replaced by the moments of the projections 
+            (see fitpooltool.moments_cloud_1D), ROI should be about 6 cloud radii wide.
         
         Args: 
             atomicDensityIntZperum2 (2D numpy array float) : measured atomic density data
@@ -926,82 +1502,96 @@ class ImagingClass():
 
         Keyword Args:
             plotFit1D = False (bool) : If True, open window to show the 1D fits 
+            
+            summedAreaTable=None (SummedAreaTable or None) : integral image of atomicDensityIntZperum2 
+                giving the projections, direct means if None
+            
+            fitImage='single' (str) : 'single' or 'average', kind of image fitted, warm starts are cached separately 
         
         Return:
             cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum : 
                 4-Tuple of 2-list with fit results where the axes are [Y, X]  
         """
-        # 
-        # fit 1D functions gauss with offset along X and Y axes
-        # fit mean of atomic intensity along X axis : Y axis fit 
         fitYaxispx = self.Yaxispx[self.ROIlimitsTabpx[ROIi][0,0]:self.ROIlimitsTabpx[ROIi][0,1]]
         fitYaxisum = self.Yaxisum[self.ROIlimitsTabpx[ROIi][0,0]:self.ROIlimitsTabpx[ROIi][0,1]]
-        gaussfitY = fittool.FitUtility(fitYaxispx,
-                                        atomicDensityIntZperum2[self.ROIlimitsTabpx[ROIi][0,0]:self.ROIlimitsTabpx[ROIi][0,1],
-                                                               self.ROIlimitsTabpx[ROIi][1,0]:self.ROIlimitsTabpx[ROIi][1,1]].mean(axis=1)*1000.,
-                                        fittool.gauss)               
-        sigmaYpx = int(abs(gaussfitY.p[2]))
-        positionYpx = int(gaussfitY.p[1])
-        
-        # fit mean of atomic intensity along Y axis : X axis fit 
         fitXaxispx = self.Xaxispx[self.ROIlimitsTabpx[ROIi][1,0]:self.ROIlimitsTabpx[ROIi][1,1]]
         fitXaxisum = self.Xaxisum[self.ROIlimitsTabpx[ROIi][1,0]:self.ROIlimitsTabpx[ROIi][1,1]]
-        gaussfitX = fittool.FitUtility(fitXaxispx,
-                                        atomicDensityIntZperum2[self.ROIlimitsTabpx[ROIi][0,0]:self.ROIlimitsTabpx[ROIi][0,1],
-                                                               self.ROIlimitsTabpx[ROIi][1,0]:self.ROIlimitsTabpx[ROIi][1,1]].mean(axis=0)*1000.,
-                                        fittool.gauss)  
-        sigmaXpx = int(abs(gaussfitX.p[2]))
-        positionXpx = int(gaussfitX.p[1])
-        
-        #do another fit with average only over the rows or collumns within the sigma of the other axis, unless fit failed
-        # fit mean of atomic intensity along X axis : Y axis fit 
-        if positionXpx < self.ROIlimitsTabpx[ROIi][1,0] or positionXpx > self.ROIlimitsTabpx[ROIi][1,1] : 
-            positionXpx = (self.ROIlimitsTabpx[ROIi][1,0] + self.ROIlimitsTabpx[ROIi][1,1] )/2
-            sigmaXpx = self.ROIlimitsTabpx[ROIi][1,1] - self.ROIlimitsTabpx[ROIi][1,0]
-        Xminpx = int(min(max(positionXpx - sigmaXpx,self.ROIlimitsTabpx[ROIi][1,0]),self.ROIlimitsTabpx[ROIi][1,1]))
-        Xmaxpx = int(max(min(positionXpx + sigmaXpx+1, self.ROIlimitsTabpx[ROIi][1,1]),self.ROIlimitsTabpx[ROIi][1,0])) 
-        Yfitdata = atomicDensityIntZperum2[self.ROIlimitsTabpx[ROIi][0,0]:self.ROIlimitsTabpx[ROIi][0,1],Xminpx:Xmaxpx].mean(axis=1)*1000.
-        gaussfitYpx = fittool.FitUtility(fitYaxispx, Yfitdata, fittool.gauss)
-        sigmaYpx = abs(gaussfitYpx.p[2])
-        sigmaYum = sigmaYpx*self.pixelCalYumperpx
-        positionYpx = gaussfitYpx.p[1]
-        positionYum = - (positionYpx-self.hpx/2.)*self.pixelCalYumperpx # minus sign because on plot the Y axis is inverted
-
-        # fit mean of atomic intensity along Y axis : X axis fit 
-        if positionYpx < self.ROIlimitsTabpx[ROIi][0,0] or positionYpx > self.ROIlimitsTabpx[ROIi][0,1] : 
-            positionYpx = (self.ROIlimitsTabpx[ROIi][0,0] + self.ROIlimitsTabpx[ROIi][0,1] )/2
-            sigmaYpx = self.ROIlimitsTabpx[ROIi][0,1] - self.ROIlimitsTabpx[ROIi][0,0]
-        Yminpx = int(min(max(positionYpx - sigmaYpx,self.ROIlimitsTabpx[ROIi][0,0]),self.ROIlimitsTabpx[ROIi][0,1]))
-        Ymaxpx =  int(max(min(positionYpx + sigmaYpx+1, self.ROIlimitsTabpx[ROIi][0,1]),self.ROIlimitsTabpx[ROIi][0,0])) 
-        Xfitdata = atomicDensityIntZperum2[Yminpx:Ymaxpx,self.ROIlimitsTabpx[ROIi][1,0]:self.ROIlimitsTabpx[ROIi][1,1]].mean(axis=0)*1000.
-        gaussfitXpx = fittool.FitUtility(fitXaxispx, Xfitdata, fittool.gauss)
-        sigmaXpx = abs(gaussfitXpx.p[2])
-        sigmaXum = sigmaXpx*self.pixelCalXumperpx
-        positionXpx = gaussfitXpx.p[1]
-        positionXum = (positionXpx-self.wpx/2.)*self.pixelCalXumperpx
-
+        # moments of projections, or fit 1D functions gauss with offset along X and Y axes, projections from integral image if given
+        if self.cloudDimensionsMethod == 'moments' :
+            cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum, fitCurves = fitpooltool.moments_cloud_1D(
+                            atomicDensityIntZperum2 if summedAreaTable is None else summedAreaTable,
+                            self.ROIlimitsTabpx[ROIi], fitYaxispx, fitXaxispx, 
+                            (self.pixelCalYumperpx, self.pixelCalXumperpx), self.imageOriginpx)
+        else :
+            cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum, fitCurves, warmStarts = fitpooltool.fit_cloud_1D(
+                            atomicDensityIntZperum2 if summedAreaTable is None else summedAreaTable,
+                            self.ROIlimitsTabpx[ROIi], fitYaxispx, fitXaxispx, 
+                            (self.pixelCalYumperpx, self.pixelCalXumperpx), self.imageOriginpx,
+                            self.fitParametersCache.get((ROIi, fitImage)) if self.fitWarmStart else None, self.fitWarmStartResidualRatio)
+            if self.fitWarmStart :
+                self.fitParametersCache[(ROIi, fitImage)] = warmStarts
+        
         #plot fit as external plots if wanted
         if plotFit1D :
             #plotting
+            gaussfitYpxx, gaussfitYpxy, Yfitdata, gaussfitXpxx, gaussfitXpxy, Xfitdata = fitCurves
             fig=plt.figure()
             ax2 = fig.add_subplot(212)
-            ax2.plot(-(gaussfitYpx.x-self.hpx/2.)*self.pixelCalYumperpx, gaussfitYpx.y, 'r-', lw = 2)
+            ax2.plot(-(gaussfitYpxx-self.imageOriginpx[1])*self.pixelCalYumperpx, gaussfitYpxy, 'r-', lw = 2)
             ax2.plot(-fitYaxisum,Yfitdata)
             ax2.set_xlabel('Vertical  Yaxis (um)')
             ax2.set_ylabel('Integrated atomic density ')
             ax1 = fig.add_subplot(211)
-            ax1.plot((gaussfitXpx.x-self.wpx/2.)*self.pixelCalXumperpx, gaussfitXpx.y, 'g-', lw = 2)
+            ax1.plot((gaussfitXpxx-self.imageOriginpx[0])*self.pixelCalXumperpx, gaussfitXpxy, 'g-', lw = 2)
             ax1.plot(fitXaxisum,Xfitdata)
             ax1.set_xlabel('Horizontal Xaxis (um)')
             ax1.set_ylabel('Integrated atomic density ')
             ax1.set_title('Fit of atom cloud dimensions')
             plt.show()
             
-        cloudRadiipx = [sigmaYpx , sigmaXpx]
-        cloudPositionspx = [positionYpx , positionXpx]
-        cloudRadiium = [sigmaYum , sigmaXum]
-        cloudPositionsum = [positionYum , positionXum] #relative to center
         return cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum
+    
+    
+    def fit_Atomic_Clouds_1D(self, atomicDensityIntZperum2, plotFit1D = False, summedAreaTable=None, fitImage='single'):
+        """ Fit cloud radii and positions of all ROIs (see fit_Atomic_Cloud_1D).
+            ROIs are fitted together with batched fits if batchFits is set, 
+            else concurrently in fitPool if fitWorkers > 1, when fits are not plotted.
+            Moments of projections are always computed serially (cloudDimensionsMethod 'moments').
+        
+        Args: 
+            atomicDensityIntZperum2 (2D numpy array float) : measured atomic density data
+
+        Keyword Args:
+            plotFit1D = False (bool) : If True, open window to show the 1D fits 
+            
+            summedAreaTable=None (SummedAreaTable or None) : integral image of atomicDensityIntZperum2 
+                giving the projections in serial and batched fits, direct means if None
+            
+            fitImage='single' (str) : 'single' or 'average', kind of image fitted, warm starts are cached separately 
+        
+        Return:
+            list of 4-tuples (cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum) in ROIs order
+        """
+        if self.fitPool.workers != self.fitWorkers or self.fitPool.executorType != self.fitExecutorType :
+            self.fitPool.shutdown()
+            self.fitPool = fitpooltool.FitPool(self.fitWorkers, self.fitExecutorType)
+        if plotFit1D or self.cloudDimensionsMethod == 'moments' or not(self.batchFits or (self.fitPool.active() and self.ROIn > 1)) :
+            return [self.fit_Atomic_Cloud_1D(atomicDensityIntZperum2, ROIi, plotFit1D=plotFit1D, summedAreaTable=summedAreaTable,
+                                             fitImage=fitImage)
+                    for ROIi in range(self.ROIn)]
+        warmStartsList = [self.fitParametersCache.get((ROIi, fitImage)) if self.fitWarmStart else None for ROIi in range(self.ROIn)]
+        if self.batchFits :
+            results = fitpooltool.fit_clouds_1D_batch(atomicDensityIntZperum2 if summedAreaTable is None else summedAreaTable,
+                                                      self.ROIlimitsTabpx[:self.ROIn], self.Yaxispx, self.Xaxispx,
+                                                      (self.pixelCalYumperpx, self.pixelCalXumperpx), self.imageOriginpx,
+                                                      warmStartsList, self.fitWarmStartResidualRatio)
+        else :
+            results = self.fitPool.fit_clouds_1D(atomicDensityIntZperum2, self.ROIlimitsTabpx[:self.ROIn], self.Yaxispx, self.Xaxispx,
+                                                 (self.pixelCalYumperpx, self.pixelCalXumperpx), self.imageOriginpx,
+                                                 warmStartsList, self.fitWarmStartResidualRatio)
+        if self.fitWarmStart :
+            self.fitParametersCache.update(((ROIi, fitImage), result[5]) for ROIi, result in enumerate(results))
+        return [result[:4] for result in results]
 
 
     def plot_scan_results(self):
@@ -1152,12 +1742,33 @@ class ImagingClass():
         self.mplwidgetAnalysisGraph.repaint()
 
             
-    def fit_T_measurement(self,ui):
-        """Fit results of time of flight scan for temperature measurement
+    def fit_profiles(self, x, yStack, fitFunction, yerr=None, NumberOfSteps=None):
+        """Fit one function to each profile of a stack, 
+            together with fittool.BatchFitUtility if batchFits is set, else with one fittool.FitUtility per profile
         
         Args:
-            ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
+            x (1D numpy array) : common x vector of profiles
+            
+            yStack (2D numpy array) : y vectors of profiles
+            
+            fitFunction (fittool.FitFunction) : function to fit
+        
+        Keyword Args:
+            yerr=None (2D numpy array or None) : errors of y vectors
+            
+            NumberOfSteps=None (int or None) : number of points of fitted curves (see fittool.FitUtility)
+        
+        Return:
+            list of fit results with attributes p, psigma, x, y (fittool.FitUtility or fittool.ProfileFit) in profiles order
         """
+        if self.batchFits :
+            return fittool.BatchFitUtility(x, yStack, fitFunction, yerr=yerr, NumberOfSteps=NumberOfSteps).profile_fits()
+        return [fittool.FitUtility(x, yStack[k], fitFunction, yerr=None if yerr is None else yerr[k], NumberOfSteps=NumberOfSteps)
+                for k in range(len(yStack))]
+    
+    
+    def fit_T_measurement(self):
+        """Fit results of time of flight scan for temperature measurement"""
         # time of flight axis        
         self.T_TOFmsaxis = np.arange(self.T_TOFscans)*self.T_TOFstepms + self.T_TOFstartms
         # fit temperature for X axis : use results of fit of average atomic density 'cloudAv'
@@ -1168,9 +1779,8 @@ class ImagingClass():
         # self.T_tempXaxisuKErr = np.zeros(self.ROIn)
         self.linfitTX_xaxis = np.zeros((self.ROIn, 200))
         self.linfitTX_yaxis = np.zeros((self.ROIn, 200))
-        for ROIi in range(self.ROIn) :
-            linfitTX = fittool.FitUtility(self.T_TOFmsaxis**2, self.T_cloudRadiusumXaxis[ROIi]**2,
-                                               fittool.linear, NumberOfSteps= 200)
+        linfitsTX = self.fit_profiles(self.T_TOFmsaxis**2, self.T_cloudRadiusumXaxis[:self.ROIn]**2, fittool.linear, NumberOfSteps= 200)
+        for ROIi, linfitTX in enumerate(linfitsTX) :
             #temperature error estimate not working because fit too dependent on cloud radius error dependence with TOF or if one of the gaussian fit fails
             # if self.T_averages == 1 : 
             # self.T_tempXaxisuKErr[ROIi] = 0.
@@ -1182,8 +1792,6 @@ class ImagingClass():
             self.T_tempXaxisuK[ROIi] = linfitTX.p[0] * self.atomicMassAU*self.atomicMassUnitinSI / self.kB
             self.linfitTX_xaxis[ROIi] = linfitTX.x
             self.linfitTX_yaxis[ROIi] = linfitTX.y
-        ui.lcdNumber_T_TempXaxisuK.display(self.T_tempXaxisuK[self.ROIblackTabIndex])
-        # ui.lcdNumber_T_TempXaxisuKErr.display(self.T_tempXaxisuKErr[self.ROIblackTabIndex])
         # fit temperature for Y axis : use results of fit of average atomic density 'cloudAv'
         self.T_cloudRadiusumYaxis = self.cloudAvRadiiumList[:,:,0] 
         self.T_cloudRadiusumYaxisErr = self.cloudRadiiumAvErrList[:,:,0] 
@@ -1192,11 +1800,10 @@ class ImagingClass():
         # self.T_tempYaxisuKErr = np.zeros(self.ROIn)
         self.linfitTY_xaxis = np.zeros((self.ROIn, 200))
         self.linfitTY_yaxis = np.zeros((self.ROIn, 200))
-        for ROIi in range(self.ROIn) :
+        linfitsTY = self.fit_profiles(self.T_TOFmsaxis**2, self.T_cloudRadiusumYaxis[:self.ROIn]**2, fittool.linear, NumberOfSteps= 200)
+        for ROIi, linfitTY in enumerate(linfitsTY) :
             #  temperature error estimate not working because fit too dependent on cloud radius error dependence with TOF or if one of the gaussian fit fails
             # if self.T_averages == 1 : 
-            linfitTY = fittool.FitUtility(self.T_TOFmsaxis**2, self.T_cloudRadiusumYaxis[ROIi]**2,
-                                           fittool.linear, NumberOfSteps= 200)
             # self.T_tempYaxisuKErr[ROIi] = 0.
             # else :
             #     linfitTY = fittool.FitUtility(self.T_TOFmsaxis**2, self.T_cloudRadiusumYaxis[ROIi]**2,
@@ -1206,8 +1813,19 @@ class ImagingClass():
             self.T_tempYaxisuK[ROIi] = linfitTY.p[0] * self.atomicMassAU*self.atomicMassUnitinSI / self.kB
             self.linfitTY_xaxis[ROIi] = linfitTY.x
             self.linfitTY_yaxis[ROIi] = linfitTY.y
+        
+        
+    def show_T_measurement_results(self, ui):
+        """Show results of temperature measurement on GUI ('TmeasurementDone' event callback, see connect_ui)
+        
+        Args:
+            ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
+        """
+        ui.lcdNumber_T_TempXaxisuK.display(self.T_tempXaxisuK[self.ROIblackTabIndex])
+        # ui.lcdNumber_T_TempXaxisuKErr.display(self.T_tempXaxisuKErr[self.ROIblackTabIndex])
         ui.lcdNumber_T_TempYaxisuK.display(self.T_tempYaxisuK[self.ROIblackTabIndex])
         # ui.lcdNumber_T_TempYaxisuKErr.display(self.T_tempYaxisuKErr[self.ROIblackTabIndex])
+        self.plot_T_measurement()
         
         
     def plot_T_measurement(self):
@@ -1577,12 +2195,8 @@ class ImagingClass():
         
         
 
-    def fit_LT_measurement(self,ui):
-        """Fit exponential atom number decay for lifetime measurement
-        
-        Args:
-            ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
-        """
+    def fit_LT_measurement(self):
+        """Fit exponential atom number decay for lifetime measurement"""
         # time axis        
         self.LT_Tmsaxis = np.arange(self.LT_Tscans)*self.LT_Tstepms + self.LT_Tstartms
         # define arrays
@@ -1595,29 +2209,36 @@ class ImagingClass():
         self.LT_atomNumberTStartFittedErr = np.zeros(self.ROIn)
         self.LT_atomNumberOffsetFittedErr = np.zeros(self.ROIn)
         # fit exponential decay  
-        for ROIi in range(self.ROIn) :
-            if self.LT_averages == 1 : 
-                expfitLT = fittool.FitUtility(self.LT_Tmsaxis, self.atomNumberAvList[ROIi],
-                                               fittool.expdecay, NumberOfSteps= 200)
-            else :
-                expfitLT = fittool.FitUtility(self.LT_Tmsaxis, self.atomNumberAvList[ROIi],
-                                               fittool.expdecay, yerr = self.atomNumberAvErrList[ROIi],
-                                               NumberOfSteps= 200)
-                if not(expfitLT.psigma is None) : 
-                    self.LT_LifetimemsErr[ROIi] = expfitLT.psigma[1]
-                    self.LT_atomNumberTStartFittedErr[ROIi] = expfitLT.psigma[0]
-                    self.LT_atomNumberOffsetFittedErr[ROIi] = expfitLT.psigma[2]
+        if self.LT_averages == 1 : 
+            expfitsLT = self.fit_profiles(self.LT_Tmsaxis, self.atomNumberAvList[:self.ROIn], fittool.expdecay, NumberOfSteps= 200)
+        else :
+            expfitsLT = self.fit_profiles(self.LT_Tmsaxis, self.atomNumberAvList[:self.ROIn], fittool.expdecay, 
+                                          yerr = self.atomNumberAvErrList[:self.ROIn], NumberOfSteps= 200)
+        for ROIi, expfitLT in enumerate(expfitsLT) :
+            if self.LT_averages != 1 and not(expfitLT.psigma is None) : 
+                self.LT_LifetimemsErr[ROIi] = expfitLT.psigma[1]
+                self.LT_atomNumberTStartFittedErr[ROIi] = expfitLT.psigma[0]
+                self.LT_atomNumberOffsetFittedErr[ROIi] = expfitLT.psigma[2]
             self.LT_Lifetimems[ROIi] = expfitLT.p[1]
             self.LT_atomNumberTStartFitted[ROIi] = expfitLT.p[0]
             self.LT_atomNumberOffsetFitted[ROIi] = expfitLT.p[2]
             self.expfitLT_xaxis[ROIi] = expfitLT.x
             self.expfitLT_yaxis[ROIi] = expfitLT.y
+        
+        
+    def show_LT_measurement_results(self, ui):
+        """Show results of lifetime measurement on GUI ('LTmeasurementDone' event callback, see connect_ui)
+        
+        Args:
+            ui (UI.Ui_MainWindow) : GUI object to collect and pass variables and graphs
+        """
         ui.lcdNumber_LT_Lifetimems.display(self.LT_Lifetimems[self.ROIblackTabIndex])
         ui.lcdNumber_LT_LifetimemsErr.display(self.LT_LifetimemsErr[self.ROIblackTabIndex])
         ui.lcdNumber_LT_atomNumberTStartFitted.display(self.LT_atomNumberTStartFitted[self.ROIblackTabIndex])
         ui.lcdNumber_LT_atomNumberTStartFittedErr.display(self.LT_atomNumberTStartFittedErr[self.ROIblackTabIndex])
         ui.lcdNumber_LT_atomNumberOffsetFitted.display(self.LT_atomNumberOffsetFitted[self.ROIblackTabIndex])
         ui.lcdNumber_LT_atomNumberOffsetFittedErr.display(self.LT_atomNumberOffsetFittedErr[self.ROIblackTabIndex])
+        self.plot_LT_measurement()
         
         
     def plot_LT_measurement(self):
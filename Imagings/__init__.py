@@ -7,4 +7,7 @@ Define Imaging class and functions for aquisition and analysis
 '''
 
 from . import fittool
+from . import densitytool
+from . import pipelinetool
+from . import fitpooltool
 from .ImagingClassDef import ImagingClass 
\ No newline at end of file
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Lookup tables and preallocated buffers for fast calculation of atomic density from camera images
+"""
+
+import numpy as np
+
+
+class AbsorptionDensityLUT():
+    """Compute optical density and atomic density of absorption imaging by indexing precomputed tables.
+
+    As images are integers, OD and atomic density are functions of the pixel values pair (imAt, imRef) only.
+    For 8 bits images (uint8), full 2D tables indexed by (imAt << 8) | imRef are built once by set_parameters
+    (only when parameters change).
+    Images with more bits are not handled : float32 direct calculation of AnalysisBuffers.absorption
+    is faster than indexing 1D tables of log per pixel.
+    Tables and results are float32 (analysis dtype, see AnalysisBuffers).
+    """
+
+    def __init__(self):
+        """Initialize empty tables, built by set_parameters"""
+        self.parameters = None # (maxLevel, crossSectionum2, coeffAbsStrongSatcalc, thresholdAbsImg) used to build tables
+        self.ODe2DLUT = np.zeros(0, dtype=np.float32) # ODe indexed by (imAt << 8) | imRef
+        self.density2DLUT = np.zeros(0, dtype=np.float32) # atomic density in atoms/µm² indexed by (imAt << 8) | imRef
+        self._index = np.zeros(0, dtype=np.intp) # PROTECTED flat table index array, at least of image size
+
+
+    def set_parameters(self, maxLevel, crossSectionum2, coeffAbsStrongSatcalc, thresholdAbsImg):
+        """Build the tables if parameters changed
+
+        Args:
+            maxLevel (int) : maximum pixel value of images (2**bitDepth - 1)
+
+            crossSectionum2 (float) : effective cross section in µm²
+
+            coeffAbsStrongSatcalc (float) : coefficient of the strong saturation term (atoms/µm² per count)
+
+            thresholdAbsImg (float) : minimum value of reference pixel to compute absorption, density is 0 below
+
+        Return:
+            If tables can be used for these images (bool) : False if maxLevel larger than 8 bits
+        """
+        maxLevel = int(maxLevel)
+        if maxLevel > 255 :
+            self.parameters = None
+            return False
+        parameters = (maxLevel, float(crossSectionum2), float(coeffAbsStrongSatcalc), float(thresholdAbsImg))
+        if parameters == self.parameters :
+            return True
+        self.parameters = parameters
+        # first axis imAt, second axis imRef, same formula as direct calculation (in float64) for all uint8 values
+        levels = np.arange(256)
+        logLUT = np.log(np.where(levels==0, 1, levels).astype(float))
+        invalid = levels < parameters[3]
+        ODe2DLUT = - logLUT[:,np.newaxis] + logLUT[np.newaxis,:]
+        ODe2DLUT[:, invalid] = 0.
+        density2DLUT = ODe2DLUT / parameters[1] \
+                        + (levels[np.newaxis,:].astype(float) - levels[:,np.newaxis].astype(float)) * parameters[2]
+        density2DLUT[:, invalid] = 0.
+        self.ODe2DLUT = ODe2DLUT.ravel().astype(np.float32)
+        self.density2DLUT = density2DLUT.ravel().astype(np.float32)
+        return True
+
+
+    def compute(self, imAt, imRef, ODe=None, density=None):
+        """Compute OD and atomic density from images with atoms and reference
+
+        Args:
+            imAt (numpy 2D array uint8) : image with atoms
+
+            imRef (numpy 2D array uint8) : reference image without atoms
+
+        Keyword Args:
+            ODe=None (None or numpy 2D array float32) : output array for OD, allocated if None
+
+            density=None (None or numpy 2D array float32) : output array for atomic density, allocated if None
+
+        Return:
+            ODe, atomicDensityIntZperum2 (numpy 2D arrays float32) : OD and atomic density integrated along camera axis in atoms/µm²
+        """
+        if ODe is None :
+            ODe = np.empty(imAt.shape, dtype=np.float32)
+        if density is None :
+            density = np.empty(imAt.shape, dtype=np.float32)
+        if self._index.size < imAt.size :
+            self._index = np.empty(imAt.size, dtype=np.intp)
+        # index of native type : no conversion copy in take, view of flat array for images of any size (ROIs)
+        index = self._index[:imAt.size].reshape(imAt.shape)
+        np.left_shift(imAt, 8, out=index, dtype=np.intp)
+        np.bitwise_or(index, imRef, out=index)
+        self.ODe2DLUT.take(index, out=ODe, mode='clip')
+        self.density2DLUT.take(index, out=density, mode='clip')
+        return ODe, density
+
+
+class AnalysisBuffers():
+    """Work arrays of atom_imaging, allocated once for an image size and reused for all shots.
+
+    Analysis arrays are float32 (half the memory bandwidth of float64), images arrays have the camera dtype.
+    All calculations are done in place with out arguments : no full-frame allocation per shot.
+    Calculations can be restricted to a region of the image (tuple of slices, see ImagingClass.analysis_regions),
+    buffers are unchanged outside.
+    """
+
+    def __init__(self, withAverages=True):
+        """Initialize empty buffers, allocated by resize
+
+        Keyword Args:
+            withAverages=True (bool) : allocate averages buffers, False for buffers of single shot results only
+        """
+        self.withAverages = withAverages # if averages buffers are allocated
+        self.imageSize = None # (hpx, wpx) of allocated buffers
+        self.imageDtype = None # dtype of images buffers
+        self.dtype = np.float32 # dtype of analysis buffers
+        self.imAt = np.zeros((1,1), dtype=np.uint16) # image with atoms, background removed
+        self.imRef = np.zeros((1,1), dtype=np.uint16) # reference image, background removed
+        self.ODe = np.zeros((1,1), dtype=self.dtype) # OD defined by ln(imAt/Iref)
+        self.ODeAv = np.zeros((1,1), dtype=self.dtype) # OD average
+        self.Fluo = np.zeros((1,1), dtype=self.dtype) # Fluo defined by I-Iref
+        self.FluoAv = np.zeros((1,1), dtype=self.dtype) # Fluo average
+        self.density = np.zeros((1,1), dtype=self.dtype) # atomic density integrated along camera axis in atoms/µm²
+        self.densityAv = np.zeros((1,1), dtype=self.dtype) # atomic density average
+        self._work = np.zeros((1,1), dtype=self.dtype) # PROTECTED work array
+        self._mask = np.zeros((1,1), dtype=bool) # PROTECTED mask of pixels below absorption threshold
+
+
+    def resize(self, imageSize, imageDtype):
+        """Allocate buffers if image size or dtype changed
+
+        Args:
+            imageSize (tuple) : (hpx, wpx) size of images
+
+            imageDtype (numpy dtype) : dtype of camera images
+
+        Return:
+            If buffers were allocated (bool)
+        """
+        imageSize = tuple(imageSize)
+        if imageSize == self.imageSize and np.dtype(imageDtype) == self.imageDtype :
+            return False
+        self.imageSize = imageSize
+        self.imageDtype = np.dtype(imageDtype)
+        self.imAt = np.zeros(imageSize, dtype=self.imageDtype)
+        self.imRef = np.zeros(imageSize, dtype=self.imageDtype)
+        for name in ['ODe', 'Fluo', 'density', '_work'] + (['ODeAv', 'FluoAv', 'densityAv'] if self.withAverages else []) :
+            setattr(self, name, np.zeros(imageSize, dtype=self.dtype))
+        self._mask = np.zeros(imageSize, dtype=bool)
+        return True
+
+
+    def zero_averages(self):
+        """Set averages to 0 before a new measurement"""
+        self.ODeAv.fill(0.)
+        self.FluoAv.fill(0.)
+        self.densityAv.fill(0.)
+
+
+    def zero_shot(self):
+        """Set single shot results to 0, used before a measurement restricted to regions"""
+        self.ODe.fill(0.)
+        self.Fluo.fill(0.)
+        self.density.fill(0.)
+
+
+    def accumulate(self, absorption, region=None, source=None):
+        """Add single shot results to averages
+
+        Args:
+            absorption (bool) : add ODe to ODeAv if True, Fluo to FluoAv otherwise, and density to densityAv
+
+        Keyword Args:
+            region=None (None or tuple of slices) : region of image to add, full image if None
+
+            source=None (None or AnalysisBuffers) : buffers holding the single shot results, self if None
+        """
+        if region is None :
+            region = Ellipsis
+        if source is None :
+            source = self
+        if absorption :
+            pairs = [(source.ODe, self.ODeAv), (source.density, self.densityAv)]
+        else :
+            pairs = [(source.Fluo, self.FluoAv), (source.density, self.densityAv)]
+        for shot, average in pairs :
+            np.add(average[region], shot[region], out=average[region])
+
+
+    def subtract_background(self, image, imBkgd, out, region=None):
+        """Subtract background image without letting negative values (saturating subtraction)
+
+        Args:
+            image (numpy 2D array) : image with light
+
+            imBkgd (numpy 2D array) : background image
+
+            out (numpy 2D array) : output array of image dtype (imAt or imRef buffer)
+
+        Keyword Args:
+            region=None (None or tuple of slices) : region of image to compute, full image if None
+
+        Return:
+            out (numpy 2D array) : image - imBkgd, 0 where image < imBkgd
+        """
+        if region is None :
+            region = Ellipsis
+        np.maximum(image[region], imBkgd[region], out=out[region])
+        np.subtract(out[region], imBkgd[region], out=out[region])
+        return out
+
+
+    def absorption(self, imAt, imRef, crossSectionum2, coeffAbsStrongSatcalc, thresholdAbsImg, region=None):
+        """Compute OD and atomic density of absorption imaging in ODe and density buffers
+
+        Args:
+            imAt (numpy 2D array) : image with atoms
+
+            imRef (numpy 2D array) : reference image without atoms
+
+            crossSectionum2 (float) : effective cross section in µm²
+
+            coeffAbsStrongSatcalc (float) : coefficient of the strong saturation term (atoms/µm² per count)
+
+            thresholdAbsImg (float) : minimum value of reference pixel to compute absorption, density is 0 below
+
+        Keyword Args:
+            region=None (None or tuple of slices) : region of image to compute, full image if None
+
+        Return:
+            ODe, atomicDensityIntZperum2 (numpy 2D arrays float32) : buffers ODe and density
+        """
+        if region is None :
+            region = Ellipsis
+        imAt, imRef, mask = imAt[region], imRef[region], self._mask[region]
+        ODe, density, work = self.ODe[region], self.density[region], self._work[region]
+        # log of pixel values, 0 taken as 1
+        self._log_image(imRef, ODe)
+        ODe -= self._log_image(imAt, work)
+        np.less(imRef, thresholdAbsImg, out=mask)
+        np.copyto(ODe, 0., where=mask)
+        # atomic density with strong saturation part
+        np.divide(ODe, crossSectionum2, out=density)
+        np.subtract(imRef, imAt, out=work, dtype=self.dtype)
+        work *= coeffAbsStrongSatcalc
+        density += work
+        np.copyto(density, 0., where=mask)
+        return self.ODe, self.density
+
+
+    def fluorescence(self, imAt, coeffFluoCalc, region=None):
+        """Compute fluorescence and atomic density of fluorescence imaging in Fluo and density buffers
+
+        Args:
+            imAt (numpy 2D array) : image with atoms
+
+            coeffFluoCalc (float) : atomic density (atoms/µm²) per count
+
+        Keyword Args:
+            region=None (None or tuple of slices) : region of image to compute, full image if None
+
+        Return:
+            Fluo, atomicDensityIntZperum2 (numpy 2D arrays float32) : buffers Fluo and density
+        """
+        if region is None :
+            region = Ellipsis
+        np.copyto(self.Fluo[region], imAt[region])
+        np.multiply(self.Fluo[region], coeffFluoCalc, out=self.density[region])
+        return self.Fluo, self.density
+
+
+    def _log_image(self, image, out):
+        """PROTECTED : log of image in out array, pixels at 0 taken as 1"""
+        np.copyto(out, image)
+        if np.dtype(image.dtype).kind == 'u' :
+            np.maximum(out, 1., out=out)
+        else :
+            np.copyto(out, 1., where=(image==0))
+        return np.log(out, out=out)
+
+
+class SummedAreaTable():
+    """Integral image of 2D data in a box, giving sums and means over rectangles inside the box in constant time per value.
+
+    table[y, x] is the sum of data[Yminpx:Yminpx+y, Xminpx:Xminpx+x] in float64, first row and column are 0.
+    Rectangles are given in pixels of the full data array, [Y0:Y1, X0:X1] as numpy slices, and limited to the box.
+    """
+
+    def __init__(self):
+        """Initialize empty table, computed by build"""
+        self.Yminpx = 0 # first row of box in data
+        self.Xminpx = 0 # first column of box in data
+        self.table = np.zeros((1,1)) # integral image of box, view of _buffer
+        self._buffer = np.zeros(0) # PROTECTED flat array, reallocated only if box is larger
+
+
+    def build(self, data, box=None):
+        """Compute integral image of data in box
+
+        Args:
+            data (numpy 2D array) : data, for example atomic density
+
+        Keyword Args:
+            box=None (None or list of 4 int) : [Yminpx, Ymaxpx, Xminpx, Xmaxpx] box of data used by queries, full data if None
+        """
+        if box is None :
+            box = [0, data.shape[0], 0, data.shape[1]]
+        self.Yminpx, self.Xminpx = int(box[0]), int(box[2])
+        boxData = data[box[0]:box[1], box[2]:box[3]]
+        size = (boxData.shape[0]+1) * (boxData.shape[1]+1)
+        if self._buffer.size < size :
+            self._buffer = np.empty(size)
+        self.table = self._buffer[:size].reshape(boxData.shape[0]+1, boxData.shape[1]+1)
+        self.table[0,:] = 0.
+        self.table[:,0] = 0.
+        np.cumsum(boxData, axis=0, dtype=np.float64, out=self.table[1:,1:])
+        np.cumsum(self.table[1:,1:], axis=1, out=self.table[1:,1:])
+
+
+    def sum(self, Y0, Y1, X0, X1):
+        """Sum of data[Y0:Y1, X0:X1]
+
+        Args:
+            Y0, Y1, X0, X1 (int) : rectangle in pixels of data
+
+        Return:
+            sum (float)
+        """
+        Y0, Y1, X0, X1 = self._local(Y0, Y1, X0, X1)
+        t = self.table
+        return t[Y1,X1] - t[Y0,X1] - t[Y1,X0] + t[Y0,X0]
+
+
+    def mean(self, Y0, Y1, X0, X1, axis):
+        """Mean of data[Y0:Y1, X0:X1] along one axis, as numpy mean(axis=axis)
+
+        Args:
+            Y0, Y1, X0, X1 (int) : rectangle in pixels of data
+
+            axis (int) : 0 for mean of rows (function of X), 1 for mean of columns (function of Y)
+
+        Return:
+            mean (numpy 1D array float)
+        """
+        Y0, Y1, X0, X1 = self._local(Y0, Y1, X0, X1)
+        t = self.table
+        if axis == 0 :
+            sums = (t[Y1,X0+1:X1+1] - t[Y1,X0:X1]) - (t[Y0,X0+1:X1+1] - t[Y0,X0:X1])
+            return sums / (Y1-Y0)
+        sums = (t[Y0+1:Y1+1,X1] - t[Y0:Y1,X1]) - (t[Y0+1:Y1+1,X0] - t[Y0:Y1,X0])
+        return sums / (X1-X0)
+
+
+    def _local(self, Y0, Y1, X0, X1):
+        """PROTECTED : rectangle in table indices, limited to the box as numpy slices"""
+        h, w = self.table.shape[0]-1, self.table.shape[1]-1
+        Y0 = min(max(int(Y0)-self.Yminpx, 0), h)
+        Y1 = min(max(int(Y1)-self.Yminpx, Y0), h)
+        X0 = min(max(int(X0)-self.Xminpx, 0), w)
+        X1 = min(max(int(X1)-self.Xminpx, X0), w)
+        return Y0, Y1, X0, X1
@@ -0,0 +1,499 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fits of atom cloud dimensions on 1D projections, done serially or concurrently in a pool of workers,
+and estimation of cloud dimensions from the moments of the projections
+"""
+
+import math
+import numpy as np
+import multiprocessing
+import concurrent.futures
+
+from . import fittool
+
+
+def window_mean(data, Yminpx, Ymaxpx, Xminpx, Xmaxpx, axis, dataOffsetpx=(0, 0)):
+    """Mean of data in a window along one axis
+
+    Args:
+        data (2D numpy array or densitytool.SummedAreaTable) : atomic density or its integral image
+
+        Yminpx, Ymaxpx, Xminpx, Xmaxpx (int) : window limits in image pixels
+
+        axis (int) : axis of mean (0 : mean along Y, 1 : mean along X)
+
+    Keyword Args:
+        dataOffsetpx=(0, 0) (2-tuple int) : image pixel [Y, X] of data[0, 0], if data is a part of image
+
+    Return:
+        mean (1D numpy array)
+    """
+    if not(isinstance(data, np.ndarray)) :
+        return data.mean(Yminpx, Ymaxpx, Xminpx, Xmaxpx, axis)
+    return data[Yminpx-dataOffsetpx[0]:Ymaxpx-dataOffsetpx[0], Xminpx-dataOffsetpx[1]:Xmaxpx-dataOffsetpx[1]].mean(axis=axis)
+
+
+def cloud_dimensions_um(cloudRadiipx, cloudPositionspx, pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0)):
+    """Convert cloud radii and positions from image pixels to um
+
+    Args:
+        cloudRadiipx, cloudPositionspx (2-list float) : fit results in pixels where the axes are [Y, X]
+
+    Keyword Args:
+        pixelCalumperpx=(1., 1.) (2-tuple float) : pixel calibration [Y, X] in um per pixel
+
+        imageOriginpx=(0, 0) (2-tuple float) : image origin [X, Y] in pixels (as ImagingClass.imageOriginpx)
+
+    Return:
+        cloudRadiium, cloudPositionsum : 2-lists where the axes are [Y, X], positions relative to image origin
+    """
+    sigmaYum = cloudRadiipx[0]*pixelCalumperpx[0]
+    sigmaXum = cloudRadiipx[1]*pixelCalumperpx[1]
+    positionYum = - (cloudPositionspx[0]-imageOriginpx[1])*pixelCalumperpx[0] # minus sign because on plot the Y axis is inverted
+    positionXum = (cloudPositionspx[1]-imageOriginpx[0])*pixelCalumperpx[1]
+    return [sigmaYum , sigmaXum], [positionYum , positionXum]
+
+
+def converged(fit):
+    """If fit converged
+
+    Args:
+        fit (fittool.FitUtility or fittool.ProfileFit) : fit result
+
+    Return:
+        converged (bool)
+    """
+    return 0 < fit.ierror < 5
+
+
+def next_warm_start(fit):
+    """Warm start of the next fit of the same profile : parameters and residual of fit if converged
+
+    Args:
+        fit (fittool.FitUtility or fittool.ProfileFit) : fit result
+
+    Return:
+        warmStart ((1D numpy array, float) or None) : None if fit did not converge
+    """
+    return (np.array(fit.pfit, dtype=float), fit.residual) if converged(fit) else None
+
+
+def accept_warm_start(fit, warmStart, residualRatio):
+    """If a fit started from warmStart is kept : converged and residual not larger than residualRatio x residual of warmStart
+
+    Args:
+        fit (fittool.FitUtility or fittool.ProfileFit) : fit result started from warmStart
+
+        warmStart ((1D numpy array, float)) : parameters and residual of previous fit
+
+        residualRatio (float) : maximum ratio of residuals
+
+    Return:
+        accepted (bool)
+    """
+    return converged(fit) and fit.residual <= residualRatio*warmStart[1]
+
+
+def best_fit(warmFit, fit):
+    """Fit from automatic initial parameters, or fit from warm start if it converged with a lower residual
+
+    Args:
+        warmFit, fit (fittool.FitUtility or fittool.ProfileFit) : fit results started from warm start and from automatic initial parameters
+
+    Return:
+        fit (fittool.FitUtility or fittool.ProfileFit)
+    """
+    if converged(warmFit) and (not(converged(fit)) or warmFit.residual < fit.residual) :
+        return warmFit
+    return fit
+
+
+def fit_gauss(fitaxispx, fitdata, warmStart=None, residualRatio=2.):
+    """Gaussian fit of one profile, started from the parameters of a previous fit if given.
+        Fit is done again from automatic initial parameters (gauss.getinits) if warm started fit is not accepted (see accept_warm_start).
+
+    Args:
+        fitaxispx, fitdata (1D numpy array) : profile to fit
+
+    Keyword Args:
+        warmStart=None ((1D numpy array, float) or None) : parameters and residual of previous fit (see next_warm_start)
+
+        residualRatio=2. (float) : maximum ratio of residual of warm started fit and residual of previous fit
+
+    Return:
+        fit, warmStart : fit result (fittool.FitUtility) and warm start of next fit
+    """
+    if warmStart is None :
+        fit = fittool.FitUtility(fitaxispx, fitdata, fittool.gauss)
+        return fit, next_warm_start(fit)
+    warmFit = fittool.FitUtility(fitaxispx, fitdata, fittool.gauss, p_in=list(warmStart[0]))
+    if accept_warm_start(warmFit, warmStart, residualRatio) :
+        return warmFit, next_warm_start(warmFit)
+    fit = best_fit(warmFit, fittool.FitUtility(fitaxispx, fitdata, fittool.gauss))
+    return fit, next_warm_start(fit)
+
+
+def fit_cloud_1D(data, ROIlimitspx, fitYaxispx, fitXaxispx, pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0), 
+                 warmStarts=None, residualRatio=2., dataOffsetpx=(0, 0)):
+    """Estimate cloud radii and positions in one ROI with Gaussian fits of data integrated along one axis.
+        Fits are done a second time with adjusted position and integration width
+        depending on other axis results (see ImagingClass.fit_Atomic_Cloud_1D).
+
+        Module function with arrays arguments and results, so that it can be run in a worker process.
+
+    Args:
+        data (2D numpy array or densitytool.SummedAreaTable) : atomic density (whole image or part around ROI) or its integral image
+
+        ROIlimitspx (2D numpy array int) : ROI limits in image pixels [[Ymin, Ymax], [Xmin, Xmax]]
+
+        fitYaxispx, fitXaxispx (1D numpy array) : image pixels of ROI along Y and X axes
+
+    Keyword Args:
+        pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0) : pixel calibration and image origin (see cloud_dimensions_um)
+
+        warmStarts=None (list or None) : warm starts of the 4 fits (first Y, first X, second Y, second X) 
+            from previous fits of ROI (see fit_gauss), automatic initial parameters if None
+
+        residualRatio=2. (float) : maximum ratio of residuals of warm started fits and of previous fits
+
+        dataOffsetpx=(0, 0) (2-tuple int) : image pixel [Y, X] of data[0, 0], if data is a part of image
+
+    Return:
+        cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum, fitCurves, warmStarts :
+            2-lists with fit results where the axes are [Y, X],
+            6-tuple of 1D arrays (Y fit x, Y fit y, Y data, X fit x, X fit y, X data) to plot the fits
+            and list of warm starts of the 4 fits for the next fits of ROI
+    """
+    if warmStarts is None :
+        warmStarts = [None]*4
+    # fit mean of atomic intensity along X axis : Y axis fit
+    gaussfitY, warmStartY = fit_gauss(fitYaxispx,
+                                      window_mean(data, ROIlimitspx[0,0], ROIlimitspx[0,1], ROIlimitspx[1,0], ROIlimitspx[1,1], 1,
+                                                  dataOffsetpx)*1000.,
+                                      warmStarts[0], residualRatio)
+    sigmaYpx = int(abs(gaussfitY.p[2]))
+    positionYpx = int(gaussfitY.p[1])
+
+    # fit mean of atomic intensity along Y axis : X axis fit
+    gaussfitX, warmStartX = fit_gauss(fitXaxispx,
+                                      window_mean(data, ROIlimitspx[0,0], ROIlimitspx[0,1], ROIlimitspx[1,0], ROIlimitspx[1,1], 0,
+                                                  dataOffsetpx)*1000.,
+                                      warmStarts[1], residualRatio)
+    sigmaXpx = int(abs(gaussfitX.p[2]))
+    positionXpx = int(gaussfitX.p[1])
+
+    #do another fit with average only over the rows or collumns within the sigma of the other axis, unless fit failed
+    # fit mean of atomic intensity along X axis : Y axis fit
+    Xminpx, Xmaxpx, positionXpx, sigmaXpx = second_fit_window(positionXpx, sigmaXpx, ROIlimitspx[1])
+    Yfitdata = window_mean(data, ROIlimitspx[0,0], ROIlimitspx[0,1], Xminpx, Xmaxpx, 1, dataOffsetpx)*1000.
+    gaussfitYpx, warmStartYpx = fit_gauss(fitYaxispx, Yfitdata, warmStarts[2], residualRatio)
+
+    # fit mean of atomic intensity along Y axis : X axis fit
+    Yminpx, Ymaxpx, positionYpx, sigmaYpx = second_fit_window(gaussfitYpx.p[1], abs(gaussfitYpx.p[2]), ROIlimitspx[0])
+    Xfitdata = window_mean(data, Yminpx, Ymaxpx, ROIlimitspx[1,0], ROIlimitspx[1,1], 0, dataOffsetpx)*1000.
+    gaussfitXpx, warmStartXpx = fit_gauss(fitXaxispx, Xfitdata, warmStarts[3], residualRatio)
+
+    fitCurves = (gaussfitYpx.x, gaussfitYpx.y, Yfitdata, gaussfitXpx.x, gaussfitXpx.y, Xfitdata)
+    return cloud_dimensions_1D(gaussfitYpx, gaussfitXpx, positionYpx, sigmaYpx, pixelCalumperpx, imageOriginpx) + (
+                fitCurves, [warmStartY, warmStartX, warmStartYpx, warmStartXpx])
+
+
+def cloud_dimensions_1D(gaussfitYpx, gaussfitXpx, positionYpx, sigmaYpx, pixelCalumperpx, imageOriginpx):
+    """PROTECTED results of second fits : dimensions in um from fits, 
+        in pixels with Y position and radius of second fit window (ROI center and size if fit out of ROI)"""
+    cloudRadiium, cloudPositionsum = cloud_dimensions_um([abs(gaussfitYpx.p[2]), abs(gaussfitXpx.p[2])], 
+                                                         [gaussfitYpx.p[1], gaussfitXpx.p[1]], pixelCalumperpx, imageOriginpx)
+    return [sigmaYpx, abs(gaussfitXpx.p[2])], [positionYpx, gaussfitXpx.p[1]], cloudRadiium, cloudPositionsum
+
+
+def second_fit_window(positionpx, sigmapx, limitspx):
+    """Integration window of second fits : +/- sigma around position along one axis, inside ROI (whole ROI if position outside)
+
+    Args:
+        positionpx, sigmapx (float) : cloud position and radius along axis, in pixels
+
+        limitspx (1D numpy array int) : ROI limits [min, max] along axis, in pixels
+
+    Return:
+        minpx, maxpx, positionpx, sigmapx : window limits (int), position and radius used for window
+    """
+    if positionpx < limitspx[0] or positionpx > limitspx[1] :
+        positionpx = (limitspx[0] + limitspx[1] )/2
+        sigmapx = limitspx[1] - limitspx[0]
+    minpx = int(min(max(positionpx - sigmapx, limitspx[0]), limitspx[1]))
+    maxpx = int(max(min(positionpx + sigmapx+1, limitspx[1]), limitspx[0]))
+    return minpx, maxpx, positionpx, sigmapx
+
+
+class MomentsEstimate():
+    """Cloud position and RMS width along one axis from the first and second moments of a profile, 
+        with the attributes of FitUtility results used for cloud dimensions (p, x, y, ierror), p as gauss parameters.
+
+    Background is the median of the 10% points at each edge of the profile. 
+    First window is the extent of the points above half maximum (as a full width at half maximum).
+    Moments are computed in a window of +/- windowSigmas RMS width around the centre of previous moments, 
+    and the width is corrected for the truncation of a Gaussian profile by the window.
+    """
+
+    def __init__(self, x, y, iterations=3, windowSigmas=3.):
+        """Compute moments of profile
+        
+        Args:
+            x (1D numpy array) : x vector of profile, increasing
+            
+            y (1D numpy array) : y vector of profile
+        
+        Keyword Args:
+            iterations=3 (int) : number of windowed estimations of moments
+            
+            windowSigmas=3. (float) : half width of window in RMS widths
+        """
+        self.x = x
+        self.p = [0.]*4
+        self.ierror = 5
+        above = []
+        if len(y) > 1 :
+            edge = max(int(len(y)/10.), 1)
+            background = np.median(np.concatenate((y[:edge], y[-edge:])))
+            signal = y - background
+            step = abs(x[-1]-x[0])/(len(x)-1)
+            above = np.flatnonzero(signal > signal.max()/2.)
+        if len(above) > 0 and signal.max() > 0 :
+            # Gaussian profile : sigma from full width at half maximum
+            position = x[above].mean()
+            sigma = (x[above[-1]] - x[above[0]] + step)/(2*math.sqrt(2*math.log(2)))
+            # Gaussian profile : variance and area in window of +/- windowSigmas sigma relative to sigma**2 and to total area
+            windowArea = math.erf(windowSigmas/math.sqrt(2))
+            windowVariance = 1. - 2*windowSigmas*math.exp(-windowSigmas**2/2)/math.sqrt(2*math.pi)/windowArea
+            for iteration in range(iterations) :
+                imin, imax = np.searchsorted(x, [position - windowSigmas*sigma, position + windowSigmas*sigma])
+                window = signal[imin:imax]
+                total = window.sum()
+                if not(total > 0) :
+                    break
+                windowPosition = (window*x[imin:imax]).sum()/total
+                variance = (window*(x[imin:imax]-windowPosition)**2).sum()/total/windowVariance
+                if not(variance > 0) :
+                    break
+                position, sigma = windowPosition, math.sqrt(variance)
+                self.p = [total*step/(sigma*math.sqrt(2*math.pi))/windowArea, position, sigma, background]
+                self.ierror = 1
+        self.y = fittool.gauss.execute(self.p, x) if self.ierror == 1 else np.zeros(len(x))
+
+
+def moments_cloud_1D(data, ROIlimitspx, fitYaxispx, fitXaxispx, pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0), dataOffsetpx=(0, 0)):
+    """Estimate cloud radii and positions in one ROI as fit_cloud_1D, with the moments of the projections (MomentsEstimate)
+        instead of Gaussian fits. Second estimations use the same integration windows as second fits.
+        If an estimation fails (MomentsEstimate ierror), the cloud is fitted by fit_cloud_1D instead.
+
+    Args:
+        data (2D numpy array or densitytool.SummedAreaTable) : atomic density (whole image or part around ROI) or its integral image
+
+        ROIlimitspx (2D numpy array int) : ROI limits in image pixels [[Ymin, Ymax], [Xmin, Xmax]]
+
+        fitYaxispx, fitXaxispx (1D numpy array) : image pixels of ROI along Y and X axes
+
+    Keyword Args:
+        pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0) : pixel calibration and image origin (see cloud_dimensions_um)
+
+        dataOffsetpx=(0, 0) (2-tuple int) : image pixel [Y, X] of data[0, 0], if data is a part of image
+
+    Return:
+        cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum, fitCurves : as fit_cloud_1D, 
+            fitCurves with Gaussian profiles of same moments.
+            Background of projections is taken at the ROI edges : ROI should be about 6 cloud radii (sigma) wide, 
+            radii are underestimated in narrower ROIs.
+    """
+    def fit_cloud() :
+        return fit_cloud_1D(data, ROIlimitspx, fitYaxispx, fitXaxispx, pixelCalumperpx, imageOriginpx, 
+                            dataOffsetpx=dataOffsetpx)[:5]
+
+    # moments of mean of atomic intensity along X axis (Y axis) and along Y axis (X axis)
+    momentsX = MomentsEstimate(fitXaxispx, 
+                               window_mean(data, ROIlimitspx[0,0], ROIlimitspx[0,1], ROIlimitspx[1,0], ROIlimitspx[1,1], 0, dataOffsetpx)*1000.)
+    if momentsX.ierror != 1 :
+        return fit_cloud()
+
+    # second estimations with average only over the rows or collumns within the sigma of the other axis
+    Xminpx, Xmaxpx, positionXpx, sigmaXpx = second_fit_window(int(momentsX.p[1]), int(abs(momentsX.p[2])), ROIlimitspx[1])
+    Yfitdata = window_mean(data, ROIlimitspx[0,0], ROIlimitspx[0,1], Xminpx, Xmaxpx, 1, dataOffsetpx)*1000.
+    momentsYpx = MomentsEstimate(fitYaxispx, Yfitdata)
+    if momentsYpx.ierror != 1 :
+        return fit_cloud()
+    Yminpx, Ymaxpx, positionYpx, sigmaYpx = second_fit_window(momentsYpx.p[1], abs(momentsYpx.p[2]), ROIlimitspx[0])
+    Xfitdata = window_mean(data, Yminpx, Ymaxpx, ROIlimitspx[1,0], ROIlimitspx[1,1], 0, dataOffsetpx)*1000.
+    momentsXpx = MomentsEstimate(fitXaxispx, Xfitdata)
+    if momentsXpx.ierror != 1 :
+        return fit_cloud()
+
+    fitCurves = (momentsYpx.x, momentsYpx.y, Yfitdata, momentsXpx.x, momentsXpx.y, Xfitdata)
+    return cloud_dimensions_1D(momentsYpx, momentsXpx, positionYpx, sigmaYpx, pixelCalumperpx, imageOriginpx) + (fitCurves,)
+
+
+def fit_clouds_1D_batch(data, ROIlimitsTabpx, Yaxispx, Xaxispx, pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0),
+                        warmStartsList=None, residualRatio=2.):
+    """Fit cloud dimensions of all ROIs as fit_cloud_1D, with the profiles of all ROIs fitted at once
+        by fittool.BatchFitUtility at each step (first fits along Y and X, second fit along Y, second fit along X)
+
+    Args:
+        data (2D numpy array or densitytool.SummedAreaTable) : atomic density of the whole image or its integral image
+
+        ROIlimitsTabpx (list of 2D numpy array int) : ROIs limits in image pixels [[Ymin, Ymax], [Xmin, Xmax]]
+
+        Yaxispx, Xaxispx (1D numpy array) : image pixels along Y and X axes
+
+    Keyword Args:
+        pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0) : pixel calibration and image origin (see cloud_dimensions_um)
+
+        warmStartsList=None (list or None) : warm starts of the 4 fits of each ROI (see fit_cloud_1D), automatic initial parameters if None
+
+        residualRatio=2. (float) : maximum ratio of residuals of warm started fits and of previous fits
+
+    Return:
+        list of results of fit_cloud_1D (list) : (cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum, fitCurves, warmStarts) in ROIs order
+    """
+    ROIn = len(ROIlimitsTabpx)
+    fitYaxispx = [Yaxispx[ROIlimitspx[0,0]:ROIlimitspx[0,1]] for ROIlimitspx in ROIlimitsTabpx]
+    fitXaxispx = [Xaxispx[ROIlimitspx[1,0]:ROIlimitspx[1,1]] for ROIlimitspx in ROIlimitsTabpx]
+    warmStartsList = [warmStarts if warmStarts is not None else [None]*4 
+                      for warmStarts in (warmStartsList if warmStartsList is not None else [None]*ROIn)]
+
+    # batched fits, warm started fits not accepted are done again from automatic initial parameters (see fit_gauss)
+    def batch_fit(axes, profiles, warmStarts) :
+        x, y, mask = fittool.stack_profiles(axes, profiles)
+        if all(warmStart is None for warmStart in warmStarts) :
+            fits = fittool.BatchFitUtility(x, y, fittool.gauss, mask=mask).profile_fits()
+            return fits, [next_warm_start(fit) for fit in fits]
+        p_in = np.array([np.full(len(fittool.gauss.p), np.nan) if warmStart is None else warmStart[0] for warmStart in warmStarts])
+        fits = fittool.BatchFitUtility(x, y, fittool.gauss, mask=mask, p_in=p_in).profile_fits()
+        refits = [k for k, warmStart in enumerate(warmStarts) 
+                  if warmStart is not None and not(accept_warm_start(fits[k], warmStart, residualRatio))]
+        if len(refits) > 0 :
+            for k, fit in zip(refits, fittool.BatchFitUtility(x[refits], y[refits], fittool.gauss, mask=mask[refits]).profile_fits()) :
+                fits[k] = best_fit(fits[k], fit)
+        return fits, [next_warm_start(fit) for fit in fits]
+
+    # first fits of mean of atomic intensity along X axis (Y axis fit) and along Y axis (X axis fit)
+    firstFits, firstWarmStarts = batch_fit(fitYaxispx + fitXaxispx,
+                                           [window_mean(data, L[0,0], L[0,1], L[1,0], L[1,1], 1)*1000. for L in ROIlimitsTabpx]
+                                           + [window_mean(data, L[0,0], L[0,1], L[1,0], L[1,1], 0)*1000. for L in ROIlimitsTabpx],
+                                           [w[0] for w in warmStartsList] + [w[1] for w in warmStartsList])
+    # second fits along Y axis, with average only over the collumns within the sigma of X axis first fit
+    Yfitdata = []
+    for ROIi, L in enumerate(ROIlimitsTabpx) :
+        Xminpx, Xmaxpx, positionXpx, sigmaXpx = second_fit_window(int(firstFits[ROIn+ROIi].p[1]), int(abs(firstFits[ROIn+ROIi].p[2])), L[1])
+        Yfitdata.append(window_mean(data, L[0,0], L[0,1], Xminpx, Xmaxpx, 1)*1000.)
+    gaussfitsYpx, warmStartsYpx = batch_fit(fitYaxispx, Yfitdata, [w[2] for w in warmStartsList])
+    # second fits along X axis, with average only over the rows within the sigma of Y axis second fit
+    Xfitdata = []
+    secondFitsY = []
+    for ROIi, L in enumerate(ROIlimitsTabpx) :
+        Yminpx, Ymaxpx, positionYpx, sigmaYpx = second_fit_window(gaussfitsYpx[ROIi].p[1], abs(gaussfitsYpx[ROIi].p[2]), L[0])
+        secondFitsY.append((positionYpx, sigmaYpx))
+        Xfitdata.append(window_mean(data, Yminpx, Ymaxpx, L[1,0], L[1,1], 0)*1000.)
+    gaussfitsXpx, warmStartsXpx = batch_fit(fitXaxispx, Xfitdata, [w[3] for w in warmStartsList])
+
+    results = []
+    for ROIi in range(ROIn) :
+        gaussfitYpx, gaussfitXpx = gaussfitsYpx[ROIi], gaussfitsXpx[ROIi]
+        n, m = len(fitYaxispx[ROIi]), len(fitXaxispx[ROIi])
+        fitCurves = (gaussfitYpx.x[:n], gaussfitYpx.y[:n], Yfitdata[ROIi], gaussfitXpx.x[:m], gaussfitXpx.y[:m], Xfitdata[ROIi])
+        warmStarts = [firstWarmStarts[ROIi], firstWarmStarts[ROIn+ROIi], warmStartsYpx[ROIi], warmStartsXpx[ROIi]]
+        results.append(cloud_dimensions_1D(gaussfitYpx, gaussfitXpx, secondFitsY[ROIi][0], secondFitsY[ROIi][1], 
+                                           pixelCalumperpx, imageOriginpx) + (fitCurves, warmStarts))
+    return results
+
+
+class FitPool():
+    """Pool of workers (threads or processes) fitting the cloud dimensions of several ROIs concurrently.
+
+    Each ROI is fitted by fit_cloud_1D on a copy of the atomic density around the ROI only,
+    so that the data sent to worker processes scale with the ROIs area.
+    Fits in threads are mostly serialized by the Python interpreter (fit functions are Python code),
+    processes are advised for several ROIs.
+    Worker processes are started (spawn) at first use and kept until shutdown.
+    """
+
+    def __init__(self, workers=0, executorType='process'):
+        """Set pool parameters (executor not started)
+
+        Keyword Args:
+            workers=0 (int) : number of workers, fits are done serially if less than 2
+
+            executorType='process' (str) : 'process' or 'thread'
+        """
+        self.workers = int(workers)
+        self.executorType = executorType
+        self.executor = None
+
+
+    def active(self):
+        """If fits are done concurrently
+
+        Return:
+            active (bool)
+        """
+        return self.workers > 1
+
+
+    def start(self):
+        """Start executor of workers if not running"""
+        if self.executor is not None :
+            return
+        if self.executorType == 'thread' :
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        else :
+            if self.executorType != 'process' :
+                print('WARNING ! : FitPool : unknown executorType '+str(self.executorType)+', process used')
+            # spawn : no copy of parent process state, in particular of GUI and camera threads
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                                   mp_context=multiprocessing.get_context('spawn'))
+
+
+    def shutdown(self):
+        """Stop workers"""
+        if self.executor is not None :
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+    def fit_clouds_1D(self, data, ROIlimitsTabpx, Yaxispx, Xaxispx, pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0),
+                      warmStartsList=None, residualRatio=2.):
+        """Fit cloud dimensions of all ROIs (see fit_cloud_1D), concurrently if pool is active
+
+        Args:
+            data (2D numpy array) : atomic density of the whole image
+
+            ROIlimitsTabpx (list of 2D numpy array int) : ROIs limits in image pixels [[Ymin, Ymax], [Xmin, Xmax]]
+
+            Yaxispx, Xaxispx (1D numpy array) : image pixels along Y and X axes
+
+        Keyword Args:
+            pixelCalumperpx=(1., 1.), imageOriginpx=(0, 0) : pixel calibration and image origin (see cloud_dimensions_um)
+
+            warmStartsList=None (list or None) : warm starts of the 4 fits of each ROI (see fit_cloud_1D), automatic initial parameters if None
+
+            residualRatio=2. (float) : maximum ratio of residuals of warm started fits and of previous fits
+
+        Return:
+            list of results of fit_cloud_1D (list) : (cloudRadiipx, cloudPositionspx, cloudRadiium, cloudPositionsum, fitCurves, warmStarts) in ROIs order
+        """
+        if warmStartsList is None :
+            warmStartsList = [None]*len(ROIlimitsTabpx)
+        argsList = []
+        for ROIlimitspx, warmStarts in zip(ROIlimitsTabpx, warmStartsList) :
+            fitYaxispx = Yaxispx[ROIlimitspx[0,0]:ROIlimitspx[0,1]]
+            fitXaxispx = Xaxispx[ROIlimitspx[1,0]:ROIlimitspx[1,1]]
+            argsList.append((ROIlimitspx, fitYaxispx, fitXaxispx, pixelCalumperpx, imageOriginpx, warmStarts, residualRatio))
+        if not(self.active()) :
+            return [fit_cloud_1D(data, *args) for args in argsList]
+        self.start()
+        futures = []
+        for args in argsList :
+            ROIlimitspx = args[0]
+            Yminpx, Xminpx = max(ROIlimitspx[0,0], 0), max(ROIlimitspx[1,0], 0)
+            dataROI = np.ascontiguousarray(data[Yminpx:ROIlimitspx[0,1], Xminpx:ROIlimitspx[1,1]])
+            futures.append(self.executor.submit(fit_cloud_1D, dataROI, *args, dataOffsetpx=(Yminpx, Xminpx)))
+        return [future.result() for future in futures]
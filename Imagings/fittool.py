@@ -29,7 +29,7 @@ class FitUtility():
         Keyword Args: 
             yerr (list or np.array or None) : the error in the y vector.
             
-            p_in (list or None) : initial fit parameters.
+            p_in (list or None) : initial fit parameters, automatic initial parameters (getinits) where None.
             
             p_fix (list or None) : array of strings or values.
             
@@ -42,9 +42,10 @@ class FitUtility():
         starttime = time.time()
         
         if p_in is None or len(p_in)!= len(fitFunction.p) :
-            fitFunction.p = [None] * len(fitFunction.p)
+            pgiven = [None] * len(fitFunction.p)
         else :
-            fitFunction.p = p_in
+            pgiven = list(p_in)
+        self.p_in = pgiven
          
         if x is None:
             x_array = np.arange(len(y))
@@ -87,18 +88,25 @@ class FitUtility():
     
         # create empty p0
         pinits = [None] * len(fitFunction.p)
-        # fill pinits if there is None in fitFunction.p with the getinits function
-        for i,val in enumerate(fitFunction.p):
+        # automatic initial parameters, computed once if some parameters are not given
+        pautoinits = None
+        if any(val is None for val in pgiven):
+            try:
+                pautoinits = fitFunction.getinits(x_array, y_array)
+            except:
+                pautoinits = None
+        # fill pinits with given parameters, and with the getinits function where there is None
+        for i,val in enumerate(pgiven):
+            if val is not None:
+                pinits[i] = val
+                printif('Got initial parameter value from setted array', i)
+                continue
             try: 
-                pinits[i] = fitFunction.getinits(x_array, y_array)[i]
+                pinits[i] = pautoinits[i]
                 printif('Auto detected initial parameter: ' + str(pinits[i]), i)
             except:
-                if fitFunction.p[i] == None:
-                    pinits[i] = 1
-                    printif('ser initial parameter value to 1', i)
-                else:
-                    pinits[i] = fitFunction.p[i]
-                    printif('Got initial parameter value from setted array', i)
+                pinits[i] = 1
+                printif('ser initial parameter value to 1', i)
                    
         p0 = []
         for i,val in enumerate(p_fix):
@@ -113,35 +121,54 @@ class FitUtility():
                 except:
                     None
         
-        # Define (weight)errfunc depending p_fix
-        def errfunc(par, xf, yf):
-            # create parameters p for fit depending of p_fix
-            p = []
-            ii = 0
-            for i,val in enumerate(p_fix):
+        # compile p_fix once : free parameters indices, fixed values and linked parameters expressions
+        freeIndices = np.array([i for i,val in enumerate(p_fix) if val is None], dtype=int)
+        pbase = np.array([val if (val is not None and type(val) != str) else pinits[i] 
+                          for i,val in enumerate(p_fix)], dtype=float)
+        linkedParameters = []
+        for i,val in enumerate(p_fix):
+            if type(val) == str:
                 try:
-                    if val == None:
-                        p.append(par[ii])
-                        ii += 1
-                    else:
-                        if type(val) == str:
-                            p.append(eval(val))
-                        else:
-                            p.append(val)
+                    linkedParameters.append((i, compile(val, '<p_fix>', 'eval')))
+                except SyntaxError:
+                    print('Warning : p_fix expression ' + val + ' not valid : parameter fixed to its initial value')
+    
+        # create parameters p for function execution from fit parameters par depending of p_fix
+        def parameters(par):
+            p = pbase.copy()
+            p[freeIndices] = par[:len(freeIndices)]
+            # linked parameters : expression of par and of previous parameters p
+            for i, code in linkedParameters:
+                try:
+                    p[i] = eval(code, globals(), {'par' : par, 'p' : p[:i]})
                 except:
-                    p.append(pinits[i])
-        
-            return yf - fitFunction.execute(p,xf)
+                    p[i] = pinits[i]
+            return p
+    
+        # Define (weight)errfunc depending p_fix
+        def errfunc(par, xf, yf):
+            return yf - fitFunction.execute(parameters(par),xf)
     
         # just use errfunc to make weighterrrfunc...
         def weighterrfunc(par, xf, yf, yerrf):
             return errfunc(par, xf, yf) / yerrf
         
+        # analytic Jacobian of errfunc for free parameters, if defined and no linked parameters
+        def errjacobian(par, xf, yf):
+            return - fitFunction.jacobian(parameters(par), xf)[:, freeIndices]
+        
+        def weighterrjacobian(par, xf, yf, yerrf):
+            return errjacobian(par, xf, yf) / yerrf[:, np.newaxis]
+        
+        useJacobian = fitFunction.jacobian is not None and len(linkedParameters) == 0 and np.ndim(y_array) == 1
+        
         # Check if there are y errors
         if not(yerr is None) and not(np.any(yerr_array == 0)) :
-            p1, pcovmat, infodict, mesg, ier = optimize.leastsq(weighterrfunc, p0, args=(x_array, y_array, yerr_array), full_output=True)
+            p1, pcovmat, infodict, mesg, ier = optimize.leastsq(weighterrfunc, p0, args=(x_array, y_array, yerr_array), 
+                                                                Dfun=weighterrjacobian if useJacobian else None, full_output=True)
         else:
-            p1, pcovmat, infodict, mesg, ier = optimize.leastsq(errfunc, p0, args=(x_array, y_array), full_output=True)
+            p1, pcovmat, infodict, mesg, ier = optimize.leastsq(errfunc, p0, args=(x_array, y_array), 
+                                                                Dfun=errjacobian if useJacobian else None, full_output=True)
             
         # Calculate fit results
         try: 
@@ -154,17 +181,7 @@ class FitUtility():
                 x_fit = np.linspace(min(x_array), max(x_array), NumberOfSteps)
             
         # prepare p1 for execute use
-        pfit = []
-        ii = 0
-        for i,val in enumerate(p_fix):
-            if val == None:
-                pfit.append(p1[ii])
-                ii += 1
-            else:
-                if type(val) == str:
-                    pfit.append(eval(val))
-                else:
-                    pfit.append(val)
+        pfit = list(parameters(np.atleast_1d(p1)))
         y_fit = fitFunction.execute(pfit, x_fit)
         
         #calculate parameters errors from covariance matrix if yerr provided and fit works
@@ -193,6 +210,7 @@ class FitUtility():
         self.infodict = infodict
         self.mesg = mesg
         self.ierror = ier
+        self.residual = np.mean(infodict['fvec']**2) # mean of squared (weighted) residuals
         
         if not(0< ier <5) :
             self.p = [0.]*len(fitFunction.p)
@@ -209,6 +227,204 @@ class FitUtility():
             
            
         #return self.quality, fitduration
+
+
+class BatchFitUtility():
+    """Class to fit one function to a stack of 1D profiles at once.
+    
+    A Levenberg-Marquardt algorithm runs for all profiles simultaneously with numpy array operations,
+    so that many short profiles are fitted without the Python overhead of one leastsq call per profile.
+    The function must have an analytic jacobian and its execute and jacobian must accept 
+    parameters p[j] of shape (profiles, 1) (see gauss, linear, expdecay). 
+    Results are stacks of the results of FitUtility : first axis is the profile index.
+    """
+    
+    def __init__(self, x, y, fitFunction, yerr=None, mask=None, p_in=None, NumberOfSteps=None, 
+                 maxIterations=200, tolerance=1.49012e-08):
+        """Initialize class instance and fit function to all profiles
+        
+        Args:
+            x (1D or 2D np.array) : x vectors of profiles (2D : one per profile, padded to common length), or common x vector (1D).
+            
+            y (2D np.array) : y vectors of profiles, padded to common length.
+            
+            fitFunction (FitFunction) : the function to fit to data, with jacobian.
+        
+        Keyword Args: 
+            yerr (2D np.array or None) : the errors in the y vectors. Not used for profiles with a 0 error.
+            
+            mask (2D np.array bool or None) : valid points of profiles (padding is False). If None, all points are valid.
+            
+            p_in (1D or 2D np.array or None) : initial fit parameters, for all profiles (1D) or for each profile (2D).
+                If None, or for profiles with nan parameters, use fitFunction.getinits.
+            
+            NumberOfSteps (int or None) : number of y-fitted points generated for plotting arrays x and y. 
+                If None, fitted points at x.
+            
+            maxIterations=200 (int) : maximum number of iterations
+            
+            tolerance=1.49012e-08 (float) : relative tolerance on sum of squares and parameters for convergence (as leastsq ftol and xtol).
+                Profiles for which no step decreases the sum of squares fail (ierror 5).
+        """
+        starttime = time.time()
+        y_array = np.atleast_2d(np.asarray(y, dtype=float))
+        profiles = y_array.shape[0]
+        x_array = np.broadcast_to(np.asarray(x, dtype=float), y_array.shape)
+        if mask is None :
+            mask = np.ones(y_array.shape, dtype=bool)
+        parametersNumber = len(fitFunction.p)
+        
+        # initial parameters
+        if p_in is not None :
+            pinits = np.array(np.broadcast_to(np.asarray(p_in, dtype=float), (profiles, parametersNumber)))
+        else :
+            pinits = np.full((profiles, parametersNumber), np.nan)
+        for k in np.flatnonzero(np.isnan(pinits).any(axis=1)) :
+            try:
+                pinits[k] = fitFunction.getinits(x_array[k][mask[k]], y_array[k][mask[k]])
+            except:
+                pinits[k] = 1.
+        
+        # weights : 0 for padding, 1/yerr for profiles with errors
+        weights = mask.astype(float)
+        useErrors = np.zeros(profiles, dtype=bool)
+        if yerr is not None :
+            yerr_array = np.broadcast_to(np.asarray(yerr, dtype=float), y_array.shape)
+            useErrors = np.all((yerr_array != 0) | ~mask, axis=1)
+            weights[useErrors] /= np.where(mask, yerr_array, 1.)[useErrors]
+        
+        # functions of stacked parameters p (profiles, parameters) of profiles of indices k
+        def normal_equations(p, k):
+            w = weights[k]
+            J = w[:, :, np.newaxis] * fitFunction.jacobian(p.T[:, :, np.newaxis], x_array[k])
+            r = w * (y_array[k] - fitFunction.execute(p.T[:, :, np.newaxis], x_array[k]))
+            Jt = np.swapaxes(J, 1, 2)
+            return Jt @ J, (Jt @ r[:, :, np.newaxis])[:, :, 0], (r**2).sum(axis=1)
+        
+        # Levenberg-Marquardt iterations, profiles stop when converged
+        with np.errstate(all='ignore'):
+            p = pinits.copy()
+            A, g, cost = normal_equations(p, np.arange(profiles))
+            damping = np.full(profiles, 1.e-3)
+            # sum of squares negligible relative to data : exact fit
+            exact = ((weights * y_array)**2).sum(axis=1) * np.finfo(float).eps
+            converged = ~np.isfinite(cost) | (cost <= exact)
+            failed = ~np.isfinite(cost)
+            stepAccepted = np.zeros(profiles, dtype=bool)
+            iterations = 0
+            while not(converged.all()) and iterations < maxIterations :
+                iterations += 1
+                k = np.flatnonzero(~converged) # only profiles not converged are computed
+                diagA = np.diagonal(A[k], axis1=1, axis2=2)
+                scale = np.maximum(diagA, 1.e-12*diagA.max(axis=1, initial=0.)[:, np.newaxis] + 1.e-300)
+                M = A[k] + damping[k, np.newaxis, np.newaxis] * (scale[:, :, np.newaxis] * np.eye(parametersNumber))
+                step = np.linalg.solve(M, g[k, :, np.newaxis])[:, :, 0]
+                pnew = p[k] + step
+                Anew, gnew, costnew = normal_equations(pnew, k)
+                improved = np.isfinite(costnew) & (costnew < cost[k])
+                # convergence on relative change of sum of squares (step accepted or not), relative accepted step 
+                # or exact fit (as MINPACK ftol and xtol)
+                converged[k] = ((np.abs(cost[k] - costnew) <= tolerance * cost[k])
+                                | (improved & ((np.abs(step) <= tolerance * (np.abs(p[k]) + tolerance)).all(axis=1) 
+                                               | (costnew <= exact[k]))))
+                stepAccepted[k] |= improved
+                ki = k[improved]
+                p[ki], A[ki], g[ki], cost[ki] = pnew[improved], Anew[improved], gnew[improved], costnew[improved]
+                damping[k] = np.where(improved, damping[k]/10., damping[k]*10.)
+                # no decrease of sum of squares possible : at minimum if a step was accepted, else fit failed
+                failed |= (damping > 1.e16) & ~stepAccepted & ~converged
+                converged |= damping > 1.e16
+            finite = np.isfinite(A).all(axis=(1, 2))
+            pcovmat = np.linalg.pinv(np.where(finite[:, np.newaxis, np.newaxis], A, 0.))
+        failed |= ~finite
+        failed |= ~converged | ~np.isfinite(p).all(axis=1)
+        
+        # fitted curves
+        if NumberOfSteps is None :
+            x_fit = x_array
+        else :
+            x_masked = np.where(mask, x_array, np.nan)
+            x_fit = np.linspace(np.nanmin(x_masked, axis=1), np.nanmax(x_masked, axis=1), NumberOfSteps, axis=1)
+        with np.errstate(all='ignore'):
+            y_fit = fitFunction.execute(p.T[:, :, np.newaxis], x_fit)
+        
+        # add results to class
+        self.fitFunction_detail = fitFunction.detail
+        try:
+            self.pdetail = fitFunction.pdetail
+        except:
+            None
+        self.fitFunction_name = fitFunction.name
+        self.x = x_fit
+        self.y = y_fit
+        self.pfit = p
+        self.p = np.where(failed[:, np.newaxis], 0., p)
+        self.pinit = pinits
+        self.pcovmat = pcovmat
+        self.psigma = np.where(useErrors[:, np.newaxis] & ~failed[:, np.newaxis], np.sqrt(np.abs(np.diagonal(pcovmat, axis1=1, axis2=2))), np.nan)
+        self.useErrors = useErrors
+        self.converged = ~failed
+        self.ierror = np.where(failed, 5, 1)
+        self.residual = cost / np.maximum(mask.sum(axis=1), 1) # mean of squared (weighted) residuals
+        self.iterations = iterations
+        if failed.any() :
+            print("Warning : Fit of "+self.fitFunction_name+" function did not converge for "+str(failed.sum())+
+                  " profiles : set fit.p to 0. array")
+        self.fitduration = time.time()-starttime
+    
+    
+    def profile_fits(self):
+        """Results of each profile, with the attributes of FitUtility results (p, pfit, pinit, psigma, pcovmat, x, y, ierror, residual)
+        
+        Return:
+            list of ProfileFit
+        """
+        return [ProfileFit(self, k) for k in range(len(self.p))]
+
+
+class ProfileFit():
+    """Results of one profile of BatchFitUtility, with the attributes of FitUtility results"""
+    
+    def __init__(self, batchFit, k):
+        """Copy results of profile k
+        
+        Args:
+            batchFit (BatchFitUtility) : fit of profiles stack
+            
+            k (int) : profile index
+        """
+        self.fitFunction_name = batchFit.fitFunction_name
+        self.x = batchFit.x[k]
+        self.y = batchFit.y[k]
+        self.pfit = list(batchFit.pfit[k])
+        self.p = list(batchFit.p[k])
+        self.pinit = list(batchFit.pinit[k])
+        self.pcovmat = batchFit.pcovmat[k]
+        self.psigma = batchFit.psigma[k] if batchFit.useErrors[k] and batchFit.converged[k] else None
+        self.ierror = batchFit.ierror[k]
+        self.residual = batchFit.residual[k]
+
+
+def stack_profiles(xList, yList):
+    """Stack 1D profiles of different lengths, padded with 0, for BatchFitUtility
+    
+    Args:
+        xList (list of 1D np.array) : x vectors of profiles
+        
+        yList (list of 1D np.array) : y vectors of profiles
+    
+    Return:
+        x, y, mask (2D np.array) : padded x and y, valid points mask
+    """
+    length = max([len(y) for y in yList] + [1])
+    x = np.zeros((len(yList), length))
+    y = np.zeros((len(yList), length))
+    mask = np.zeros((len(yList), length), dtype=bool)
+    for k in range(len(yList)) :
+        x[k, :len(yList[k])] = xList[k]
+        y[k, :len(yList[k])] = yList[k]
+        mask[k, :len(yList[k])] = True
+    return x, y, mask
 	      
 
 
@@ -230,6 +446,7 @@ class FitFunction:
     name = ""
     detail = ""
     p = None
+    jacobian = None # optional analytic Jacobian : function jacobian(p, x) returning 2D array of derivatives [x index, parameter index]
     
     def __init__(self):
         return None
@@ -274,6 +491,9 @@ linear.getinits = getinits
 def execute(p, x):
 	return p[0] * x + p[1]
 linear.execute = execute
+def jacobian(p, x):
+    return np.stack([x, np.ones_like(x)], axis=-1)
+linear.jacobian = jacobian
 fitFunctionsList.append(linear)
 
 
@@ -304,6 +524,10 @@ expdecay.getinits = getinits
 def execute(p, x):
 	return p[0] * np.exp(-x/p[1]) + p[2]
 expdecay.execute = execute
+def jacobian(p, x):
+    e = np.exp(-x/p[1])
+    return np.stack([e, p[0] * e * x / p[1]**2, np.ones_like(e)], axis=-1)
+expdecay.jacobian = jacobian
 fitFunctionsList.append(expdecay)
 
 
@@ -338,6 +562,11 @@ gauss.getinits = getinits
 def execute(p, x):
     return p[0] * np.exp(-(x - p[1]) ** 2 / (2* (p[2]**2))) + p[3]
 gauss.execute = execute
+def jacobian(p, x):
+    d = x - p[1]
+    e = np.exp(- d ** 2 / (2* (p[2]**2)))
+    return np.stack([e, p[0] * e * d / p[2]**2, p[0] * e * d**2 / p[2]**3, np.ones_like(e)], axis=-1)
+gauss.jacobian = jacobian
 fitFunctionsList.append(gauss)
 
 #Adding gauss fit with positive amplitude
@@ -357,6 +586,11 @@ gaussabs.getinits = getinits
 def execute(p, x):
     return p[0]**2 * np.exp(-(x - p[1]) ** 2 / (2* (p[2]**2))) + p[3]
 gaussabs.execute = execute
+def jacobian(p, x):
+    d = x - p[1]
+    e = np.exp(- d ** 2 / (2* (p[2]**2)))
+    return np.stack([2 * p[0] * e, p[0]**2 * e * d / p[2]**2, p[0]**2 * e * d**2 / p[2]**3, np.ones_like(e)], axis=-1)
+gaussabs.jacobian = jacobian
 fitFunctionsList.append(gaussabs)
 
 
@@ -372,6 +606,12 @@ lorentz.getinits = getinits
 def execute(p, x):
     return p[0] * (p[2]/2)/pi / ( (p[2]/2)**2 + (x - p[1]) ** 2 ) + p[3]
 lorentz.execute = execute
+def jacobian(p, x):
+    d = x - p[1]
+    h = p[2]/2
+    D = h**2 + d**2
+    return np.stack([h/pi / D, p[0] * h/pi * 2 * d / D**2, p[0]/(2*pi) * (d**2 - h**2) / D**2, np.ones_like(D)], axis=-1)
+lorentz.jacobian = jacobian
 fitFunctionsList.append(lorentz)
 
 
@@ -387,6 +627,11 @@ error_function.getinits = getinits
 def execute(p, x):
 	return p[0] * erf(np.sqrt(2)*(x-p[1])/p[2]) + p[3]
 error_function.execute = execute
+def jacobian(p, x):
+    u = np.sqrt(2)*(x-p[1])/p[2]
+    g = p[0] * 2/np.sqrt(pi) * np.exp(-u**2)
+    return np.stack([erf(u), - g * np.sqrt(2)/p[2], - g * u/p[2], np.ones_like(u)], axis=-1)
+error_function.jacobian = jacobian
 fitFunctionsList.append(error_function)
 
 
@@ -460,6 +705,7 @@ lin_fit.getinits = getinits
 def execute(p, x):
 	return p[0] * x + p[1]
 lin_fit.execute = execute
+lin_fit.jacobian = linear.jacobian
 fitFunctionsList.append(lin_fit)
 
 
@@ -517,6 +763,7 @@ exp_decay_plus_offset.p = [.3, 4, .5]
 def execute(p, x):
 	return p[0] * np.exp(-x / p[1]) + p[2]
 exp_decay_plus_offset.execute = execute
+exp_decay_plus_offset.jacobian = expdecay.jacobian
 fitFunctionsList.append(exp_decay_plus_offset)
 
 
@@ -542,6 +789,7 @@ gauss_background_fit.getinits = getinits
 def execute(p, x):
     return p[0] * np.exp(-(x - p[1]) ** 2 / (2* (p[2]**2))) + p[3]
 gauss_background_fit.execute = execute
+gauss_background_fit.jacobian = gauss.jacobian
 fitFunctionsList.append(gauss_background_fit)
 
 # Adding triple gauss fit
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Chain of worker threads connected by bounded queues, for pipelined acquisition and analysis of scans
+"""
+
+import threading
+import queue
+import traceback
+
+
+_END = object() # end of items marker passed through all stages
+
+
+class Pipeline():
+    """Stages processing items in order, each stage in its own worker thread.
+
+    Each stage takes the items from its input queue, applies its function and puts the result in the next queue.
+    Queues between stages are bounded : a stage waits when the next one is late, so that at most queueSize
+    items wait between two stages. Input queue of first stage is not bounded (items are given by put).
+    Results of last stage are read in order with results, in the calling thread.
+    After abort (or an error in a stage function), items are passed to the next stages without processing,
+    so that the resources they hold are still released by the reader of results.
+    """
+
+    def __init__(self, stages, queueSize=2, name='Pipeline'):
+        """Create queues and threads of stages (not started)
+
+        Args:
+            stages (list of (str, function)) : names and functions of stages, function(item) returns the item for next stage
+
+        Keyword Args:
+            queueSize=2 (int) : maximum number of items waiting between two stages
+
+            name='Pipeline' (str) : prefix of threads names
+        """
+        self.queueSize = max(int(queueSize), 1)
+        self.queues = [queue.Queue()] + [queue.Queue(maxsize=self.queueSize) for stage in stages]
+        self.aborted = threading.Event() # set by abort or error in a stage
+        self.errors = [] # (stage name, exception) of errors raised by stage functions
+        self.threads = [threading.Thread(target=self._run_stage, daemon=True, name=name+stageName,
+                                         args=(stageName, function, self.queues[i], self.queues[i+1]))
+                        for i, (stageName, function) in enumerate(stages)]
+
+
+    def start(self):
+        """Start the threads of stages"""
+        for thread in self.threads :
+            thread.start()
+
+
+    def put(self, item):
+        """Give an item to the first stage
+
+        Args:
+            item (object) : item processed by stages
+        """
+        self.queues[0].put(item)
+
+
+    def close(self):
+        """Signal the end of items given to the first stage, the threads stop after the last item"""
+        self.queues[0].put(_END)
+
+
+    def abort(self):
+        """Stop processing : items left are passed without processing to results"""
+        self.aborted.set()
+
+
+    def results(self):
+        """Iterate over the items processed by all stages, in order, until close
+
+        Return:
+            Generator of items (object)
+        """
+        while True :
+            item = self.queues[-1].get()
+            if item is _END :
+                return
+            yield item
+
+
+    def join(self, timeout=None):
+        """Wait for the end of threads of stages
+
+        Keyword Args:
+            timeout=None (None or float) : maximum waiting time in s for each thread
+        """
+        for thread in self.threads :
+            thread.join(timeout)
+            if thread.is_alive() :
+                print('WARNING ! : Pipeline : thread '+thread.name+' did not stop before timeout')
+
+
+    def _run_stage(self, stageName, function, inputQueue, outputQueue):
+        """PROTECTED loop of stage thread"""
+        while True :
+            item = inputQueue.get()
+            if item is not _END and not self.aborted.is_set() :
+                try :
+                    item = function(item)
+                except Exception as error :
+                    print('ERROR ! : Pipeline : error in stage '+stageName+' : '+repr(error))
+                    traceback.print_exc()
+                    self.errors.append((stageName, error))
+                    self.aborted.set()
+            outputQueue.put(item)
+            if item is _END :
+                return
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Scans with camera readout cropped to analysis ROIs, on the Simulated camera (no hardware needed)
+"""
+
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Cameras.Config import camerasConfigs
+from Cameras.Simulated import SimulatedClass
+from Imagings.ImagingClassDef import ImagingClass
+
+
+# Simulated camera appended to camerasConfigs (see example configs at the end of Config.py)
+simulatedConfig = dict(name = 'Simulated MOT', driver = 'Simulated', model = 'Simulated', serial = 0, imageBitDepth = 12,
+                       defaultExposurems = 1., defaultGaindB = 0., defaultTrigger = 'external', defaultCamROI = None,
+                       defaultFlushSensor = False, defaultRemoveBackground = False, defaultROIkrgnames = ['MOT','',''],
+                       pixelCalXumperpx = 5, pixelCalYumperpx = 5, reversedAxes = [False, False],
+                       cameraQuantumEff = 0.5, numericalAperture = 0.1, simulatedSeed = 0,
+                       Imaging__imagingTypeText = 'Absorption Imaging', Imaging__atomicMassAU = 86.909,
+                       Imaging__atomicFrequencyTHz = 384.23, Imaging__Isat = 16.693, Imaging__atomicLineFWHWinMHz = 6.066,
+                       Imaging__thresholdAbsImg = 15, Imaging__includeSaturationEffects = True,
+                       Imaging__laserPulseDurationus = 50., Imaging__laserIntensity = 10., Imaging__laserDetuningMHz = 0.)
+
+
+def create_Simulated_Camera():
+    """Simulated camera with simulatedConfig, without entry in the user config file"""
+    if simulatedConfig not in camerasConfigs :
+        camerasConfigs.append(simulatedConfig)
+    return SimulatedClass(camerasConfigs.index(simulatedConfig))
+
+
+def test_two_cropped_scans_back_to_back():
+    """Uncropped geometry is restored after a cropped scan, so that a second cropped scan gives the same results"""
+    Camera = create_Simulated_Camera()
+    Imaging = ImagingClass()
+    for key in ['atomNumberUseFit3sigma', 'plotSingleImage', 'autoSaveImages', 'plotAtomicDensityAv', 'plotFit1D'] :
+        setattr(Imaging, key, False)
+    Imaging.set_Imaging_variables_from_cam(Camera)
+    Imaging.set_ROIs_from_ROIarray(np.array([[str(Imaging.cameraNumber), 'MOT', '0', '0', '2000', '2000']]))
+    uncroppedGeometry = (Imaging.wpx, Imaging.hpx, list(Imaging.imageOriginpx), Imaging.ROIlimitsTabpx.copy())
+    Imaging.cropCameraToROIs = True
+    Imaging.scans = 2
+    Imaging.averages = 1
+    cloudsRadiiumAv = []
+    for scan in range(2) :
+        assert Imaging.imaging_scan(Camera)
+        cloudsRadiiumAv.append(np.array(Imaging.cloudRadiiumAv, dtype=float))
+        assert list(Camera.camROI[:4]) == [0, 0, Camera.wpx, Camera.hpx]
+        assert (Imaging.wpx, Imaging.hpx, list(Imaging.imageOriginpx)) == tuple(uncroppedGeometry[:3])
+        assert (Imaging.ROIlimitsTabpx == uncroppedGeometry[3]).all()
+    assert np.allclose(cloudsRadiiumAv[0], cloudsRadiiumAv[1], rtol=0.05)